@@ -0,0 +1,173 @@
+"""
+Adaptive per-provider concurrency of the model requests (AIMD).
+
+Every provider with AdaptiveConcurrency enabled gets a controller that caps its
+in-flight requests. The limit grows additively, by IncreaseStep per limit's worth
+of healthy responses, and is cut multiplicatively by DecreaseFactor on a 429, a
+timeout or a latency spike. Only one cut is made per round of requests: failures
+of requests that started before the last cut don't cut again. The current limit
+is exposed as the concurrency_limit_<provider> gauge of the run metrics.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from config.config_loader import AdaptiveConcurrencySettings, ProviderSettings
+from metrics import run_metrics
+
+
+# Healthy responses needed before latency spikes are detected
+BASELINE_SAMPLES = 5
+
+# Weight of a new latency in the moving average
+BASELINE_WEIGHT = 0.2
+
+
+def is_overload_error(ex: BaseException) -> bool:
+    """
+    Check whether a failed request signals an overloaded provider: a 429 or a timeout.
+    """
+    if getattr(ex, "status_code", None) == 429:
+        return True
+    if isinstance(ex, TimeoutError):
+        return True
+    # openai.APITimeoutError and the httpx timeouts, without importing the clients
+    return any("Timeout" in cls.__name__ for cls in type(ex).__mro__)
+
+
+class AimdController:
+    """
+    Caps the in-flight requests of a provider at an adaptive limit.
+    """
+    def __init__(self, name: str, settings: AdaptiveConcurrencySettings):
+        self.name = name
+        self.settings = settings
+        self.min_limit = max(settings.min_limit, 1)
+        self.max_limit = max(settings.max_limit, self.min_limit)
+        self.limit = float(min(max(settings.initial_limit, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        self._round = 0
+        self._samples = 0
+        self._baseline: Optional[float] = None
+        self._publish()
+
+    def _publish(self):
+        run_metrics.set_gauge(f"concurrency_limit_{self.name}", int(self.limit))
+
+    def acquire(self) -> int:
+        """
+        Block until a request may start.
+
+        Returns:
+            The round of the request, to pass to release.
+        """
+        started = time.perf_counter()
+        with self._condition:
+            waited = False
+            while self.in_flight >= int(self.limit):
+                waited = True
+                self._condition.wait()
+            self.in_flight += 1
+            request_round = self._round
+        if waited:
+            run_metrics.observe(f"concurrency_wait_{self.name}", time.perf_counter() - started)
+        return request_round
+
+    def release(self, request_round: int, seconds: float, error: Optional[BaseException] = None):
+        """
+        Finish a request and adapt the limit to its outcome.
+
+        Args:
+            request_round: The round returned by acquire.
+            seconds: The latency of the request.
+            error: The error of a failed request.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if error is not None:
+                if is_overload_error(error):
+                    self._decrease(request_round, type(error).__name__)
+            else:
+                spike = (
+                    self._baseline is not None
+                    and self._samples >= BASELINE_SAMPLES
+                    and seconds > self.settings.latency_spike_ratio * self._baseline
+                )
+                self._samples += 1
+                if self._baseline is None:
+                    self._baseline = seconds
+                else:
+                    self._baseline += BASELINE_WEIGHT * (seconds - self._baseline)
+                if spike:
+                    self._decrease(request_round, f"latency {seconds:.1f}s")
+                else:
+                    self._increase()
+            self._condition.notify_all()
+
+    def _increase(self):
+        if self.limit >= self.max_limit:
+            return
+        previous = int(self.limit)
+        self.limit = min(self.limit + self.settings.increase_step / self.limit, float(self.max_limit))
+        if int(self.limit) != previous:
+            self._publish()
+
+    def _decrease(self, request_round: int, reason: str):
+        if request_round != self._round:
+            return
+        self._round += 1
+        previous = int(self.limit)
+        self.limit = max(self.limit * self.settings.decrease_factor, float(self.min_limit))
+        run_metrics.increment(f"concurrency_decreases_{self.name}")
+        if int(self.limit) != previous:
+            logging.info(f"{self.name}: {reason}, concurrency limit {previous} -> {int(self.limit)}")
+            self._publish()
+
+
+def limit_agent_concurrency(agent, controller: AimdController):
+    """
+    Hold a slot of the controller during every model request of the agent.
+
+    Args:
+        agent: The AG2 agent.
+        controller: The controller of the agent's provider.
+    """
+    client = agent.client
+    create = client.create
+
+    def controlled_create(**params):
+        request_round = controller.acquire()
+        started = time.perf_counter()
+        try:
+            response = create(**params)
+        except BaseException as ex:
+            controller.release(request_round, time.perf_counter() - started, ex)
+            raise
+        controller.release(request_round, time.perf_counter() - started)
+        return response
+
+    client.create = controlled_create
+
+
+_controllers: Dict[str, AimdController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_concurrency_controller(provider_settings: Optional[ProviderSettings]) -> Optional[AimdController]:
+    """
+    Get the controller of a provider in this process, creating it on first use.
+
+    Returns:
+        The controller, None when the provider doesn't adapt its concurrency.
+    """
+    if provider_settings is None or not provider_settings.adaptive_concurrency.enabled:
+        return None
+    with _controllers_lock:
+        controller = _controllers.get(provider_settings.name)
+        if controller is None:
+            controller = AimdController(provider_settings.name, provider_settings.adaptive_concurrency)
+            _controllers[provider_settings.name] = controller
+        return controller
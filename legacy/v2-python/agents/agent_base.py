@@ -2,13 +2,43 @@ from abc import ABC, abstractmethod
 from typing import Dict, Any
 
 
+# Versions of the agents' system instructions: the original text and compact rewrites of the same rules
+FULL_INSTRUCTIONS = "full"
+COMPACT_V1_INSTRUCTIONS = "compact-v1"
+INSTRUCTION_VERSIONS = (FULL_INSTRUCTIONS, COMPACT_V1_INSTRUCTIONS)
+
+
 class AgentBase(ABC):
     """
     Base class for all agents in the system.
     """
-    def __init__(self, temperature: float = 0.7, max_tokens: int = 16384):
+    def __init__(self, temperature: float = 0.7, max_tokens: int = 16384, instruction_version: str = FULL_INSTRUCTIONS):
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.instruction_version = instruction_version
+    
+    def _select_instruction(self, instructions: Dict[str, str]) -> str:
+        """
+        Get the instruction of the agent's instruction version.
+        """
+        if self.instruction_version not in instructions:
+            raise ValueError(f"Unknown instruction version: {self.instruction_version}, expected one of {', '.join(instructions)}")
+        return instructions[self.instruction_version]
+    
+    @property
+    def name(self) -> str:
+        """Return the agent's name"""
+        return self._name
+    
+    @property
+    def instruction(self) -> str:
+        """Return the agent's instruction of its instruction version"""
+        return self._instruction
+    
+    @property
+    def full_instruction(self) -> str:
+        """Return the full version of the agent's instruction"""
+        return self._full_instruction
     
     @property
     @abstractmethod
@@ -36,7 +66,14 @@ class AgentBase(ABC):
         Returns:
             The generated response.
         """
-        # This is a placeholder method that should be implemented by subclasses
-        # In the actual implementation, this would call the appropriate API
-        # to generate a response asynchronously
-        raise NotImplementedError("Subclasses must implement generate_async")
\ No newline at end of file
+        agent = getattr(self, '_agent', None)
+        if agent is None:
+            raise ValueError("Agent not initialized. Call create_openai_agent or create_azure_agent first.")
+        
+        reply = await agent.a_generate_reply(messages=[{"role": "user", "content": message}])
+        
+        # Replies of tools and function calls come as messages
+        if isinstance(reply, dict):
+            reply = reply.get("content")
+        
+        return reply or ""
@@ -1,17 +1,36 @@
-import autogen
-from .agent_base import AgentBase
+from .agent_base import AgentBase, COMPACT_V1_INSTRUCTIONS, FULL_INSTRUCTIONS
 from typing import Dict, Any
 
 
+# The rules of the full instruction in far fewer tokens
+_COMPACT_V1_INSTRUCTION = """\
+You are an English teacher and flashcard expert. From the student's markdown lesson notes, create flashcards for the material worth memorizing.
+- Fix spelling, grammar, word meanings and factual mistakes, in English and in Russian (the student's mother tongue) and in translations. Keep the student's Russian remarks untranslated.
+- Notes legend: **bold** important words or parts of words, *italic* examples or explanations, ??? questions the student asked the teacher.
+- Skip student essays and audio/video task annotations (the course book is SpeakOut); keep only valuable English material.
+- Complex cards are welcome for themed sub-titles, e.g. enumerations of expressions or of at/in/on usage.
+- Give usage examples where useful, always for grammatical constructions on single direction cards. Put them on a card side, never separately.
+- Examples and Russian pronunciation must not spoil the other side. Put the pronunciation next to the English word: "lack (лак)" / "нехватка". Bad: "corner stone (краеугольный камень)" / "краеугольный камень (corner stone)".
+- A card is single direction or double sided. Use double sided only when both sides work as a question, mostly for word or phrase translations, and state the type on every card.
+- Don't write "How do you say", "Translate ... into Russian" or "What does ... mean" for simple translations.
+- After a reviewer verdict, apply the fixes and send back ONLY the cards marked for fixing, with their original numbers. If a fix is unclear, send "Card <number>: removed".
+Number the cards from 1, syntax:
+Card <number>:
+The first side: <question>
+The second side: <answer>
+Double sided card: <yes/no>
+"""
+
+
 class EnglishTeacherAgent(AgentBase):
     """
     Agent that analyzes student notes and requests generating flashcards.
     """
-    def __init__(self, temperature: float = 0.7, max_tokens: int = 16384):
-        super().__init__(temperature, max_tokens)
+    def __init__(self, temperature: float = 0.7, max_tokens: int = 16384, instruction_version: str = FULL_INSTRUCTIONS):
+        super().__init__(temperature, max_tokens, instruction_version)
         self._name = "EnglishTeacherAgent"
         
-        self._instruction = """
+        self._full_instruction = """
         You are English language teacher. You have a lot of expertise in English language teaching.
         Also you are experienced in memorization techniques and in flashcard creation.
         
@@ -32,9 +51,10 @@ class EnglishTeacherAgent(AgentBase):
         italic text: *text* - for examples or explanations
         ??? headers - for questions that the student addressed his teacher
         
-        You can receive a formatted flashcards from the reviewer with corrections and suggestions.
+        You can receive a verdict from the reviewer with corrections and suggestions for some of the cards.
         Apply them carefully.
-        If can't understand a suggestion, just skip that card.
+        Send back ONLY the cards the reviewer asked to fix, with their original numbers. Don't repeat the accepted cards.
+        If can't understand a suggestion, just skip that card: send "Card <number>: removed".
         
         Don't create cards from content that are just student essay or audio/video task annotation.
         Chose only valuable material for learning English.
@@ -91,19 +111,27 @@ class EnglishTeacherAgent(AgentBase):
         
         Avoid phrases like 'How do you say' or 'Translate ... into Russian' or 'What does ... mean'  in simple translation tasks.
         
+        Number the cards, starting from 1.
         Card syntax:
+        Card <number>:
         The first side: <question>
         The second side: <answer>
         Double sided card: <yes/no>
         
         Do not provide examples in general. Include examples into first or second side of the card.
         """
+        self._instruction = self._select_instruction({
+            FULL_INSTRUCTIONS: self._full_instruction,
+            COMPACT_V1_INSTRUCTIONS: _COMPACT_V1_INSTRUCTION
+        })
     
     @property
     def introduction(self) -> str:
         return "I will analyze the student notes in markdown format that related with a English lesson and request generating flashcards for material memorization."
     
     def create_openai_agent(self, config: Dict[str, Any]):
+        import autogen
+        
         self._agent = autogen.AssistantAgent(
             name=self._name,
             system_message=self._instruction,
@@ -112,6 +140,8 @@ class EnglishTeacherAgent(AgentBase):
         return self._agent
     
     def create_azure_agent(self, config: Dict[str, Any], model_name: str):
+        import autogen
+        
         # Configure for Azure
         azure_config = config.copy()
         azure_config["model"] = model_name
@@ -122,34 +152,3 @@ class EnglishTeacherAgent(AgentBase):
             llm_config=azure_config
         )
         return self._agent
-    
-    async def generate_async(self, message: str) -> str:
-        """
-        Generate a response asynchronously.
-        
-        Args:
-            message: The message to generate a response for.
-            
-        Returns:
-            The generated response.
-        """
-        if not hasattr(self, '_agent'):
-            raise ValueError("Agent not initialized. Call create_openai_agent or create_azure_agent first.")
-        
-        # Create a user proxy agent to initiate the chat
-        user_proxy = autogen.UserProxyAgent(
-            name="UserProxy",
-            human_input_mode="NEVER",
-            code_execution_config=False  # Disable code execution
-        )
-        
-        # Send a message to the agent
-        await user_proxy.a_send(
-            message=message,
-            recipient=self._agent
-        )
-        
-        # Get the reply from the agent
-        reply = await self._agent.a_generate_reply(sender=user_proxy)
-        
-        return reply or ""
\ No newline at end of file
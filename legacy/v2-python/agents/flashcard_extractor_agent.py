@@ -1,35 +1,28 @@
-import autogen
-from .agent_base import AgentBase
+from .agent_base import AgentBase, COMPACT_V1_INSTRUCTIONS, FULL_INSTRUCTIONS
 from typing import Dict, Any
-from pydantic import BaseModel, Field
-from typing import List
 
 
-class FlashCard(BaseModel):
-    """
-    Represents a single flashcard with front, back, and is_reversed properties.
-    """
-    front: str
-    back: str
-    is_reversed: bool = Field(default=False)
-
-
-class FlashCardsResponse(BaseModel):
-    """
-    Contains a list of flashcards.
-    """
-    flash_cards: List[FlashCard] = Field(alias="FlashCards")
+# The rules of the full instruction in far fewer tokens
+_COMPACT_V1_INSTRUCTION = """\
+Format the English teacher's cards into a flashcard collection.
+- The cards are numbered and revised cards are resent with the same numbers: collect the cards of all the teacher's messages, use the latest version of each number and skip cards marked as removed.
+- The teacher states whether a card is basic (single sided) or reversed (double sided).
+- Put a card's examples at its end in markdown italic: *Example sentence.* State the task at the start of anything more complex than a translation; reversed translation cards hold only the translations.
+- No blank lines inside a card. Examples on one side must not spoil the other side.
+Reply with ONLY this JSON object, no other text, fields or code fences:
+{"FlashCards": [{"Front": "hello", "Back": "привет", "IsReversed": true}, {"Front": "What is the capital of France?", "Back": "Paris", "IsReversed": false}]}
+"""
 
 
 class FlashCardExtractorAgent(AgentBase):
     """
     Agent that formats flashcards into JSON.
     """
-    def __init__(self, temperature: float = 0.2, max_tokens: int = 16384):
-        super().__init__(temperature, max_tokens)
+    def __init__(self, temperature: float = 0.2, max_tokens: int = 16384, instruction_version: str = FULL_INSTRUCTIONS):
+        super().__init__(temperature, max_tokens, instruction_version)
         self._name = "FlashCardExtractorAgent"
         
-        self._instruction = """
+        self._full_instruction = """
         You are experienced in memorization techniques and in flashcard creation.
         Your task is to format questions and answers from the English teacher into flashcards.
         
@@ -37,6 +30,10 @@ class FlashCardExtractorAgent(AgentBase):
         
         Format the request into flashcards collection according the schema. 
         
+        The teacher's cards are numbered and revised cards are sent again with the same numbers.
+        Collect the cards from all the teacher's messages and use the latest version of each card number.
+        Skip the cards that are marked as removed.
+        
         If it's provided examples for a card, put examples to the end of the card with markdown italic: *Example sentence.*
         Example of a basic multi-line card with an example:
         
@@ -83,6 +80,10 @@ class FlashCardExtractorAgent(AgentBase):
           ]
         }
         """
+        self._instruction = self._select_instruction({
+            FULL_INSTRUCTIONS: self._full_instruction,
+            COMPACT_V1_INSTRUCTIONS: _COMPACT_V1_INSTRUCTION
+        })
     
     @property
     def introduction(self) -> str:
@@ -95,6 +96,8 @@ class FlashCardExtractorAgent(AgentBase):
         """
     
     def create_openai_agent(self, config: Dict[str, Any]):
+        import autogen
+        
         # Check if the model supports response_format
         model_name = config.get("model", "")
         
@@ -124,6 +127,8 @@ class FlashCardExtractorAgent(AgentBase):
         return self._agent
     
     def create_azure_agent(self, config: Dict[str, Any], model_name: str):
+        import autogen
+        
         # Configure for Azure
         azure_config = config.copy()
         azure_config["model"] = model_name
@@ -143,34 +148,3 @@ class FlashCardExtractorAgent(AgentBase):
             llm_config=azure_config
         )
         return self._agent
-    
-    async def generate_async(self, message: str) -> str:
-        """
-        Generate a response asynchronously.
-        
-        Args:
-            message: The message to generate a response for.
-            
-        Returns:
-            The generated response.
-        """
-        if not hasattr(self, '_agent'):
-            raise ValueError("Agent not initialized. Call create_openai_agent or create_azure_agent first.")
-        
-        # Create a user proxy agent to initiate the chat
-        user_proxy = autogen.UserProxyAgent(
-            name="UserProxy",
-            human_input_mode="NEVER",
-            code_execution_config=False  # Disable code execution
-        )
-        
-        # Send a message to the agent
-        await user_proxy.a_send(
-            message=message,
-            recipient=self._agent
-        )
-        
-        # Get the reply from the agent
-        reply = await self._agent.a_generate_reply(sender=user_proxy)
-        
-        return reply or ""
\ No newline at end of file
@@ -1,17 +1,28 @@
-import autogen
-from .agent_base import AgentBase
+from .agent_base import AgentBase, COMPACT_V1_INSTRUCTIONS, FULL_INSTRUCTIONS
 from typing import Dict, Any
 
 
+# The rules of the full instruction in far fewer tokens
+_COMPACT_V1_INSTRUCTION = """\
+You are a strict English learning methodology expert. Review the teacher's flashcards made from a student's notes: they must be good for memorization and factually correct.
+- Answer every card yourself: the question of single direction (basic) cards, both sides of double sided (reversed) cards. Judge how easy it is to answer and to understand what is asked.
+- Criticise double sided cards whose back isn't meaningful as a question, and examples that spoil the answer on the other side; an example may belong on the front.
+- The cards are numbered "Card 1:", "Card 2:"... After your feedback the teacher resends only the revised cards with their numbers. Accepted cards stay accepted, review only the cards of the latest teacher's message.
+End with a JSON verdict on those cards:
+{"Approved": false, "Cards": [{"Card": 1, "Verdict": "accept"}, {"Card": 2, "Verdict": "fix", "Reason": "<short suggestion>"}]}
+Verdict is "accept" or "fix", give a Reason for every fix. Approved is true only if every card is accepted, never while any suggestion is unapplied.
+"""
+
+
 class FlashcardReviewerAgent(AgentBase):
     """
     Agent that reviews flashcards for quality and correctness.
     """
-    def __init__(self, temperature: float = 1.0, max_tokens: int = 16384):
-        super().__init__(temperature, max_tokens)
+    def __init__(self, temperature: float = 1.0, max_tokens: int = 16384, instruction_version: str = FULL_INSTRUCTIONS):
+        super().__init__(temperature, max_tokens, instruction_version)
         self._name = "FlashcardReviewerAgent"
         
-        self._instruction = """
+        self._full_instruction = """
         You are an English learning methodological expert. You have a lot of expertise in English language teaching.
         You need to review the flashcards based on a student notes and provide feedback.
         Be sure that flashcards are good for memorization and factually correct for learning English language.
@@ -46,18 +57,35 @@ class FlashcardReviewerAgent(AgentBase):
         
         You must try to answer question single direction (basic) cards and both questions and answers double sided (reversed) cards yourself and provide feedback.
         
-        Answer 'OK!' in the LAST line of your answer if new flashcards are good for memorization.
-        Otherwise provide feedback and suggestions.
-        Don't put 'OK!' into the last line if you have any suggestions and they haven't applied yet.
+        The teacher numbers the cards: "Card 1:", "Card 2:" and so on.
+        After your feedback the teacher sends only the revised cards with their original numbers.
+        Cards you have accepted before stay accepted, review only the cards of the latest teacher's message.
         
-        You must never put 'OK!' into the last line if you have any suggestions and they haven't applied yet.
+        End your answer with a JSON verdict on the cards of the latest teacher's message:
+        {
+          "Approved": false,
+          "Cards": [
+            {"Card": 1, "Verdict": "accept"},
+            {"Card": 2, "Verdict": "fix", "Reason": "The example on the front side spoils the answer."}
+          ]
+        }
+        Verdict is "accept" or "fix". Give a short Reason with the suggestion for every card you want fixed.
+        Approved is true only if every card of the message is accepted.
+        
+        You must never set Approved to true if you have any suggestions and they haven't applied yet.
         """
+        self._instruction = self._select_instruction({
+            FULL_INSTRUCTIONS: self._full_instruction,
+            COMPACT_V1_INSTRUCTIONS: _COMPACT_V1_INSTRUCTION
+        })
     
     @property
     def introduction(self) -> str:
         return "I am an English learning methodical expert. I will review the flashcards and provide feedback."
     
     def create_openai_agent(self, config: Dict[str, Any]):
+        import autogen
+        
         self._agent = autogen.AssistantAgent(
             name=self._name,
             system_message=self._instruction,
@@ -66,6 +94,8 @@ class FlashcardReviewerAgent(AgentBase):
         return self._agent
     
     def create_azure_agent(self, config: Dict[str, Any], model_name: str):
+        import autogen
+        
         # Configure for Azure
         azure_config = config.copy()
         azure_config["model"] = model_name
@@ -76,34 +106,3 @@ class FlashcardReviewerAgent(AgentBase):
             llm_config=azure_config
         )
         return self._agent
-    
-    async def generate_async(self, message: str) -> str:
-        """
-        Generate a response asynchronously.
-        
-        Args:
-            message: The message to generate a response for.
-            
-        Returns:
-            The generated response.
-        """
-        if not hasattr(self, '_agent'):
-            raise ValueError("Agent not initialized. Call create_openai_agent or create_azure_agent first.")
-        
-        # Create a user proxy agent to initiate the chat
-        user_proxy = autogen.UserProxyAgent(
-            name="UserProxy",
-            human_input_mode="NEVER",
-            code_execution_config=False  # Disable code execution
-        )
-        
-        # Send a message to the agent
-        await user_proxy.a_send(
-            message=message,
-            recipient=self._agent
-        )
-        
-        # Get the reply from the agent
-        reply = await self._agent.a_generate_reply(sender=user_proxy)
-        
-        return reply or ""
\ No newline at end of file
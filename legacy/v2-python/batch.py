@@ -0,0 +1,192 @@
+"""
+Batch mode: process many notes files in one pass over a process pool.
+
+Every notes file gets its own output folders. The workers share the response
+cache (AG2's disk cache is process-safe) and the request rate limit (through a
+multiprocessing.Manager), and their metrics are merged into one report.
+
+The workers are spawned rather than forked, so they do not inherit the parent's
+HTTP client and tracer threads. With --trace their spans are sent back with
+every result and merged into the parent's trace, with --profile every notes
+file is profiled to <profile>.<notes file name>.
+"""
+
+import glob
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.config_loader import AppSettings
+from http_clients import current_cassette, http_pool_statistics, install_cassette
+from metrics import RunMetrics, run_metrics
+import rate_limiter
+from rate_limiter import SharedRateLimiter
+from tracing import span, tracer
+
+
+def discover_notes_files(pattern: str) -> List[str]:
+    """
+    Find the notes files of a batch.
+
+    Args:
+        pattern: A directory (all *.md files in it) or a glob pattern.
+
+    Returns:
+        The sorted notes file paths.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.md")
+    return sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+
+
+def notebook_output_folders(notes_path: str, app_settings: AppSettings, output_root: Optional[str]) -> Tuple[str, str]:
+    """
+    Get the cards and notes output folders of a notes file.
+
+    Args:
+        notes_path: The notes file path.
+        app_settings: The application settings.
+        output_root: The batch output root, the configured folders are used when omitted.
+
+    Returns:
+        The cards folder and the notes folder.
+    """
+    name = os.path.splitext(os.path.basename(notes_path))[0]
+    if output_root:
+        return os.path.join(output_root, name, "cards"), os.path.join(output_root, name, "notes")
+    return (
+        os.path.join(app_settings.file_paths.result_cards_folder_path, name),
+        os.path.join(app_settings.file_paths.result_notes_folder_path, name)
+    )
+
+
+def _init_worker(
+    log_level: str,
+    limiter: Optional[SharedRateLimiter],
+    cassette: Optional[Tuple[str, str, float]],
+    trace_origin_ns: Optional[int]
+):
+    logging.basicConfig(
+        level=getattr(logging, log_level),
+        format=f'%(asctime)s - worker {os.getpid()} - %(name)s - %(levelname)s - %(message)s'
+    )
+    rate_limiter.install_request_limiter(limiter)
+    if cassette is not None:
+        install_cassette(*cassette)
+    if trace_origin_ns is not None:
+        tracer.enable(trace_origin_ns, f"worker {os.getpid()}")
+
+
+def process_notebook(app_settings: AppSettings, args, notes_path: str, cards_folder: str, notes_folder: str) -> Dict[str, Any]:
+    """
+    Process one notes file in a worker process.
+
+    Args:
+        app_settings: The application settings.
+        args: The parsed command line arguments.
+        notes_path: The notes file path.
+        cards_folder: The cards output folder.
+        notes_folder: The notes output folder.
+
+    Returns:
+        The result of the notes file with its metrics.
+    """
+    import main
+
+    app_settings.file_paths.source_note_path = notes_path
+    app_settings.file_paths.result_cards_folder_path = cards_folder
+    app_settings.file_paths.result_notes_folder_path = notes_folder
+
+    run_metrics.reset()
+    result = {"notes_file": notes_path, "cards_folder": cards_folder, "notes_folder": notes_folder, "status": "ok"}
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span("notes_file", "batch", notes_file=notes_path):
+            cards_template, note_template = main.load_templates(app_settings)
+            main.process_notes_file(app_settings, args, cards_template, note_template)
+    except Exception as ex:
+        logging.exception(f"Failed to process notes file {notes_path}")
+        result["status"] = "failed"
+        result["error"] = str(ex)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profile_path = f"{args.profile}.{os.path.splitext(os.path.basename(notes_path))[0]}"
+            profiler.dump_stats(profile_path)
+            logging.info(f"Saved profile of {notes_path} to {profile_path}")
+
+    result["metrics"] = run_metrics.to_dict()
+    result["http_pools"] = http_pool_statistics()
+    if tracer.enabled:
+        result["trace_events"] = tracer.take_events()
+    return result
+
+
+def run_batch(app_settings: AppSettings, args) -> Dict[str, Any]:
+    """
+    Process every notes file of the batch and merge their metrics.
+
+    Args:
+        app_settings: The application settings.
+        args: The parsed command line arguments.
+
+    Returns:
+        The batch report.
+    """
+    notes_files = discover_notes_files(args.batch)
+    if not notes_files:
+        logging.error(f"No notes files found for {args.batch}")
+        return {"notes_files": [], "totals": RunMetrics().to_dict(), "wall_seconds": 0.0, "workers": 0}
+
+    workers = min(args.workers or os.cpu_count() or 1, len(notes_files))
+    logging.info(f"Processing {len(notes_files)} notes file(s) with {workers} worker process(es)")
+
+    started = time.perf_counter()
+    results = []
+    # Forked workers would inherit the HTTP client and tracer threads of this process
+    context = multiprocessing.get_context("spawn")
+    trace_origin_ns = tracer.origin_ns if tracer.enabled else None
+    with context.Manager() as manager:
+        requests_per_minute = app_settings.processing.requests_per_minute
+        limiter = SharedRateLimiter.shared(manager, requests_per_minute) if requests_per_minute else None
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(args.log_level, limiter, current_cassette(), trace_origin_ns)
+        ) as pool:
+            futures = []
+            for notes_path in notes_files:
+                cards_folder, notes_folder = notebook_output_folders(notes_path, app_settings, args.output_root)
+                futures.append(pool.submit(process_notebook, app_settings, args, notes_path, cards_folder, notes_folder))
+
+            for future in as_completed(futures):
+                result = future.result()
+                tracer.add_events(result.pop("trace_events", []))
+                counters = result["metrics"]["counters"]
+                logging.info(
+                    f"{result['notes_file']}: {result['status']}, "
+                    f"{counters.get('sections_processed', 0)} processed, {counters.get('sections_failed', 0)} failed"
+                )
+                results.append(result)
+                # The live metrics of the batch grow with every finished notes file
+                run_metrics.add_snapshot(result["metrics"], gauges=False)
+
+    results.sort(key=lambda r: r["notes_file"])
+    report = {
+        "notes_files": results,
+        "totals": RunMetrics.merge(r["metrics"] for r in results),
+        "wall_seconds": time.perf_counter() - started,
+        "workers": workers
+    }
+    logging.info(f"Batch finished in {report['wall_seconds']:.1f}s: {report['totals']['counters']}")
+    return report
@@ -0,0 +1,605 @@
+"""
+Backfill through the providers' asynchronous batch API.
+
+Every selected day (every chunk of an oversized day) is a conversation that goes
+through the group chat's stages in batches instead of interactive requests: the
+teacher requests of all conversations are written to one JSONL batch file, which
+is uploaded, submitted and polled until the batch is done. The reviewer's
+verdicts then send each conversation to the extractor or back to the teacher in
+the next batches, until its cards are extracted. Each finished day is written by
+main.write_section_result, like in a regular run.
+
+The conversations and the submitted batches are saved to Processing.BatchStatePath,
+when given, so a stopped backfill resumes polling its batches instead of
+submitting them again.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from agents.english_teacher_agent import EnglishTeacherAgent
+from agents.flashcard_extractor_agent import FlashCardExtractorAgent
+from agents.flashcard_reviewer_agent import FlashcardReviewerAgent
+from card_codec import CardDecodeError, CardRecord
+from chunking import merge_flash_cards, split_section
+from config.config_loader import AgentModelSettings, AppSettings, ProviderSettings
+from http_clients import provider_endpoint
+from manifest import FAILED
+from metrics import run_metrics
+from note_tools import NoteIndex
+from review_verdict import parse_review_verdict
+from routing import AGENT_KEYS, configured_providers, provider_models
+
+
+TEACHER, REVIEWER, EXTRACTOR = AGENT_KEYS
+DONE = "done"
+
+USER_PROXY_NAME = "UserProxy"
+
+# Statuses after which a batch no longer changes
+FINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+DEFAULT_AZURE_BATCH_API_VERSION = "2024-10-21"
+
+
+class BatchApiClient:
+    """
+    Client of an OpenAI-compatible batch API: file uploads, batches and their output files.
+    """
+    def __init__(self, provider_settings: ProviderSettings, endpoint: Optional[str] = None):
+        """
+        Args:
+            provider_settings: The provider whose batch API is used.
+            endpoint: A base URL that replaces the provider's, e.g. of the local stand-in server.
+        """
+        settings = provider_settings.get_settings()
+        if settings is None:
+            raise ValueError(f"Unknown provider type: {provider_settings.type}")
+
+        headers = {"Authorization": f"Bearer {settings.api_key}"}
+        params = {}
+        # The url of the requests in the batch file and the endpoint of the batch
+        self.request_url = "/v1/chat/completions"
+        if endpoint:
+            base_url = endpoint.rstrip("/")
+        elif provider_settings.type == "Azure":
+            base_url = f"{settings.endpoint.rstrip('/')}/openai"
+            headers = {"api-key": settings.api_key}
+            params = {"api-version": settings.api_version or DEFAULT_AZURE_BATCH_API_VERSION}
+            self.request_url = "/chat/completions"
+        elif provider_settings.type == "OpenRouter":
+            raise ValueError(f"Provider {provider_settings.name}: OpenRouter has no batch API, set Processing.BatchEndpoint")
+        else:
+            base_url = provider_endpoint(provider_settings)
+
+        http = provider_settings.http
+        self.base_url = base_url
+        self._client = httpx.Client(
+            base_url=base_url,
+            headers=headers,
+            params=params,
+            timeout=httpx.Timeout(http.timeout, connect=http.connect_timeout)
+        )
+
+    def upload(self, name: str, content: bytes) -> str:
+        """
+        Upload a batch input file.
+
+        Returns:
+            The file id.
+        """
+        response = self._client.post(
+            "/files", data={"purpose": "batch"}, files={"file": (name, content, "application/jsonl")}
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def create(self, input_file_id: str, completion_window: str) -> Dict[str, Any]:
+        """
+        Submit a batch of an uploaded input file.
+
+        Returns:
+            The batch object.
+        """
+        response = self._client.post("/batches", json={
+            "input_file_id": input_file_id,
+            "endpoint": self.request_url,
+            "completion_window": completion_window
+        })
+        response.raise_for_status()
+        return response.json()
+
+    def retrieve(self, batch_id: str) -> Dict[str, Any]:
+        """
+        Get the current state of a batch.
+        """
+        response = self._client.get(f"/batches/{batch_id}")
+        response.raise_for_status()
+        return response.json()
+
+    def download(self, file_id: str) -> str:
+        """
+        Get the content of an output or error file.
+        """
+        response = self._client.get(f"/files/{file_id}/content")
+        response.raise_for_status()
+        return response.text
+
+    def close(self):
+        self._client.close()
+
+
+class Conversation:
+    """
+    The group chat of a day, or of a chunk of an oversized day, run stage by stage in batches.
+    """
+    def __init__(
+        self,
+        key: str,
+        note_date: str,
+        index: int,
+        section: str,
+        chunk: int,
+        chunks: int,
+        transcript: List[Dict[str, str]],
+        stage: str = TEACHER,
+        failures: int = 0,
+        cards: Optional[List[CardRecord]] = None,
+        error: Optional[str] = None
+    ):
+        """
+        Args:
+            key: The conversation id, unique in the backfill.
+            note_date: The date of the day, yyyy-MM-dd.
+            index: The index of the day in the run.
+            section: The section text of the whole day.
+            chunk: The number of the chunk in the day.
+            chunks: The number of chunks of the day.
+            transcript: The messages of the chat as {"name", "content"}, starting with the request of the user proxy.
+            stage: The agent that speaks next, DONE or FAILED.
+            failures: The failed requests of the conversation.
+            cards: The extracted cards.
+            error: Why the conversation failed.
+        """
+        self.key = key
+        self.note_date = note_date
+        self.index = index
+        self.section = section
+        self.chunk = chunk
+        self.chunks = chunks
+        self.transcript = transcript
+        self.stage = stage
+        self.failures = failures
+        self.cards = cards
+        self.error = error
+
+    @property
+    def active(self) -> bool:
+        return self.stage not in (DONE, FAILED)
+
+    def fail(self, error: str):
+        self.stage = FAILED
+        self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "note_date": self.note_date,
+            "index": self.index,
+            "section": self.section,
+            "chunk": self.chunk,
+            "chunks": self.chunks,
+            "transcript": self.transcript,
+            "stage": self.stage,
+            "failures": self.failures,
+            "cards": [list(card) for card in self.cards] if self.cards is not None else None,
+            "error": self.error
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> 'Conversation':
+        cards = data.get("cards")
+        return Conversation(
+            data["key"],
+            data["note_date"],
+            data["index"],
+            data["section"],
+            data["chunk"],
+            data["chunks"],
+            data["transcript"],
+            data["stage"],
+            data.get("failures", 0),
+            [CardRecord(*card) for card in cards] if cards is not None else None,
+            data.get("error")
+        )
+
+
+def agent_messages(instruction: str, agent_name: str, transcript: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Build the messages of an agent's request from the chat, as the group chat shows them to the agent.
+
+    The agent's own messages are the assistant's, the others' are user messages with their speaker's name.
+    """
+    messages = [{"role": "system", "content": instruction}]
+    for message in transcript:
+        if message["name"] == agent_name:
+            messages.append({"role": "assistant", "content": message["content"]})
+        else:
+            messages.append({"role": "user", "name": message["name"], "content": message["content"]})
+    return messages
+
+
+def request_body(provider_settings: ProviderSettings, agent_settings: AgentModelSettings, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Build the chat completion request body of an agent, with the model options of its provider.
+    """
+    settings = provider_settings.get_settings()
+    body = {"model": settings.model_name, "messages": messages}
+
+    # Add temperature only if the model supports it
+    if settings.use_temperature:
+        body["temperature"] = agent_settings.temperature
+
+    # Reasoning models take max_completion_tokens instead of max_tokens
+    if settings.use_completion_tokens:
+        body["max_completion_tokens"] = agent_settings.max_tokens
+    else:
+        body["max_tokens"] = agent_settings.max_tokens
+    return body
+
+
+def parse_output_line(entry: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Get the answer of a request from a line of a batch output or error file.
+
+    Returns:
+        The content of the answer and None, or None and the error.
+    """
+    response = entry.get("response") or {}
+    if entry.get("error") or response.get("status_code") != 200:
+        error = entry.get("error") or (response.get("body") or {}).get("error") or f"HTTP {response.get('status_code')}"
+        return None, error.get("message", str(error)) if isinstance(error, dict) else str(error)
+
+    body = response.get("body") or {}
+    usage = body.get("usage") or {}
+    run_metrics.increment("prompt_tokens", usage.get("prompt_tokens", 0))
+    run_metrics.increment("completion_tokens", usage.get("completion_tokens", 0))
+    choices = body.get("choices") or [{}]
+    content = (choices[0].get("message") or {}).get("content")
+    if not content:
+        return None, "Empty answer"
+    return content, None
+
+
+class BatchBackfill:
+    """
+    Runs the conversations of a backfill through the batch API, one batch per agent and step.
+    """
+    def __init__(self, app_settings: AppSettings, conversations: List[Conversation], batches: List[Dict[str, Any]], state_path: Optional[str] = None):
+        """
+        Args:
+            app_settings: The application settings.
+            conversations: The conversations of the backfill.
+            batches: The submitted batches of a resumed backfill.
+            state_path: Saves the state of the backfill, when given.
+        """
+        self.app_settings = app_settings
+        self.conversations = {conversation.key: conversation for conversation in conversations}
+        self.batches = batches
+        self.state_path = state_path
+        self.source_path = app_settings.file_paths.source_note_path
+
+        processing = app_settings.processing
+        agents = app_settings.agents
+        self._agents = {}
+        for stage, agent_class, agent_settings in (
+            (TEACHER, EnglishTeacherAgent, agents.teacher_agent),
+            (REVIEWER, FlashcardReviewerAgent, agents.reviewer_agent),
+            (EXTRACTOR, FlashCardExtractorAgent, agents.extractor_agent)
+        ):
+            provider_settings = app_settings.get_provider_by_name(agent_settings.provider_name)
+            if provider_settings is None:
+                raise ValueError(f"Provider not found: {agent_settings.provider_name}")
+            agent = agent_class(agent_settings.temperature, agent_settings.max_tokens, processing.instruction_version)
+            self._agents[stage] = (agent, agent_settings, provider_settings)
+        self._clients: Dict[str, BatchApiClient] = {}
+
+    def _client(self, provider_settings: ProviderSettings) -> BatchApiClient:
+        client = self._clients.get(provider_settings.name)
+        if client is None:
+            client = BatchApiClient(provider_settings, self.app_settings.processing.batch_endpoint)
+            self._clients[provider_settings.name] = client
+        return client
+
+    def close(self):
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+
+    def save_state(self):
+        """
+        Save the conversations and the submitted batches, replacing the state file atomically.
+        """
+        if not self.state_path:
+            return
+        state = {
+            "source_path": self.source_path,
+            "conversations": [conversation.to_dict() for conversation in self.conversations.values()],
+            "batches": self.batches
+        }
+        temporary_path = f"{self.state_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temporary_path, self.state_path)
+
+    def submit(self, stage: str, conversations: List[Conversation]) -> Dict[str, Any]:
+        """
+        Submit the next requests of the conversations to the batch API of the stage's agent.
+
+        Returns:
+            The record of the submitted batch.
+        """
+        agent, agent_settings, provider_settings = self._agents[stage]
+        client = self._client(provider_settings)
+        requests = {}
+        lines = []
+        for conversation in conversations:
+            custom_id = f"{conversation.key}/{len(conversation.transcript)}"
+            requests[custom_id] = conversation.key
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": client.request_url,
+                "body": request_body(provider_settings, agent_settings, agent_messages(agent.instruction, agent.name, conversation.transcript))
+            }, ensure_ascii=False))
+
+        content = ("\n".join(lines) + "\n").encode("utf-8")
+        file_id = client.upload(f"{stage}-{int(time.time())}.jsonl", content)
+        batch = client.create(file_id, self.app_settings.processing.batch_completion_window)
+        logging.info(f"Submitted batch {batch['id']} of {len(lines)} {stage} request(s) to {provider_settings.name} ({len(content)} bytes)")
+        run_metrics.increment("batches_submitted")
+        run_metrics.increment("batch_requests", len(lines))
+        return {"id": batch["id"], "stage": stage, "provider": provider_settings.name, "requests": requests, "submitted": time.time()}
+
+    def poll(self):
+        """
+        Wait until every submitted batch is final and apply its answers.
+        """
+        poll_seconds = self.app_settings.processing.batch_poll_seconds
+        while self.batches:
+            for record in list(self.batches):
+                _, _, provider_settings = self._agents[record["stage"]]
+                client = self._client(provider_settings)
+                try:
+                    batch = client.retrieve(record["id"])
+                except httpx.HTTPError as ex:
+                    logging.warning(f"Could not poll batch {record['id']}: {ex}")
+                    continue
+
+                counts = batch.get("request_counts") or {}
+                logging.info(
+                    f"Batch {record['id']} ({record['stage']}): {batch['status']}, "
+                    f"{counts.get('completed', 0)}/{counts.get('total', len(record['requests']))} completed, {counts.get('failed', 0)} failed"
+                )
+                if batch["status"] not in FINAL_BATCH_STATUSES:
+                    continue
+
+                answers = {}
+                for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                    if file_id:
+                        for line in client.download(file_id).splitlines():
+                            if line.strip():
+                                entry = json.loads(line)
+                                answers[entry.get("custom_id")] = parse_output_line(entry)
+
+                run_metrics.observe("batch_wait", time.time() - record["submitted"])
+                self.apply(record, batch, answers)
+                self.batches.remove(record)
+                run_metrics.set_gauge("batches_in_flight", len(self.batches))
+                self.save_state()
+
+            if self.batches:
+                time.sleep(poll_seconds)
+
+    def apply(self, record: Dict[str, Any], batch: Dict[str, Any], answers: Dict[str, Tuple[Optional[str], Optional[str]]]):
+        """
+        Advance the conversations of a final batch with its answers.
+        """
+        from main import parse_extractor_response
+
+        stage = record["stage"]
+        agent, _, _ = self._agents[stage]
+        max_attempts = self.app_settings.processing.max_processing_attempts
+        max_round = self.app_settings.processing.max_round
+
+        for custom_id, key in record["requests"].items():
+            conversation = self.conversations.get(key)
+            if conversation is None or conversation.stage != stage:
+                continue
+
+            content, error = answers.get(custom_id, (None, f"Not answered, the batch is {batch['status']}"))
+            if content is not None and stage == EXTRACTOR:
+                try:
+                    conversation.cards = parse_extractor_response(content)
+                except (CardDecodeError, ValueError) as ex:
+                    content, error = None, f"Invalid extractor answer: {ex}"
+
+            if content is None:
+                run_metrics.increment("batch_requests_failed")
+                conversation.failures += 1
+                if conversation.failures >= max_attempts:
+                    logging.error(f"Conversation {key}: the {stage} request failed {conversation.failures} time(s): {error}")
+                    conversation.fail(error)
+                else:
+                    logging.warning(f"Conversation {key}: the {stage} request failed, retrying in the next batch: {error}")
+                    run_metrics.increment("retries")
+                continue
+
+            conversation.transcript.append({"name": agent.name, "content": content})
+            if stage == TEACHER:
+                conversation.stage = REVIEWER
+            elif stage == REVIEWER:
+                verdict = parse_review_verdict(content)
+                run_metrics.increment("review_rounds")
+                run_metrics.increment("cards_rejected", len(verdict.rejected))
+                if not verdict.structured:
+                    run_metrics.increment("unstructured_verdicts")
+                conversation.stage = EXTRACTOR if verdict.approved else TEACHER
+            else:
+                conversation.stage = DONE
+
+            # Like the group chat, the extractor has to answer within MaxRound messages
+            if conversation.active and len(conversation.transcript) >= max_round:
+                conversation.fail(f"No cards were extracted within {max_round} rounds")
+
+    def write_finished_days(self, cards_template: str, note_template: str):
+        """
+        Write the days whose conversations are all finished and drop them from the backfill.
+        """
+        import main
+
+        days: Dict[str, List[Conversation]] = {}
+        for conversation in self.conversations.values():
+            days.setdefault(conversation.note_date, []).append(conversation)
+
+        used_models = set(provider_models(self.app_settings, configured_providers(self.app_settings)))
+        for note_date, conversations in days.items():
+            if any(conversation.active for conversation in conversations):
+                continue
+
+            conversations.sort(key=lambda conversation: conversation.chunk)
+            first = conversations[0]
+            failed = [conversation for conversation in conversations if conversation.stage == FAILED]
+            if failed:
+                logging.error(f"Failed to process section {first.index} ({note_date}): {failed[0].error}")
+                run_metrics.increment("sections_failed")
+                result = main.SectionResult(
+                    first.section, datetime.strptime(note_date, "%Y-%m-%d"), first.index, self.source_path, status=FAILED, error=failed[0].error
+                )
+            else:
+                flash_cards = merge_flash_cards([conversation.cards for conversation in conversations])
+                result = main.SectionResult(first.section, datetime.strptime(note_date, "%Y-%m-%d"), first.index, self.source_path, flash_cards, used_models)
+            main.write_section_result(result, self.app_settings, cards_template, note_template)
+
+            for conversation in conversations:
+                del self.conversations[conversation.key]
+        self.save_state()
+
+    def run(self, cards_template: str, note_template: str):
+        """
+        Submit and poll batches until every conversation is finished, writing the days as they finish.
+        """
+        # The batches of a resumed backfill are polled before anything is submitted
+        self.poll()
+        self.write_finished_days(cards_template, note_template)
+        while self.conversations:
+            for stage in AGENT_KEYS:
+                ready = [conversation for conversation in self.conversations.values() if conversation.stage == stage]
+                if ready:
+                    self.batches.append(self.submit(stage, ready))
+                    run_metrics.set_gauge("batches_in_flight", len(self.batches))
+                    self.save_state()
+            self.poll()
+            self.write_finished_days(cards_template, note_template)
+
+
+def create_conversations(app_settings: AppSettings, args) -> List[Conversation]:
+    """
+    Create the conversations of the selected days of FilePaths.SourceNotePath.
+    """
+    processing = app_settings.processing
+    note_index = NoteIndex.build(app_settings.file_paths.source_note_path)
+    entries = note_index.select(since=args.since, until=args.until, date=args.date, last=args.last)
+    logging.info(f"Selected {len(entries)} of {len(note_index.entries)} dated section(s)")
+    if processing.test_mode:
+        logging.info(f"Running in TEST MODE - processing only {processing.max_sections_in_test_mode} section(s)")
+        entries = entries[:processing.max_sections_in_test_mode]
+    run_metrics.increment("sections_selected", len(entries))
+
+    from main import extraction_message
+
+    conversations = []
+    for index, entry in enumerate(entries):
+        section = note_index.read_section(entry)
+        if len(section.split("\n")) < 2:
+            logging.error(f"Section {index} has less than 2 lines, skipping")
+            run_metrics.increment("sections_skipped")
+            continue
+
+        note_date = entry.date.strftime("%Y-%m-%d")
+        chunks = split_section(section, processing.chunk_max_tokens)
+        if len(chunks) > 1:
+            run_metrics.increment("sections_chunked")
+            run_metrics.increment("chunks", len(chunks))
+        for chunk, text in enumerate(chunks):
+            message = extraction_message(text, processing.compress_notes)
+            conversations.append(Conversation(
+                f"{note_date}#{chunk}", note_date, index, section, chunk, len(chunks),
+                [{"name": USER_PROXY_NAME, "content": message}]
+            ))
+    return conversations
+
+
+def load_state(path: str) -> Tuple[Optional[str], List[Conversation], List[Dict[str, Any]]]:
+    """
+    Load the notes file, the conversations and the submitted batches of a stopped backfill.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    conversations = [Conversation.from_dict(data) for data in state["conversations"]]
+    return state.get("source_path"), conversations, state["batches"]
+
+
+def run_backfill(app_settings: AppSettings, args):
+    """
+    Generate the selected days through the batch API, or resume the backfill of Processing.BatchStatePath.
+
+    Args:
+        app_settings: The application settings.
+        args: The parsed command line arguments.
+    """
+    import main
+
+    processing = app_settings.processing
+    state_path = processing.batch_state_path
+    if app_settings.routing.rules:
+        logging.info("Routing rules are not applied in backfill mode, every agent uses its configured provider")
+    if processing.diff_regeneration:
+        logging.info("Diff regeneration is not applied in backfill mode, every day is generated in full")
+
+    if state_path and os.path.exists(state_path):
+        source_path, conversations, batches = load_state(state_path)
+        # The cards of the state's days would be recorded under the configured notes file
+        if source_path is None or os.path.abspath(source_path) != os.path.abspath(app_settings.file_paths.source_note_path):
+            raise ValueError(
+                f"The backfill state {state_path} belongs to {source_path}, not to {app_settings.file_paths.source_note_path}: "
+                f"set FilePaths.SourceNotePath to its notes file to resume it, or remove it to start a new backfill"
+            )
+        logging.info(f"Resuming the backfill of {state_path}: {len(conversations)} conversation(s), {len(batches)} submitted batch(es)")
+    else:
+        conversations, batches = create_conversations(app_settings, args), []
+
+    if processing.dry_run:
+        days = len({conversation.note_date for conversation in conversations})
+        logging.info(f"[DRY RUN] Would backfill {days} day(s) in {len(conversations)} conversation(s), {len(batches)} batch(es) submitted")
+        return
+
+    cards_template, note_template = main.load_templates(app_settings)
+    backfill = BatchBackfill(app_settings, conversations, batches, state_path)
+    started = time.perf_counter()
+    try:
+        backfill.save_state()
+        backfill.run(cards_template, note_template)
+    finally:
+        backfill.close()
+    run_metrics.observe("backfill", time.perf_counter() - started)
+
+    if state_path and os.path.exists(state_path):
+        os.remove(state_path)
+    logging.info(f"Backfill finished in {time.perf_counter() - started:.1f}s")
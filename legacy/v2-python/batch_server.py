@@ -0,0 +1,226 @@
+"""
+A local stand-in for the providers' batch API, to run a backfill offline.
+
+Serves the OpenAI-compatible file and batch endpoints the backfill uses: uploads
+of batch input files, batch creation and polling and the output file download.
+A batch stays in progress for a configurable time, then every request of its
+input file is answered by the mock provider (see mock_provider.py).
+
+Usage (from legacy/v2-python):
+    python batch_server.py [--port 8765] [--complete-after 5]
+    python main.py --backfill --batch-endpoint http://127.0.0.1:8765/v1 --last 5
+"""
+
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from mock_provider import mock_completion
+
+
+API_PREFIX = "/v1"
+
+
+class BatchStore:
+    """
+    The uploaded files and the batches of the server, batches are completed when they are polled after their time.
+    """
+    def __init__(self, complete_after: float):
+        self.complete_after = complete_after
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.contents: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def add_file(self, name: str, purpose: str, content: bytes) -> Dict[str, Any]:
+        with self._lock:
+            file = {
+                "id": f"file-{next(self._ids)}",
+                "object": "file",
+                "bytes": len(content),
+                "created_at": int(time.time()),
+                "filename": name,
+                "purpose": purpose
+            }
+            self.files[file["id"]] = file
+            self.contents[file["id"]] = content
+            return file
+
+    def add_batch(self, input_file_id: str, endpoint: str, completion_window: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if input_file_id not in self.contents:
+                return None
+            batch = {
+                "id": f"batch_{next(self._ids)}",
+                "object": "batch",
+                "endpoint": endpoint,
+                "input_file_id": input_file_id,
+                "completion_window": completion_window,
+                "status": "in_progress",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": int(time.time()),
+                "completed_at": None,
+                "request_counts": {"total": sum(1 for line in self.contents[input_file_id].splitlines() if line.strip()), "completed": 0, "failed": 0}
+            }
+            self.batches[batch["id"]] = batch
+            return batch
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is not None and batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.complete_after:
+                self._complete(batch)
+            return batch
+
+    def _complete(self, batch: Dict[str, Any]):
+        """
+        Answer every request of the batch, the requests that are not chat completions fail.
+        """
+        output = []
+        counts = {"total": 0, "completed": 0, "failed": 0}
+        for line in self.contents[batch["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            counts["total"] += 1
+            request_id = f"batch_req_{next(self._ids)}"
+            if request.get("url", "").endswith("/chat/completions"):
+                counts["completed"] += 1
+                body = mock_completion(request.get("body") or {}, f"chatcmpl-mock-{next(self._ids)}")
+                response = {"status_code": 200, "request_id": request_id, "body": body}
+            else:
+                counts["failed"] += 1
+                response = {"status_code": 404, "request_id": request_id, "body": {"error": {"message": f"Unsupported url {request.get('url')}"}}}
+            output.append(json.dumps({"id": request_id, "custom_id": request.get("custom_id"), "response": response, "error": None}))
+
+        content = ("\n".join(output) + "\n").encode("utf-8")
+        file_id = f"file-{next(self._ids)}"
+        self.files[file_id] = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()), "filename": f"{batch['id']}_output.jsonl", "purpose": "batch_output"}
+        self.contents[file_id] = content
+        batch.update(status="completed", output_file_id=file_id, completed_at=int(time.time()), request_counts=counts)
+        logging.info(f"Completed {batch['id']}: {counts['completed']} of {counts['total']} request(s)")
+
+
+class BatchApiHandler(BaseHTTPRequestHandler):
+    """
+    Handles the file and batch requests with the server's BatchStore.
+    """
+    server_version = "BatchStandIn/1.0"
+
+    @property
+    def store(self) -> BatchStore:
+        return self.server.store
+
+    def _send_json(self, status: int, document: Dict[str, Any]):
+        body = json.dumps(document).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self):
+        self._send_json(404, {"error": {"message": f"No route for {self.command} {self.path}"}})
+
+    def _path(self) -> Optional[str]:
+        path = self.path.split("?", 1)[0]
+        return path[len(API_PREFIX):] if path.startswith(API_PREFIX + "/") else None
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        path = self._path()
+        if path == "/files":
+            self._upload()
+        elif path == "/batches":
+            request = json.loads(self._read_body() or b"{}")
+            batch = self.store.add_batch(request.get("input_file_id"), request.get("endpoint", ""), request.get("completion_window", "24h"))
+            if batch is None:
+                self._send_json(400, {"error": {"message": f"No such file: {request.get('input_file_id')}"}})
+            else:
+                self._send_json(200, batch)
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        path = self._path() or ""
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "batches":
+            batch = self.store.get_batch(parts[1])
+            if batch is None:
+                self._not_found()
+            else:
+                self._send_json(200, batch)
+        elif len(parts) == 3 and parts[0] == "files" and parts[2] == "content" and parts[1] in self.store.contents:
+            content = self.store.contents[parts[1]]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self._not_found()
+
+    def _upload(self):
+        """
+        Store the file of a multipart/form-data upload.
+        """
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        message = email.parser.BytesParser(policy=email.policy.default).parsebytes(header + self._read_body())
+        fields, file_name, content = {}, "upload.jsonl", None
+        for part in message.iter_parts() if message.is_multipart() else []:
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                file_name = part.get_filename() or file_name
+                content = part.get_payload(decode=True) or b""
+            elif name:
+                fields[name] = (part.get_payload(decode=True) or b"").decode("utf-8")
+        if content is None:
+            self._send_json(400, {"error": {"message": "The upload has no file"}})
+            return
+        self._send_json(200, self.store.add_file(file_name, fields.get("purpose", "batch"), content))
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def create_server(host: str, port: int, complete_after: float) -> ThreadingHTTPServer:
+    """
+    Create the stand-in server, serve it with serve_forever.
+    """
+    server = ThreadingHTTPServer((host, port), BatchApiHandler)
+    server.store = BatchStore(complete_after)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the batch API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--complete-after", type=float, default=5.0, metavar="SECONDS", help="How long a batch stays in progress")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = create_server(args.host, args.port, args.complete_after)
+    logging.info(f"Batch API stand-in listening on http://{args.host}:{server.server_port}{API_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
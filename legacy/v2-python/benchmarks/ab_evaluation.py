@@ -0,0 +1,253 @@
+"""
+A/B evaluation of configuration variants: throughput against card yield.
+
+Runs the card generation of the same days under several AppSettings variants at
+the same time, one worker process per variant, and prints a comparison table:
+wall time, prompt and completion tokens, review rounds, retries, failed days,
+cards and the overlap of the cards with the first (baseline) variant. Nothing is
+written besides the optional JSON report.
+
+The model requests are answered by the local mock provider (--mock), or served
+from one cassette per variant (--cassettes DIR, recorded with --record), so
+performance changes can be judged offline. No cache answers any request, each
+variant checks that before it runs.
+
+A variants file lists the variants, each one's Settings are merged over the
+configuration (lists of named entries, like Providers, by their Name):
+    [
+      {"Name": "baseline"},
+      {"Name": "max-round-8", "Settings": {"Processing": {"MaxRound": 8}}},
+      {"Name": "compact", "Settings": {"Processing": {"InstructionVersion": "compact-v1", "CompressNotes": true}}}
+    ]
+
+Usage (from legacy/v2-python):
+    python benchmarks/ab_evaluation.py --variants variants.json --mock [--speed 0]
+        [--config appsettings.json] [--source ../../example/input/sample_notes_20_days.md] [--last N] [--out report.json]
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_codec import CardRecord
+from chunking import card_overlap
+
+
+DEFAULT_SOURCE = os.path.join("..", "..", "example", "input", "sample_notes_20_days.md")
+
+
+def merge_settings(base: Any, override: Any) -> Any:
+    """
+    Merge the settings of a variant over the configuration.
+
+    Objects are merged key by key, lists of objects with a Name entry by name,
+    other values are replaced.
+    """
+    if isinstance(base, dict) and isinstance(override, dict):
+        merged = dict(base)
+        for key, value in override.items():
+            merged[key] = merge_settings(base[key], value) if key in base else copy.deepcopy(value)
+        return merged
+    if isinstance(base, list) and isinstance(override, list) and all(isinstance(item, dict) and "Name" in item for item in override):
+        merged = [copy.deepcopy(item) for item in base]
+        names = {item.get("Name"): index for index, item in enumerate(merged) if isinstance(item, dict)}
+        for item in override:
+            if item["Name"] in names:
+                merged[names[item["Name"]]] = merge_settings(merged[names[item["Name"]]], item)
+            else:
+                merged.append(copy.deepcopy(item))
+        return merged
+    return copy.deepcopy(override)
+
+
+async def generate_cards(note_index, entries: list, app_settings) -> Dict[str, Optional[List[Tuple[str, str, bool]]]]:
+    """
+    Generate the cards of the days concurrently, Processing.MaxConcurrency at a time.
+
+    Returns:
+        The cards of every day, None for the failed days.
+    """
+    import main
+
+    semaphore = asyncio.Semaphore(max(app_settings.processing.max_concurrency, 1))
+
+    async def generate(index, entry):
+        async with semaphore:
+            section = note_index.read_section(entry)
+            try:
+                result = await main.generate_section_async(section, entry.date, index, app_settings)
+            except Exception:
+                logging.exception(f"Failed to process section {index}")
+                return None
+        return [tuple(card) for card in result.flash_cards] if result is not None and result.flash_cards else None
+
+    cards = await asyncio.gather(*(generate(index, entry) for index, entry in enumerate(entries)))
+    return {entry.date.strftime("%Y-%m-%d"): day_cards for entry, day_cards in zip(entries, cards)}
+
+
+def check_uncached(app_settings):
+    """
+    Check that no AG2 cache answers the requests of a variant, neither the response cache nor AG2's legacy .cache/<seed>.
+    """
+    import main
+    from response_cache import get_response_cache
+
+    processing = app_settings.processing
+    if get_response_cache(processing.cache_path, processing.cache_seed) is not None:
+        raise RuntimeError("The response cache is enabled")
+
+    team = main.create_agent_team(app_settings)
+    configs = [agent.llm_config for agent in (team.teacher_agent, team.reviewer_agent, team.extractor_agent)]
+    configs.append(team.manager_llm_config)
+    for config in configs:
+        # AG2 uses its legacy seed when the config has none
+        if isinstance(config, dict):
+            cached = config.get("cache_seed", "default") is not None
+        else:
+            cached = getattr(config, "cache_seed", None) is not None
+        if cached:
+            raise RuntimeError("An llm config doesn't set cache_seed to None, AG2 would cache its responses")
+
+
+def run_variant(name: str, config: Dict[str, Any], source: str, last: Optional[int], transport: Tuple[str, str, float], log_level: str) -> Dict[str, Any]:
+    """
+    Generate the cards of the selected days under one variant, in a worker process.
+    """
+    logging.basicConfig(level=getattr(logging, log_level), format=f"%(asctime)s - {name} - %(levelname)s - %(message)s")
+
+    from config.config_loader import AppSettings
+    from http_clients import close_http_clients, install_cassette
+    from metrics import run_metrics
+    from note_tools import NoteIndex
+    import main
+
+    install_cassette(*transport)
+    app_settings = AppSettings.from_dict(config)
+    processing = app_settings.processing
+    # Every request must reach the provider under test and nothing is written
+    processing.dry_run = False
+    processing.cache_path = None
+    processing.manifest_path = None
+    processing.diff_regeneration = False
+    main.install_request_limits(app_settings)
+    check_uncached(app_settings)
+
+    note_index = NoteIndex.build(source)
+    entries = note_index.select(last=last)
+
+    run_metrics.reset()
+    started = time.perf_counter()
+    try:
+        cards = asyncio.run(generate_cards(note_index, entries, app_settings))
+    finally:
+        close_http_clients()
+    return {
+        "name": name,
+        "wall_seconds": time.perf_counter() - started,
+        "metrics": run_metrics.to_dict(),
+        "cards": cards
+    }
+
+
+def compare(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Summarize every variant and the overlap of its cards with the baseline's, per day on average.
+    """
+    baseline = results[0]["cards"]
+    rows = []
+    for result in results:
+        counters = result["metrics"]["counters"]
+        days = result["cards"]
+        overlaps, front_overlaps = [], []
+        for date, baseline_cards in baseline.items():
+            expected = [CardRecord(*card) for card in baseline_cards or []]
+            cards = [CardRecord(*card) for card in days.get(date) or []]
+            overlaps.append(card_overlap(expected, cards))
+            front_overlaps.append(card_overlap(expected, cards, fronts_only=True))
+        rows.append({
+            "variant": result["name"],
+            "wall_seconds": round(result["wall_seconds"], 2),
+            "prompt_tokens": counters.get("prompt_tokens", 0),
+            "completion_tokens": counters.get("completion_tokens", 0),
+            "review_rounds": counters.get("review_rounds", 0),
+            "retries": counters.get("retries", 0),
+            "failed_days": sum(1 for cards in days.values() if cards is None),
+            "cards": sum(len(cards) for cards in days.values() if cards),
+            "overlap": round(sum(overlaps) / len(overlaps), 3) if overlaps else 1.0,
+            "front_overlap": round(sum(front_overlaps) / len(front_overlaps), 3) if front_overlaps else 1.0
+        })
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    columns = list(rows[0])
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns).rstrip())
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(widths[column]) for column in columns).rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare configuration variants on the same days")
+    parser.add_argument("--variants", required=True, help="JSON file with the variants, the first one is the baseline")
+    parser.add_argument("--config", default="appsettings.json", help="The configuration the variants are merged over")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="The notes file")
+    parser.add_argument("--last", type=int, metavar="N", help="Only the N most recent days")
+    transport = parser.add_mutually_exclusive_group(required=True)
+    transport.add_argument("--mock", action="store_true", help="Answer the requests with the local mock provider")
+    transport.add_argument("--cassettes", metavar="DIR", help="Replay <DIR>/<variant>.jsonl.gz per variant")
+    parser.add_argument("--record", action="store_true", help="Record the cassettes from the providers instead of replaying them")
+    parser.add_argument("--speed", type=float, default=0.0, help="Scale the recorded or mock response times, 0 answers without delays")
+    parser.add_argument("--out", metavar="PATH", help="Write the report as JSON to PATH")
+    parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        base = json.load(f)
+    with open(args.variants, "r") as f:
+        variants = json.load(f)
+    if not variants:
+        parser.error("The variants file lists no variants")
+    names = [variant["Name"] for variant in variants]
+    if len(set(names)) != len(names):
+        parser.error("Variant names must be unique")
+
+    def variant_transport(name: str) -> Tuple[str, str, float]:
+        if args.mock:
+            return ("mock", "", args.speed)
+        path = os.path.join(args.cassettes, f"{name}.jsonl.gz")
+        return ("record", path, 1.0) if args.record else ("replay", path, args.speed)
+
+    with ProcessPoolExecutor(max_workers=len(variants)) as pool:
+        futures = [
+            pool.submit(
+                run_variant,
+                variant["Name"],
+                merge_settings(base, variant.get("Settings", {})),
+                args.source,
+                args.last,
+                variant_transport(variant["Name"]),
+                args.log_level
+            )
+            for variant in variants
+        ]
+        results = [future.result() for future in futures]
+
+    rows = compare(results)
+    print_table(rows)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"variants": rows, "results": results}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
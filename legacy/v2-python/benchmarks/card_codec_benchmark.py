@@ -0,0 +1,106 @@
+"""
+Benchmark of the compact card decoder against the pydantic path.
+
+Decodes and formats a generated extractor response both ways:
+- pydantic: json.loads, renaming the capitalised keys per card, FlashCardsResponse validation
+- compact: card_codec.decode_flash_cards (single pass, tuple-backed records)
+and reports the best time and the peak allocated memory of each.
+
+Usage (from legacy/v2-python):
+    python benchmarks/card_codec_benchmark.py [--cards N] [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_codec import decode_flash_cards, format_flash_cards
+
+
+def generate_response(count: int) -> str:
+    """
+    Generate an extractor response with the given number of cards.
+    """
+    cards = [
+        {
+            "Front": f"phrasal verb {i} *Example sentence number {i}.*",
+            "Back": f"фразовый глагол {i}",
+            "IsReversed": i % 2 == 0
+        }
+        for i in range(count)
+    ]
+    return json.dumps({"FlashCards": cards}, ensure_ascii=False)
+
+
+def pydantic_path(content: str) -> str:
+    from data_classes import FlashCardsResponse
+
+    flash_cards_dict = json.loads(content)
+    for card in flash_cards_dict["FlashCards"]:
+        if "Front" in card:
+            card["front"] = card.pop("Front")
+        if "Back" in card:
+            card["back"] = card.pop("Back")
+        if "IsReversed" in card:
+            card["is_reversed"] = card.pop("IsReversed")
+    return FlashCardsResponse(**flash_cards_dict).format_flash_cards()
+
+
+def compact_path(content: str) -> str:
+    return format_flash_cards(decode_flash_cards(content))
+
+
+def measure(function, content: str, repeat: int):
+    """
+    Returns:
+        The best wall time in seconds, the peak traced memory in bytes and the output.
+    """
+    best = float("inf")
+    output = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = function(content)
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    function(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, output
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Card decoder benchmark")
+    parser.add_argument("--cards", type=int, default=200000, help="Number of cards in the generated response")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per path")
+    args = parser.parse_args()
+
+    content = generate_response(args.cards)
+    print(f"{args.cards} cards, {len(content) / 1024 / 1024:.1f} MiB of JSON")
+
+    compact_time, compact_peak, compact_output = measure(compact_path, content, args.repeat)
+    print(f"compact:  {compact_time * 1000:9.1f} ms  peak {compact_peak / 1024 / 1024:7.1f} MiB")
+
+    try:
+        import pydantic  # noqa: F401
+    except ImportError:
+        print("pydantic: not installed, skipping the comparison")
+        return 0
+
+    pydantic_time, pydantic_peak, pydantic_output = measure(pydantic_path, content, args.repeat)
+    print(f"pydantic: {pydantic_time * 1000:9.1f} ms  peak {pydantic_peak / 1024 / 1024:7.1f} MiB")
+    print(f"speedup:  {pydantic_time / compact_time:9.2f}x")
+
+    if compact_output != pydantic_output:
+        print("OUTPUT MISMATCH between the compact and the pydantic path")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Startup benchmark of the English Flashcard Generator.
+
+Measures the import profile of main.py with "python -X importtime" and the wall
+time of a CLI invocation that does no work, then checks both against the budget
+in startup_budget.json. Exits with a non-zero code when the budget is exceeded.
+
+Usage (from legacy/v2-python):
+    python benchmarks/startup_benchmark.py [--runs N] [--top N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    """
+    Parse the stderr of "python -X importtime".
+
+    Args:
+        output: The captured stderr.
+
+    Returns:
+        (module, self microseconds, cumulative microseconds) per imported module.
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure_import(runs: int) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """
+    Import main.py in fresh interpreters.
+
+    Args:
+        runs: The number of interpreters to start.
+
+    Returns:
+        The median cumulative import time of main in milliseconds and the profile of the last run.
+    """
+    timings = []
+    modules = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        )
+        modules = parse_importtime(result.stderr)
+        timings.append(next(cumulative for name, _, cumulative in modules if name == "main") / 1000)
+    return statistics.median(timings), modules
+
+
+def measure_cli_help(runs: int) -> float:
+    """
+    Run "python main.py --help" in fresh interpreters.
+
+    Args:
+        runs: The number of runs.
+
+    Returns:
+        The median wall time in milliseconds.
+    """
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", "--help"], cwd=PROJECT_DIR, capture_output=True, check=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Startup benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs per measurement")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to show")
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, 'r') as f:
+        budget: Dict = json.load(f)
+
+    import_ms, modules = measure_import(args.runs)
+    cli_ms = measure_cli_help(args.runs)
+
+    print("Slowest imports under main (cumulative):")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda m: m[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:8.1f} ms self  {name}")
+    print()
+
+    failures = []
+    imported = {name.strip().split(".")[0] for name, _, _ in modules}
+    forbidden = sorted(imported.intersection(budget["ForbiddenModules"]))
+    if forbidden:
+        failures.append(f"heavy modules imported at startup: {', '.join(forbidden)}")
+
+    print(f"import main:        {import_ms:8.1f} ms (budget {budget['ImportMainMs']} ms)")
+    if import_ms > budget["ImportMainMs"]:
+        failures.append(f"import main took {import_ms:.1f} ms")
+
+    print(f"main.py --help:     {cli_ms:8.1f} ms (budget {budget['CliHelpWallMs']} ms)")
+    if cli_ms > budget["CliHelpWallMs"]:
+        failures.append(f"main.py --help took {cli_ms:.1f} ms")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"OVER BUDGET: {failure}")
+        return 1
+
+    print("Startup is within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
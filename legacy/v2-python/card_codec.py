@@ -0,0 +1,129 @@
+"""
+Compact flashcard records and a single-pass decoder for the extractor's JSON.
+
+The pydantic models in data_classes.py validate a copy of every card dict after
+its keys have been renamed. For bulk work (re-export, dedup over large decks) the
+decoder here builds tuple-backed records in one pass over the decoded cards: it
+accepts the extractor's capitalised keys as well as the snake_case ones and
+doesn't rename or copy the card dicts.
+"""
+
+import json
+from typing import Any, Iterable, List, NamedTuple
+
+
+class CardDecodeError(ValueError):
+    """
+    Raised when the JSON doesn't describe a valid flashcards collection.
+    """
+
+
+class CardRecord(NamedTuple):
+    """
+    A single flashcard with front, back, and is_reversed fields.
+    """
+    front: str
+    back: str
+    is_reversed: bool = False
+
+
+_COLLECTION_KEYS = ("FlashCards", "flash_cards")
+
+# Lax boolean values accepted like pydantic does
+_TRUE_VALUES = {"true", "yes", "on", "1"}
+_FALSE_VALUES = {"false", "no", "off", "0"}
+
+_new_record = tuple.__new__
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE_VALUES:
+            return True
+        if lowered in _FALSE_VALUES:
+            return False
+    raise CardDecodeError(f"Invalid IsReversed value: {value!r}")
+
+
+def decode_flash_cards(content: str) -> List[CardRecord]:
+    """
+    Decode and validate the extractor's JSON response in a single pass over the cards.
+
+    The card objects produced by the JSON decoder are read in place, the
+    capitalised keys of the extractor and the snake_case keys are both accepted.
+
+    Args:
+        content: JSON of the form {"FlashCards": [{"Front": ..., "Back": ..., "IsReversed": ...}]}.
+
+    Returns:
+        The flashcards.
+
+    Raises:
+        CardDecodeError: If the JSON is not a valid flashcards collection.
+    """
+    try:
+        document = json.loads(content)
+    except json.JSONDecodeError as ex:
+        raise CardDecodeError(f"Invalid JSON: {ex}") from ex
+
+    cards = None
+    if isinstance(document, dict):
+        for key in _COLLECTION_KEYS:
+            if key in document:
+                cards = document[key]
+                break
+    if not isinstance(cards, list):
+        raise CardDecodeError("Expected a JSON object with a FlashCards list")
+
+    records = []
+    append = records.append
+    for card in cards:
+        if not isinstance(card, dict):
+            raise CardDecodeError(f"Invalid card: {card!r}")
+        get = card.get
+
+        front = get("Front")
+        if front is None:
+            front = get("front")
+        back = get("Back")
+        if back is None:
+            back = get("back")
+        is_reversed = get("IsReversed")
+        if is_reversed is None:
+            is_reversed = get("is_reversed", False)
+
+        if not isinstance(front, str) or not isinstance(back, str):
+            raise CardDecodeError(f"A card needs string Front and Back fields, got {front!r} and {back!r}")
+        if is_reversed is not True and is_reversed is not False:
+            is_reversed = _to_bool(is_reversed)
+
+        append(_new_record(CardRecord, (front, back, is_reversed)))
+    return records
+
+
+def encode_flash_cards(cards: Iterable[CardRecord]) -> str:
+    """
+    Encode flashcards as the extractor's JSON, decode_flash_cards reads it back.
+    """
+    return json.dumps(
+        {"FlashCards": [{"Front": card.front, "Back": card.back, "IsReversed": card.is_reversed} for card in cards]},
+        ensure_ascii=False
+    )
+
+
+def format_flash_card(card: CardRecord) -> str:
+    """
+    Format a single flashcard, "??" separates the sides of a reversed card.
+    """
+    separator = "??" if card.is_reversed else "?"
+    return f"{card.front}\n{separator}\n{card.back}\n"
+
+
+def format_flash_cards(cards: Iterable[CardRecord]) -> str:
+    """
+    Format all flashcards, the same output as FlashCardsResponse.format_flash_cards.
+    """
+    return "\n".join([format_flash_card(card) for card in cards])
@@ -0,0 +1,114 @@
+"""
+Streaming renderer of the card and note templates.
+
+The templates use str.format placeholders. Instead of formatting every card into
+a string, joining them and formatting the joined text into the template, the
+renderer writes the template's literal parts and the cards one at a time into a
+file handle or buffer. The output is the same, byte for byte.
+"""
+
+import io
+import string
+from functools import lru_cache
+from typing import Any, Callable, Iterable, List, Sequence, TextIO, Tuple
+
+from card_codec import CardRecord
+
+
+_formatter = string.Formatter()
+
+
+@lru_cache(maxsize=32)
+def _parse_template(template: str) -> List[Tuple[str, Any, str, str]]:
+    """
+    Split a template into (literal text, field, format spec, conversion) segments.
+
+    Automatic field numbering ("{}") is resolved to explicit indexes.
+    """
+    segments = []
+    auto_index = 0
+    for literal_text, field_name, format_spec, conversion in _formatter.parse(template):
+        if field_name == "":
+            field_name = str(auto_index)
+            auto_index += 1
+        segments.append((literal_text, field_name, format_spec or "", conversion))
+    return segments
+
+
+def write_flash_cards(cards: Iterable[CardRecord], stream: TextIO):
+    """
+    Write flashcards separated by blank lines, "??" separates the sides of a reversed card.
+
+    Produces the same text as card_codec.format_flash_cards.
+
+    Args:
+        cards: The flashcards.
+        stream: The file handle or buffer to write to.
+    """
+    write = stream.write
+    first = True
+    for card in cards:
+        if not first:
+            write("\n")
+        first = False
+        write(card.front)
+        write("\n??\n" if card.is_reversed else "\n?\n")
+        write(card.back)
+        write("\n")
+
+
+def write_lines(lines: Iterable[str], stream: TextIO):
+    """
+    Write lines joined by newlines, the same text as "\\n".join(lines).
+    """
+    write = stream.write
+    first = True
+    for line in lines:
+        if not first:
+            write("\n")
+        first = False
+        write(line)
+
+
+def render_template(template: str, stream: TextIO, values: Sequence[Any]):
+    """
+    Render a str.format template into a stream.
+
+    A value that is callable is a streamed field: it is called with the stream
+    and writes its own text. Other values are formatted like str.format does.
+
+    Args:
+        template: The template with positional placeholders.
+        stream: The file handle or buffer to write to.
+        values: The positional values.
+    """
+    write = stream.write
+    for literal_text, field_name, format_spec, conversion in _parse_template(template):
+        if literal_text:
+            write(literal_text)
+        if field_name is None:
+            continue
+
+        value, _ = _formatter.get_field(field_name, values, {})
+        if callable(value):
+            if format_spec or conversion:
+                # A formatted streamed field can't be streamed, render it to a string first
+                buffer = io.StringIO()
+                value(buffer)
+                value = buffer.getvalue()
+            else:
+                value(stream)
+                continue
+
+        value = _formatter.convert_field(value, conversion)
+        write(_formatter.format_field(value, format_spec))
+
+
+def streamed(writer: Callable[..., None], *args) -> Callable[[TextIO], None]:
+    """
+    Bind the arguments of a writer to make a streamed template field.
+
+    Example:
+        render_template(template, f, [timestamp, name, date, streamed(write_flash_cards, cards)])
+    """
+    return lambda stream: writer(*args, stream)
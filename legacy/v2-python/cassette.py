@@ -0,0 +1,191 @@
+"""
+Record/replay cassettes of the model requests of a run.
+
+In record mode the shared HTTP clients send every request to the provider and
+append the request's fingerprint and the response with its timing to a gzipped
+JSONL cassette. In replay mode the responses are served from the cassette
+offline, after the recorded time (optionally scaled), so orchestration, parsing
+and output changes can be benchmarked on exactly the same conversations.
+
+Only a hash of the request body is stored, API keys and other headers are never
+recorded.
+"""
+
+import base64
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict
+
+import httpx
+
+from mock_provider import mock_completion, simulated_latency
+
+
+RECORD = "record"
+REPLAY = "replay"
+MOCK = "mock"
+
+
+class CassetteMismatchError(Exception):
+    """
+    Raised in replay mode for a request that is not in the cassette.
+    """
+
+
+def request_fingerprint(request: httpx.Request) -> str:
+    """
+    Get the fingerprint a request is matched on: method, path and a hash of the body.
+
+    JSON bodies are hashed with sorted keys, so the key order doesn't matter.
+    """
+    body = request.read()
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    except ValueError:
+        pass
+    digest = hashlib.sha256(body).hexdigest()
+    return f"{request.method} {request.url.path} {digest}"
+
+
+def _encode_body(content: bytes) -> Dict[str, str]:
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(entry: Dict[str, Any]) -> bytes:
+    if "body_base64" in entry:
+        return base64.b64decode(entry["body_base64"])
+    return entry.get("body", "").encode("utf-8")
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """
+    Sends requests through the inner transport and appends every exchange to the cassette.
+
+    Every entry is written as its own gzip member with a single append, so the
+    processes of a batch run can record into the same cassette.
+    """
+    def __init__(self, inner: httpx.BaseTransport, path: str):
+        self.inner = inner
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        fingerprint = request_fingerprint(request)
+        started = time.perf_counter()
+        response = self.inner.handle_request(request)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+        elapsed = time.perf_counter() - started
+
+        entry = {
+            "request": fingerprint,
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type", ""),
+            "elapsed": round(elapsed, 4)
+        }
+        entry.update(_encode_body(content))
+        line = json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+        os.write(self._fd, gzip.compress(line))
+
+        # The content is already decoded, the encoding headers don't apply to it any more
+        headers = [
+            (name, value) for name, value in response.headers.raw
+            if name.lower() not in (b"content-encoding", b"content-length", b"transfer-encoding")
+        ]
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=content,
+            request=request,
+            extensions={"http_version": response.extensions.get("http_version", b"HTTP/1.1")}
+        )
+
+    def close(self):
+        self.inner.close()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """
+    Serves the recorded responses after their recorded time multiplied by speed.
+
+    Identical requests are served their recorded responses in order.
+    """
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["request"]].append(entry)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        fingerprint = request_fingerprint(request)
+        with self._lock:
+            recorded = self._entries.get(fingerprint)
+            entry = recorded.popleft() if recorded else None
+        if entry is None:
+            raise CassetteMismatchError(f"No recorded response for {fingerprint} in {self.path}")
+
+        if self.speed > 0:
+            time.sleep(entry["elapsed"] * self.speed)
+
+        headers = {"content-type": entry["content_type"]} if entry.get("content_type") else {}
+        return httpx.Response(status_code=entry["status"], headers=headers, content=_decode_body(entry), request=request)
+
+
+class MockProviderTransport(httpx.BaseTransport):
+    """
+    Answers chat completion requests from the local mock provider after their simulated time multiplied by speed.
+    """
+    def __init__(self, speed: float = 1.0):
+        self.speed = speed
+        self._ids = itertools.count(1)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not request.url.path.endswith("/chat/completions"):
+            return httpx.Response(404, json={"error": {"message": f"The mock provider has no {request.url.path}"}}, request=request)
+
+        completion = mock_completion(json.loads(request.read() or b"{}"), f"chatcmpl-mock-{next(self._ids)}")
+        if self.speed > 0:
+            time.sleep(self.speed * simulated_latency(completion))
+        return httpx.Response(200, json=completion, request=request)
+
+
+def wrap_transport(inner: httpx.BaseTransport, mode: str, path: str, speed: float = 1.0) -> httpx.BaseTransport:
+    """
+    Wrap the transport of a shared client for recording or replaying.
+
+    Args:
+        inner: The transport that sends requests to the provider.
+        mode: RECORD, REPLAY or MOCK, the last answers from the local mock provider instead of a cassette.
+        path: The cassette path.
+        speed: The factor of the recorded (or simulated) times in replay and mock mode, 0 to answer without delays.
+
+    Returns:
+        The transport of the client.
+    """
+    if mode == RECORD:
+        return RecordingTransport(inner, path)
+    inner.close()
+    if mode == MOCK:
+        return MockProviderTransport(speed)
+    return ReplayTransport(path, speed)
@@ -0,0 +1,123 @@
+"""
+Chunking of oversized day sections.
+
+A section over the token threshold is split at its ### sub-headers, and blocks
+that are still too large at paragraph boundaries. The blocks are packed into
+chunks that each start with the section's header line, so every chunk is a
+valid section of the same day. The cards of the chunks are merged back into the
+day's deck without duplicates.
+"""
+
+import re
+from typing import Iterable, List
+
+from card_codec import CardRecord
+from routing import estimate_tokens
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _split_sub_headers(lines: List[str]) -> List[List[str]]:
+    blocks = [[]]
+    for line in lines:
+        if line.startswith("### ") and blocks[-1]:
+            blocks.append([])
+        blocks[-1].append(line)
+    return [block for block in blocks if block]
+
+
+def _split_paragraphs(block: List[str]) -> List[List[str]]:
+    parts = [[]]
+    for line in block:
+        parts[-1].append(line)
+        if not line.strip():
+            parts.append([])
+    return [part for part in parts if part]
+
+
+def split_section(section: str, max_tokens: int) -> List[str]:
+    """
+    Split a section into chunks of about max_tokens.
+
+    A section within the limit is returned as the only chunk. A single paragraph
+    over the limit is not split further.
+
+    Args:
+        section: The section text, starting with its header line.
+        max_tokens: The estimated token limit of a chunk.
+
+    Returns:
+        The chunks, each starting with the header line.
+    """
+    if max_tokens <= 0 or estimate_tokens(section) <= max_tokens:
+        return [section]
+
+    header, _, body = section.partition("\n")
+    blocks = []
+    for block in _split_sub_headers(body.split("\n")):
+        if estimate_tokens("\n".join(block)) > max_tokens:
+            blocks.extend(_split_paragraphs(block))
+        else:
+            blocks.append(block)
+
+    # Pack the blocks into chunks
+    chunks = []
+    current: List[str] = []
+    for block in blocks:
+        if current and estimate_tokens("\n".join(current + block)) > max_tokens:
+            chunks.append(current)
+            current = []
+        current = current + block
+    if current:
+        chunks.append(current)
+
+    return [header + "\n" + "\n".join(chunk) for chunk in chunks]
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def card_key(card: CardRecord):
+    """
+    Get the identity of a card: its sides ignoring case and whitespace.
+    """
+    return _normalize(card.front), _normalize(card.back)
+
+
+def card_overlap(baseline: List[CardRecord], cards: List[CardRecord], fronts_only: bool = False) -> float:
+    """
+    Get the share of cards two decks have in common (Jaccard), 1.0 for two empty decks.
+
+    Args:
+        baseline: The cards to compare with.
+        cards: The compared cards.
+        fronts_only: Compare only the front sides, the questions the cards ask.
+    """
+    def keys(deck):
+        return {_normalize(card.front) if fronts_only else card_key(card) for card in deck}
+
+    baseline_keys, card_keys = keys(baseline), keys(cards)
+    union = baseline_keys | card_keys
+    if not union:
+        return 1.0
+    return len(baseline_keys & card_keys) / len(union)
+
+
+def merge_flash_cards(card_lists: Iterable[List[CardRecord]]) -> List[CardRecord]:
+    """
+    Merge the cards of the chunks of a section in order, dropping duplicates.
+
+    Cards are duplicates when their sides are equal ignoring case and whitespace,
+    the first one is kept.
+    """
+    merged = []
+    seen = set()
+    for cards in card_lists:
+        for card in cards:
+            key = card_key(card)
+            if key not in seen:
+                seen.add(key)
+                merged.append(card)
+    return merged
@@ -0,0 +1,193 @@
+"""
+Command line interface of the English Flashcard Generator.
+
+Command line options are merged over the settings loaded from appsettings.json,
+so a run can be tuned without editing the source.
+"""
+
+import argparse
+from datetime import datetime
+from typing import List, Optional
+
+from agents.agent_base import INSTRUCTION_VERSIONS
+from config.config_loader import AppSettings
+from manifest import REPORTS
+
+
+DEFAULT_CONFIG_PATH = "appsettings.json"
+
+
+def parse_cli_date(value: str) -> datetime:
+    """
+    Parse a yyyy-MM-dd date given on the command line.
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date '{value}', expected yyyy-MM-dd")
+
+
+def positive_int(value: str) -> int:
+    """
+    Parse a positive integer given on the command line.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid number '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"Expected a positive number, got {number}")
+    return number
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the argument parser.
+
+    Returns:
+        The argument parser.
+    """
+    parser = argparse.ArgumentParser(description="English Flashcard Generator")
+
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH, help="Path to the configuration file")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="Logging level")
+
+    selection = parser.add_argument_group("day selection")
+    selection.add_argument("--since", type=parse_cli_date, help="Process days on or after this date (yyyy-MM-dd)")
+    selection.add_argument("--until", type=parse_cli_date, help="Process days on or before this date (yyyy-MM-dd)")
+    selection.add_argument("--date", type=parse_cli_date, help="Process only the day with this date (yyyy-MM-dd)")
+    selection.add_argument("--last", type=positive_int, metavar="N", help="Process only the N most recent days")
+
+    paths = parser.add_argument_group("paths")
+    paths.add_argument("--source", help="Override FilePaths.SourceNotePath")
+    paths.add_argument("--cards-out", help="Override FilePaths.ResultCardsFolderPath")
+    paths.add_argument("--notes-out", help="Override FilePaths.ResultNotesFolderPath")
+
+    processing = parser.add_argument_group("processing")
+    processing.add_argument("--concurrency", type=positive_int, help="Override Processing.MaxConcurrency")
+    processing.add_argument("--attempts", type=positive_int, help="Override Processing.MaxProcessingAttempts")
+    processing.add_argument("--max-round", type=positive_int, help="Override Processing.MaxRound")
+    processing.add_argument("--test-mode", action="store_true", default=None, help="Process only the first few sections")
+    processing.add_argument("--test-sections", type=positive_int, help="Override Processing.MaxSectionsInTestMode")
+    processing.add_argument("--dry-run", action="store_true", default=None, help="Select sections without calling the agents or writing files")
+    processing.add_argument("--speculative", action="store_true", default=None, help="Override Processing.SpeculativeExtraction, extract the cards while the reviewer runs")
+    processing.add_argument("--compress-notes", action="store_true", default=None, help="Override Processing.CompressNotes, strip markup and extra whitespace from the notes sent to the agents")
+    processing.add_argument("--instructions", choices=INSTRUCTION_VERSIONS, help="Override Processing.InstructionVersion, the version of the agents' instructions")
+    processing.add_argument("--compression-eval", action="store_true", help="Compare the cards of the selected days with and without prompt compression, print the report and exit")
+    processing.add_argument("--profile", metavar="PATH", help="Run under cProfile and write the stats to PATH")
+    processing.add_argument("--rpm", type=positive_int, help="Override Processing.RequestsPerMinute, shared by all batch workers")
+    processing.add_argument("--cache", metavar="PATH", help="Override Processing.CachePath, the response cache shared by all batch workers")
+    processing.add_argument("--metrics-out", metavar="PATH", help="Write the run metrics report as JSON to PATH")
+    processing.add_argument("--metrics-file", metavar="PATH", help="Override Processing.MetricsFilePath, keep the run metrics in PATH in the Prometheus text format while the run goes on")
+    processing.add_argument("--metrics-port", type=positive_int, metavar="PORT", help="Override Processing.MetricsPort, serve the run metrics on http://127.0.0.1:PORT/metrics")
+    processing.add_argument("--trace", metavar="PATH", help="Write a Chrome trace-event JSON of sections, agent turns, parsing and file writes to PATH")
+
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument("--batch", metavar="DIR_OR_GLOB", help="Process every notes file in a directory or matching a glob")
+    batch.add_argument("--output-root", metavar="DIR", help="Write <DIR>/<notes file name>/cards and /notes per notes file")
+    batch.add_argument("--workers", type=positive_int, help="Number of worker processes, defaults to the number of CPUs")
+
+    backfill = parser.add_argument_group("batch API backfill")
+    backfill.add_argument("--backfill", action="store_true", help="Generate the selected days through the providers' asynchronous batch API")
+    backfill.add_argument("--batch-endpoint", metavar="URL", help="Override Processing.BatchEndpoint, the batch API base URL of every agent, e.g. the local stand-in server")
+    backfill.add_argument("--batch-poll", type=float, metavar="SECONDS", help="Override Processing.BatchPollSeconds")
+    backfill.add_argument("--batch-state", metavar="PATH", help="Override Processing.BatchStatePath, the state file a stopped backfill resumes from")
+
+    queue = parser.add_argument_group("job queue")
+    queue.add_argument("--queue", metavar="PATH", help="Process sections as jobs of the SQLite queue at PATH")
+    queue.add_argument("--enqueue", action="store_true", help="Only add the selected sections to the queue")
+    queue.add_argument("--worker", action="store_true", help="Only claim and process queued jobs")
+    queue.add_argument("--queue-status", action="store_true", help="Print the number of jobs per state")
+
+    manifest = parser.add_argument_group("manifest")
+    manifest.add_argument("--manifest", metavar="PATH", help="Override Processing.ManifestPath, the SQLite index of the generated files")
+    manifest.add_argument("--diff-regeneration", action="store_true", default=None, help="Override Processing.DiffRegeneration, send only the changed lines of edited days to the agents")
+    manifest.add_argument("--manifest-report", choices=REPORTS, help="Print a report of the manifest as JSON and exit")
+
+    cassettes = parser.add_argument_group("cassettes")
+    cassette_mode = cassettes.add_mutually_exclusive_group()
+    cassette_mode.add_argument("--record", metavar="PATH", help="Record every model request and response of the run to the cassette at PATH")
+    cassette_mode.add_argument("--replay", metavar="PATH", help="Serve the model responses from the cassette at PATH instead of the providers")
+    cassette_mode.add_argument("--mock", action="store_true", help="Answer the model requests with the local mock provider, for offline runs")
+    cassettes.add_argument("--replay-speed", type=float, default=1.0, metavar="FACTOR", help="Scale the recorded or mock response times, 0 answers without delays")
+
+    watch = parser.add_argument_group("watch mode")
+    watch.add_argument("--watch", action="store_true", help="Keep running and process days added to or edited in the source file")
+    watch.add_argument("--poll-interval", type=float, default=1.0, metavar="SECONDS", help="Polling interval when inotify is not available")
+
+    return parser
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments.
+
+    Args:
+        argv: The arguments to parse, defaults to sys.argv.
+
+    Returns:
+        The parsed arguments.
+    """
+    return build_parser().parse_args(argv)
+
+
+def apply_overrides(app_settings: AppSettings, args: argparse.Namespace) -> AppSettings:
+    """
+    Merge the command line options over the loaded settings.
+
+    Options that were not given keep the configured values.
+
+    Args:
+        app_settings: The settings loaded from the configuration file.
+        args: The parsed command line arguments.
+
+    Returns:
+        The updated settings.
+    """
+    file_paths = app_settings.file_paths
+    if args.source is not None:
+        file_paths.source_note_path = args.source
+    if args.cards_out is not None:
+        file_paths.result_cards_folder_path = args.cards_out
+    if args.notes_out is not None:
+        file_paths.result_notes_folder_path = args.notes_out
+
+    processing = app_settings.processing
+    if args.concurrency is not None:
+        processing.max_concurrency = args.concurrency
+    if args.attempts is not None:
+        processing.max_processing_attempts = args.attempts
+    if args.max_round is not None:
+        processing.max_round = args.max_round
+    if args.test_mode is not None:
+        processing.test_mode = args.test_mode
+    if args.test_sections is not None:
+        processing.max_sections_in_test_mode = args.test_sections
+    if args.dry_run is not None:
+        processing.dry_run = args.dry_run
+    if args.speculative is not None:
+        processing.speculative_extraction = args.speculative
+    if args.compress_notes is not None:
+        processing.compress_notes = args.compress_notes
+    if args.instructions is not None:
+        processing.instruction_version = args.instructions
+    if args.rpm is not None:
+        processing.requests_per_minute = args.rpm
+    if args.cache is not None:
+        processing.cache_path = args.cache
+    if args.manifest is not None:
+        processing.manifest_path = args.manifest
+    if args.diff_regeneration is not None:
+        processing.diff_regeneration = args.diff_regeneration
+    if args.batch_endpoint is not None:
+        processing.batch_endpoint = args.batch_endpoint
+    if args.batch_poll is not None:
+        processing.batch_poll_seconds = args.batch_poll
+    if args.batch_state is not None:
+        processing.batch_state_path = args.batch_state
+    if args.metrics_file is not None:
+        processing.metrics_file_path = args.metrics_file
+    if args.metrics_port is not None:
+        processing.metrics_port = args.metrics_port
+
+    return app_settings
@@ -2,20 +2,32 @@ from .config_loader import (
     AppSettings,
     FilePathSettings,
     ProviderSettings,
+    HttpClientSettings,
+    AdaptiveConcurrencySettings,
+    HedgingSettings,
     OpenAISettings,
     AzureSettings,
     OpenRouterSettings,
     AgentSettings,
-    AgentModelSettings
+    AgentModelSettings,
+    ProcessingSettings,
+    RoutingSettings,
+    RoutingRuleSettings
 )
 
 __all__ = [
     'AppSettings',
     'FilePathSettings',
     'ProviderSettings',
+    'HttpClientSettings',
+    'AdaptiveConcurrencySettings',
+    'HedgingSettings',
     'OpenAISettings',
     'AzureSettings',
     'OpenRouterSettings',
     'AgentSettings',
-    'AgentModelSettings'
+    'AgentModelSettings',
+    'ProcessingSettings',
+    'RoutingSettings',
+    'RoutingRuleSettings'
 ]
\ No newline at end of file
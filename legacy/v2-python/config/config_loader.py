@@ -91,6 +91,58 @@ class OpenRouterSettings:
         return settings
 
 
+class HttpClientSettings:
+    """
+    Settings for the shared HTTP client of a provider.
+    """
+    def __init__(self):
+        self.shared = True
+        self.max_connections = 20
+        self.max_keepalive_connections = 10
+        self.keepalive_expiry = 30.0
+        self.timeout = 120.0
+        self.connect_timeout = 10.0
+        self.http2 = False
+    
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> 'HttpClientSettings':
+        settings = HttpClientSettings()
+        settings.shared = data.get("Shared", True)
+        settings.max_connections = data.get("MaxConnections", 20)
+        settings.max_keepalive_connections = data.get("MaxKeepaliveConnections", 10)
+        settings.keepalive_expiry = data.get("KeepaliveExpirySeconds", 30.0)
+        settings.timeout = data.get("TimeoutSeconds", 120.0)
+        settings.connect_timeout = data.get("ConnectTimeoutSeconds", 10.0)
+        settings.http2 = data.get("Http2", False)
+        return settings
+
+
+class AdaptiveConcurrencySettings:
+    """
+    Settings for the adaptive concurrency of a provider's requests.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.initial_limit = 4
+        self.min_limit = 1
+        self.max_limit = 32
+        self.increase_step = 1.0
+        self.decrease_factor = 0.5
+        self.latency_spike_ratio = 3.0
+    
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> 'AdaptiveConcurrencySettings':
+        settings = AdaptiveConcurrencySettings()
+        settings.enabled = data.get("Enabled", False)
+        settings.initial_limit = data.get("InitialLimit", 4)
+        settings.min_limit = data.get("MinLimit", 1)
+        settings.max_limit = data.get("MaxLimit", 32)
+        settings.increase_step = data.get("IncreaseStep", 1.0)
+        settings.decrease_factor = data.get("DecreaseFactor", 0.5)
+        settings.latency_spike_ratio = data.get("LatencySpikeRatio", 3.0)
+        return settings
+
+
 class ProviderSettings:
     """
     Settings for a provider.
@@ -101,6 +153,8 @@ class ProviderSettings:
         self.openai = None
         self.azure = None
         self.openrouter = None
+        self.http = HttpClientSettings()
+        self.adaptive_concurrency = AdaptiveConcurrencySettings()
     
     @staticmethod
     def from_dict(data: Dict[str, Any]) -> 'ProviderSettings':
@@ -117,6 +171,12 @@ class ProviderSettings:
         if "OpenRouter" in data and data["OpenRouter"]:
             settings.openrouter = OpenRouterSettings.from_dict(data["OpenRouter"])
         
+        if "Http" in data and data["Http"]:
+            settings.http = HttpClientSettings.from_dict(data["Http"])
+        
+        if "AdaptiveConcurrency" in data and data["AdaptiveConcurrency"]:
+            settings.adaptive_concurrency = AdaptiveConcurrencySettings.from_dict(data["AdaptiveConcurrency"])
+        
         return settings
     
     def get_settings(self):
@@ -133,14 +193,44 @@ class ProviderSettings:
             return None
 
 
+class HedgingSettings:
+    """
+    Settings for hedged requests of an agent.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.alternate_provider_name = None
+        self.percentile = 95
+        self.min_samples = 10
+        self.window_size = 100
+        self.min_delay = 1.0
+        self.max_extra_request_ratio = 0.1
+    
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> 'HedgingSettings':
+        settings = HedgingSettings()
+        settings.enabled = data.get("Enabled", False)
+        settings.alternate_provider_name = data.get("AlternateProviderName", None)
+        settings.percentile = data.get("Percentile", 95)
+        settings.min_samples = data.get("MinSamples", 10)
+        settings.window_size = data.get("WindowSize", 100)
+        settings.min_delay = data.get("MinDelaySeconds", 1.0)
+        settings.max_extra_request_ratio = data.get("MaxExtraRequestRatio", 0.1)
+        return settings
+
+
 class AgentModelSettings:
     """
     Settings for an agent model.
+    
+    MaxTokens is sent to the model as max_tokens (max_completion_tokens with
+    UseCompletionTokens), providers reject values over the model's completion limit.
     """
     def __init__(self):
         self.provider_name = "Default"
         self.temperature = 0.7
         self.max_tokens = 16384
+        self.hedging = HedgingSettings()
     
     @staticmethod
     def from_dict(data: Dict[str, Any]) -> 'AgentModelSettings':
@@ -148,6 +238,10 @@ class AgentModelSettings:
         settings.provider_name = data.get("ProviderName", "Default")
         settings.temperature = data.get("Temperature", 0.7)
         settings.max_tokens = data.get("MaxTokens", 16384)
+        
+        if "Hedging" in data and data["Hedging"]:
+            settings.hedging = HedgingSettings.from_dict(data["Hedging"])
+        
         return settings
 
 
@@ -176,6 +270,117 @@ class AgentSettings:
         return settings
 
 
+class ProcessingSettings:
+    """
+    Settings for the section processing run.
+    """
+    def __init__(self):
+        self.max_processing_attempts = 3
+        self.max_round = 15
+        self.max_concurrency = 1
+        self.test_mode = False
+        self.max_sections_in_test_mode = 1
+        self.dry_run = False
+        self.requests_per_minute = 0
+        self.cache_path = None
+        self.cache_seed = 41
+        self.queue_lease_seconds = 900
+        self.queue_max_attempts = 3
+        self.queue_journal_mode = "WAL"
+        self.speculative_extraction = False
+        self.chunk_max_tokens = 4000
+        self.manifest_path = None
+        self.compress_notes = False
+        self.instruction_version = "full"
+        self.diff_regeneration = False
+        self.diff_max_changed_ratio = 0.5
+        self.batch_endpoint = None
+        self.batch_poll_seconds = 30
+        self.batch_completion_window = "24h"
+        self.batch_state_path = None
+        self.metrics_file_path = None
+        self.metrics_port = 0
+        self.metrics_interval_seconds = 15
+    
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> 'ProcessingSettings':
+        settings = ProcessingSettings()
+        settings.max_processing_attempts = data.get("MaxProcessingAttempts", 3)
+        settings.max_round = data.get("MaxRound", 15)
+        settings.max_concurrency = data.get("MaxConcurrency", 1)
+        settings.test_mode = data.get("TestMode", False)
+        settings.max_sections_in_test_mode = data.get("MaxSectionsInTestMode", 1)
+        settings.dry_run = data.get("DryRun", False)
+        settings.requests_per_minute = data.get("RequestsPerMinute", 0)
+        settings.cache_path = data.get("CachePath", None)
+        settings.cache_seed = data.get("CacheSeed", 41)
+        settings.queue_lease_seconds = data.get("QueueLeaseSeconds", 900)
+        settings.queue_max_attempts = data.get("QueueMaxAttempts", 3)
+        settings.queue_journal_mode = data.get("QueueJournalMode", "WAL")
+        settings.speculative_extraction = data.get("SpeculativeExtraction", False)
+        settings.chunk_max_tokens = data.get("ChunkMaxTokens", 4000)
+        settings.manifest_path = data.get("ManifestPath", None)
+        settings.compress_notes = data.get("CompressNotes", False)
+        settings.instruction_version = data.get("InstructionVersion", "full")
+        settings.diff_regeneration = data.get("DiffRegeneration", False)
+        settings.diff_max_changed_ratio = data.get("DiffMaxChangedRatio", 0.5)
+        settings.batch_endpoint = data.get("BatchEndpoint", None)
+        settings.batch_poll_seconds = data.get("BatchPollSeconds", 30)
+        settings.batch_completion_window = data.get("BatchCompletionWindow", "24h")
+        settings.batch_state_path = data.get("BatchStatePath", None)
+        settings.metrics_file_path = data.get("MetricsFilePath", None)
+        settings.metrics_port = data.get("MetricsPort", 0)
+        settings.metrics_interval_seconds = data.get("MetricsIntervalSeconds", 15)
+        return settings
+
+
+class RoutingRuleSettings:
+    """
+    A rule that routes matching sections to other providers.
+    
+    A rule matches a section when all of its set conditions hold. AgentMaxTokens
+    overrides the MaxTokens of the routed agents, for providers that accept fewer
+    completion tokens than the configured agents.
+    """
+    def __init__(self):
+        self.name = ""
+        self.min_tokens = None
+        self.max_tokens = None
+        self.has_sub_headers = None
+        self.has_questions = None
+        self.agent_providers: Dict[str, str] = {}
+        self.agent_max_tokens: Dict[str, int] = {}
+    
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> 'RoutingRuleSettings':
+        settings = RoutingRuleSettings()
+        settings.name = data.get("Name", "")
+        settings.min_tokens = data.get("MinTokens", None)
+        settings.max_tokens = data.get("MaxTokens", None)
+        settings.has_sub_headers = data.get("HasSubHeaders", None)
+        settings.has_questions = data.get("HasQuestions", None)
+        settings.agent_providers = dict(data.get("Providers", {}))
+        settings.agent_max_tokens = dict(data.get("AgentMaxTokens", {}))
+        return settings
+
+
+class RoutingSettings:
+    """
+    Settings for choosing the providers of the agents per section.
+    
+    The first matching rule is used, sections that match no rule use the Agents settings.
+    """
+    def __init__(self):
+        self.rules: List[RoutingRuleSettings] = []
+    
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> 'RoutingSettings':
+        settings = RoutingSettings()
+        for rule in data.get("Rules", []):
+            settings.rules.append(RoutingRuleSettings.from_dict(rule))
+        return settings
+
+
 class AppSettings:
     """
     Application settings.
@@ -184,14 +389,20 @@ class AppSettings:
         self.file_paths = FilePathSettings()
         self.providers = []
         self.agents = AgentSettings()
+        self.processing = ProcessingSettings()
+        self.routing = RoutingSettings()
     
     @staticmethod
     def load_from_configuration(config_path: str) -> 'AppSettings':
-        settings = AppSettings()
-        
         with open(config_path, 'r') as f:
             config = json.load(f)
         
+        return AppSettings.from_dict(config)
+    
+    @staticmethod
+    def from_dict(config: Dict[str, Any]) -> 'AppSettings':
+        settings = AppSettings()
+        
         # Bind the FilePaths section
         if 'FilePaths' in config:
             settings.file_paths = FilePathSettings.from_dict(config['FilePaths'])
@@ -205,6 +416,14 @@ class AppSettings:
         if 'Agents' in config:
             settings.agents = AgentSettings.from_dict(config['Agents'])
         
+        # Bind the Processing section
+        if 'Processing' in config:
+            settings.processing = ProcessingSettings.from_dict(config['Processing'])
+        
+        # Bind the Routing section
+        if 'Routing' in config:
+            settings.routing = RoutingSettings.from_dict(config['Routing'])
+        
         return settings
     
     def get_provider_by_name(self, provider_name: str) -> Optional[ProviderSettings]:
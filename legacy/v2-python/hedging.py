@@ -0,0 +1,193 @@
+"""
+Hedged model requests that cut the tail latency of slow completions.
+
+When a model call of an agent hasn't returned after a percentile of its recent
+latencies, a duplicate is sent to the same or an alternate provider and the first
+successful response is used. The number of duplicates is capped by a ratio of the
+agent's calls. A running call can't be interrupted, the loser's response is ignored.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+from config.config_loader import HedgingSettings
+from metrics import run_metrics
+from tracing import span
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_concurrency: int) -> ThreadPoolExecutor:
+    """
+    Get the executor of the primary and hedged calls, sized for the first caller's concurrency.
+
+    Each of the MaxConcurrency sections can have a primary and a hedged call
+    running, with room for the parallel chunks of oversized sections.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = max(4 * max(max_concurrency, 1), min(32, (os.cpu_count() or 1) + 4))
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedged-request")
+        return _executor
+
+
+class LatencyTracker:
+    """
+    The latencies of an agent's most recent successful calls.
+    """
+    def __init__(self, window_size: int):
+        self._lock = threading.Lock()
+        self._window = deque(maxlen=max(window_size, 1))
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._window.append(seconds)
+
+    def percentile(self, percentile: float, min_samples: int) -> Optional[float]:
+        """
+        Get a percentile of the recent latencies (nearest rank).
+
+        Returns:
+            The latency in seconds, None while there are fewer than min_samples.
+        """
+        with self._lock:
+            if len(self._window) < max(min_samples, 1):
+                return None
+            samples = sorted(self._window)
+        rank = math.ceil(percentile / 100.0 * len(samples))
+        return samples[min(max(rank, 1), len(samples)) - 1]
+
+
+class HedgingPolicy:
+    """
+    Decides when an agent's call is hedged and keeps the extra requests under the cap.
+    """
+    def __init__(self, settings: HedgingSettings):
+        self.settings = settings
+        self.latencies = LatencyTracker(settings.window_size)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+
+    def delay(self) -> Optional[float]:
+        """
+        Get how long to wait for the primary call before hedging, None to not hedge.
+        """
+        threshold = self.latencies.percentile(self.settings.percentile, self.settings.min_samples)
+        if threshold is None:
+            return None
+        return max(threshold, self.settings.min_delay)
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def try_reserve_hedge(self) -> bool:
+        """
+        Reserve an extra request if it keeps hedges within MaxExtraRequestRatio of the calls.
+        """
+        with self._lock:
+            if self.hedges + 1 > self.settings.max_extra_request_ratio * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+
+def enable_hedging(agent, settings: HedgingSettings, alternate_client=None, max_concurrency: int = 1):
+    """
+    Hedge the model calls of an agent.
+
+    Args:
+        agent: The AG2 agent.
+        settings: The agent's hedging settings.
+        alternate_client: The model client of the alternate provider, duplicates go to the agent's own client when omitted.
+            Both clients are expected to be measured and limited already, hedging wraps them.
+        max_concurrency: Processing.MaxConcurrency, sizes the executor of the calls.
+
+    Returns:
+        The hedging policy of the agent.
+    """
+    client = agent.client
+    primary_create = client.create
+    hedge_create = alternate_client.create if alternate_client is not None else primary_create
+    policy = HedgingPolicy(settings)
+    name = agent.name
+
+    def timed(create, params):
+        started = time.perf_counter()
+        response = create(**params)
+        return response, time.perf_counter() - started
+
+    def send_hedge(params):
+        with span(f"hedge:{name}", "agent"):
+            return timed(hedge_create, params)
+
+    def hedged_create(**params):
+        policy.count_call()
+        delay = policy.delay()
+        if delay is None:
+            response, seconds = timed(primary_create, params)
+            policy.latencies.record(seconds)
+            return response
+
+        executor = _get_executor(max_concurrency)
+        started = threading.Event()
+
+        def run_primary():
+            started.set()
+            return timed(primary_create, params)
+
+        primary = executor.submit(run_primary)
+        # The delay counts from when the primary runs, a call queued in the executor is not hedged for its wait
+        started.wait()
+        primary_started = time.perf_counter()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            response, seconds = primary.result()
+            policy.latencies.record(seconds)
+            return response
+
+        if not policy.try_reserve_hedge():
+            run_metrics.increment("hedges_capped")
+            response, seconds = primary.result()
+            policy.latencies.record(seconds)
+            return response
+
+        logging.info(f"{name}: no response after {delay:.1f}s, sending a hedged request")
+        run_metrics.increment("hedges_sent")
+        hedge = executor.submit(send_hedge, params)
+
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response, seconds = future.result()
+                except Exception as ex:
+                    error = ex
+                    continue
+                for loser in pending:
+                    # The other request is already on the wire, its response is ignored
+                    loser.cancel()
+                if future is hedge:
+                    run_metrics.increment("hedges_won")
+                    # The primary took at least this long, leaving it out would drift the percentile down
+                    policy.latencies.record(time.perf_counter() - primary_started)
+                else:
+                    policy.latencies.record(seconds)
+                return response
+        run_metrics.increment("hedges_failed")
+        raise error
+
+    client.create = hedged_create
+    return policy
@@ -0,0 +1,256 @@
+"""
+Shared, pooled HTTP clients for the LLM providers.
+
+All agents (and the group chat manager) that talk to the same provider endpoint
+share one httpx client, so they share its connection pool, keep-alive
+connections and TLS sessions instead of each OpenAI client opening its own.
+"""
+
+import importlib.util
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from config.config_loader import ProviderSettings
+
+
+DEFAULT_OPENAI_ENDPOINT = "https://api.openai.com/v1"
+
+
+class PoolStatistics:
+    """
+    Connection pool usage of one shared client, estimated from the provider's Http limits.
+
+    Every request in flight holds a connection; a finished request leaves its
+    connection idle for KeepaliveExpirySeconds, keeping at most MaxKeepaliveConnections.
+    A request is a pool hit when an idle connection was available, and a pool wait
+    when no connection was available and MaxConnections requests were in flight.
+    """
+    def __init__(self, max_connections: int, max_keepalive_connections: int, keepalive_expiry: float):
+        self._lock = threading.Lock()
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.requests = 0
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self.pool_waits = 0
+        self._in_flight = 0
+        # The release times of the idle connections, oldest first
+        self._idle: Deque[float] = deque()
+
+    def acquire(self):
+        """
+        Count a request that is sent.
+        """
+        with self._lock:
+            now = time.monotonic()
+            while self._idle and now - self._idle[0] > self.keepalive_expiry:
+                self._idle.popleft()
+            hit = bool(self._idle)
+            if hit:
+                self._idle.pop()
+            wait = not hit and self._in_flight >= self.max_connections
+            self._in_flight += 1
+            self.requests += 1
+            if hit:
+                self.pool_hits += 1
+            else:
+                self.pool_misses += 1
+            if wait:
+                self.pool_waits += 1
+
+    def release(self):
+        """
+        Count a request whose response was closed.
+        """
+        with self._lock:
+            self._in_flight = max(self._in_flight - 1, 0)
+            self._idle.append(time.monotonic())
+            while len(self._idle) > self.max_keepalive_connections:
+                self._idle.popleft()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "pool_hits": self.pool_hits,
+                "pool_misses": self.pool_misses,
+                "pool_waits": self.pool_waits,
+                "hit_rate": self.pool_hits / self.requests if self.requests else 0.0,
+                "max_connections": self.max_connections
+            }
+
+
+# The cassette mode, path and replay speed of this process, None when requests go to the providers
+_cassette: Optional[Tuple[str, str, float]] = None
+
+_clients: Dict[str, Any] = {}
+_statistics: Dict[str, PoolStatistics] = {}
+_clients_lock = threading.Lock()
+
+
+def install_cassette(mode: str, path: str, speed: float = 1.0):
+    """
+    Record the requests of the shared clients to a cassette, replay them from it or answer them from the mock provider.
+    
+    Must be called before the first client is created.
+    
+    Args:
+        mode: "record", "replay" or "mock".
+        path: The cassette path, unused in mock mode.
+        speed: The factor of the recorded (or simulated) times in replay and mock mode, 0 to answer without delays.
+    """
+    global _cassette
+    _cassette = (mode, path, speed)
+
+
+def current_cassette() -> Optional[Tuple[str, str, float]]:
+    """
+    Get the installed cassette mode, path and replay speed, e.g. to install it in worker processes.
+    """
+    return _cassette
+
+
+def cassette_installed() -> bool:
+    """
+    Check whether the requests are recorded or replayed, the agents must use the shared clients then.
+    """
+    return _cassette is not None
+
+
+def use_shared_client(provider_settings: ProviderSettings) -> bool:
+    """
+    Check whether the agents of a provider use its shared client.
+    """
+    return provider_settings.http.shared or cassette_installed()
+
+
+def provider_endpoint(provider_settings: ProviderSettings) -> str:
+    """
+    Get the base URL a provider's requests go to.
+    """
+    settings = provider_settings.get_settings()
+    endpoint = getattr(settings, "endpoint", "") or DEFAULT_OPENAI_ENDPOINT
+    return endpoint.rstrip("/")
+
+
+def _create_client(provider_settings: ProviderSettings, statistics: PoolStatistics):
+    import httpx
+
+    class SharedHttpClient(httpx.Client):
+        """
+        An httpx client that is shared instead of copied.
+
+        AG2 deep-copies llm configs, returning self keeps every agent on the same pool.
+        """
+        def __deepcopy__(self, memo):
+            return self
+
+    http = provider_settings.http
+    http2 = http.http2 and importlib.util.find_spec("h2") is not None
+    if http.http2 and not http2:
+        logging.info("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+
+    class CountingStream(httpx.SyncByteStream):
+        """
+        A response stream that releases its pool connection in the statistics when it is closed.
+        """
+        def __init__(self, stream):
+            self._stream = stream
+
+        def __iter__(self):
+            yield from self._stream
+
+        def close(self):
+            try:
+                self._stream.close()
+            finally:
+                statistics.release()
+
+    class CountingTransport(httpx.BaseTransport):
+        """
+        Counts the requests of the pooled transport in the pool statistics.
+        """
+        def __init__(self, inner: httpx.BaseTransport):
+            self._inner = inner
+
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            statistics.acquire()
+            try:
+                response = self._inner.handle_request(request)
+            except BaseException:
+                statistics.release()
+                raise
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=CountingStream(response.stream),
+                extensions=response.extensions,
+                request=request
+            )
+
+        def close(self):
+            self._inner.close()
+
+    transport = CountingTransport(httpx.HTTPTransport(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=http.max_connections,
+            max_keepalive_connections=http.max_keepalive_connections,
+            keepalive_expiry=http.keepalive_expiry
+        )
+    ))
+    if _cassette is not None:
+        from cassette import wrap_transport
+        
+        transport = wrap_transport(transport, *_cassette)
+
+    return SharedHttpClient(
+        transport=transport,
+        timeout=httpx.Timeout(http.timeout, connect=http.connect_timeout)
+    )
+
+
+def get_http_client(provider_settings: ProviderSettings):
+    """
+    Get the shared client of a provider's endpoint, creating it on first use.
+
+    Args:
+        provider_settings: The provider settings.
+
+    Returns:
+        The httpx client.
+    """
+    endpoint = provider_endpoint(provider_settings)
+    with _clients_lock:
+        client = _clients.get(endpoint)
+        if client is None:
+            http = provider_settings.http
+            statistics = PoolStatistics(http.max_connections, http.max_keepalive_connections, http.keepalive_expiry)
+            client = _create_client(provider_settings, statistics)
+            _clients[endpoint] = client
+            _statistics[endpoint] = statistics
+            logging.info(f"Created shared HTTP client for {endpoint}")
+        return client
+
+
+def http_pool_statistics() -> Dict[str, Dict[str, Any]]:
+    """
+    Get the pool statistics of every shared client keyed by endpoint.
+    """
+    with _clients_lock:
+        return {endpoint: statistics.to_dict() for endpoint, statistics in _statistics.items()}
+
+
+def close_http_clients():
+    """
+    Close every shared client of this process.
+    """
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _statistics.clear()
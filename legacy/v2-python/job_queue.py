@@ -0,0 +1,224 @@
+"""
+Durable SQLite-backed queue of section jobs.
+
+Each section is a job in one of the states pending, in_progress, done, skipped
+(the section has no text to process) or failed.
+Workers claim a job with a lease; a job whose lease expired (the worker died) is
+claimed again by the next worker, so a crash only loses the sections in flight.
+Several processes, on one machine or on machines sharing the database file, can
+work the same queue.
+"""
+
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS section_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_path TEXT NOT NULL,
+    header TEXT NOT NULL,
+    note_date TEXT NOT NULL,
+    section_text TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (source_path, header, content_hash)
+);
+CREATE INDEX IF NOT EXISTS section_jobs_state ON section_jobs (state, lease_expires);
+"""
+
+
+class SectionJob:
+    """
+    A claimed section job.
+    """
+    def __init__(self, job_id: int, source_path: str, header: str, note_date: str, section_text: str, attempts: int):
+        self.id = job_id
+        self.source_path = source_path
+        self.header = header
+        self.note_date = note_date
+        self.section_text = section_text
+        self.attempts = attempts
+
+
+def default_worker_id() -> str:
+    """
+    Identify the current worker process across machines.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SectionJobQueue:
+    """
+    Section jobs stored in a SQLite database.
+
+    WAL journaling lets readers and the claiming writer work concurrently on a
+    local disk. SQLite's WAL needs shared memory, use journal_mode="DELETE" when
+    the database file lives on a network share.
+
+    The methods block on SQLite's busy timeout, async callers run them in an
+    executor. A lock keeps the transactions of executor threads on the shared
+    connection apart.
+    """
+    def __init__(self, path: str, lease_seconds: float = 900, max_attempts: int = 3, journal_mode: str = "WAL"):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._connection.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._connection.execute("PRAGMA busy_timeout=60000")
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def enqueue(self, source_path: str, sections: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        Add section jobs, sections already queued with the same content are ignored.
+
+        Args:
+            source_path: The notes file the sections come from.
+            sections: (header, yyyy-MM-dd date, section text) per section.
+
+        Returns:
+            The number of new jobs.
+        """
+        now = time.time()
+        rows = [
+            (source_path, header, note_date, text, hashlib.sha1(text.encode("utf-8")).hexdigest(), now, now)
+            for header, note_date, text in sections
+        ]
+        connection = self._connection
+        with self._lock:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                before = connection.total_changes
+                connection.executemany(
+                    "INSERT OR IGNORE INTO section_jobs "
+                    "(source_path, header, note_date, section_text, content_hash, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                added = connection.total_changes - before
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return added
+
+    def claim(self, worker_id: str) -> Optional[SectionJob]:
+        """
+        Claim the oldest pending job or a job whose lease has expired.
+
+        Args:
+            worker_id: The claiming worker.
+
+        Returns:
+            The claimed job, or None when there is nothing to claim.
+        """
+        now = time.time()
+        connection = self._connection
+        with self._lock:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker died on the last attempt are not claimable anymore
+                connection.execute(
+                    "UPDATE section_jobs SET state = ?, lease_owner = NULL, error = 'lease expired', updated_at = ? "
+                    "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                    (FAILED, now, IN_PROGRESS, now, self.max_attempts)
+                )
+                row = connection.execute(
+                    "SELECT id, source_path, header, note_date, section_text, attempts FROM section_jobs "
+                    "WHERE attempts < ? AND (state = ? OR (state = ? AND lease_expires < ?)) "
+                    "ORDER BY note_date, id LIMIT 1",
+                    (self.max_attempts, PENDING, IN_PROGRESS, now)
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+
+                connection.execute(
+                    "UPDATE section_jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, "
+                    "lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (IN_PROGRESS, worker_id, now + self.lease_seconds, now, row[0])
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return SectionJob(row[0], row[1], row[2], row[3], row[4], row[5] + 1)
+
+    def renew(self, job: SectionJob, worker_id: str) -> bool:
+        """
+        Extend the lease of a job that is still being processed.
+
+        Returns:
+            False when the lease was lost to another worker.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE section_jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND state = ?",
+                (now + self.lease_seconds, now, job.id, worker_id, IN_PROGRESS)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job: SectionJob, worker_id: str):
+        """
+        Mark a job as done.
+        """
+        self._finish(job, worker_id, DONE, None)
+
+    def skip(self, job: SectionJob, worker_id: str, reason: str):
+        """
+        Mark a job as skipped, it is not retried.
+        """
+        self._finish(job, worker_id, SKIPPED, reason)
+
+    def fail(self, job: SectionJob, worker_id: str, error: str):
+        """
+        Return a job to the queue, or mark it failed when it has no attempts left.
+        """
+        self._finish(job, worker_id, FAILED if job.attempts >= self.max_attempts else PENDING, error)
+
+    def _finish(self, job: SectionJob, worker_id: str, state: str, error: Optional[str]):
+        """
+        Release the lease of a job and move it to a state.
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE section_jobs SET state = ?, lease_owner = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (state, error, time.time(), job.id, worker_id)
+            )
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Count the jobs per state.
+        """
+        counts = {PENDING: 0, IN_PROGRESS: 0, DONE: 0, SKIPPED: 0, FAILED: 0}
+        with self._lock:
+            rows = self._connection.execute("SELECT state, COUNT(*) FROM section_jobs GROUP BY state").fetchall()
+        for state, count in rows:
+            counts[state] = count
+        return counts
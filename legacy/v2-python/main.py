@@ -6,34 +6,57 @@ processes them using a group of specialized AI agents, and generates
 flashcards in a structured format.
 """
 
+import copy
 import os
 import logging
 import json
 import asyncio
+import time
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Set, Tuple
 
-# Import AG2 (pyautogen)
-import autogen
+# AG2 (pyautogen) and the agents are imported where they are first used.
+# Importing autogen pulls in openai, docker, tiktoken and more, which is wasted
+# startup time for dry runs, config checks and runs with nothing to process.
 
 # Import local modules
+from card_codec import CardRecord, decode_flash_cards
+from card_renderer import render_template, streamed, write_flash_cards, write_lines
+from cli import parse_arguments, apply_overrides
 from config.config_loader import AppSettings, AgentModelSettings
-from note_tools import parse_date
-from data_classes import FlashCard, FlashCardsResponse
-from agents.agent_base import AgentBase
-from agents.english_teacher_agent import EnglishTeacherAgent
-from agents.flashcard_reviewer_agent import FlashcardReviewerAgent
-from agents.flashcard_extractor_agent import FlashCardExtractorAgent
+from note_tools import NoteIndex
+from agents.agent_base import COMPACT_V1_INSTRUCTIONS, FULL_INSTRUCTIONS, INSTRUCTION_VERSIONS
+from tracing import tracer, span, instrument_agent
+from metrics import measure_agent_calls, run_metrics
+from metrics_export import start_metrics_export, stop_metrics_export
+from review_verdict import parse_review_verdict
+from manifest import FAILED, GENERATED, SKIPPED, close_manifests, get_manifest
+from chunking import card_overlap, merge_flash_cards, split_section
+from regeneration import build_diff_message, changed_lines, content_line_count, merge_regenerated, removed_existing_cards
+from hedging import enable_hedging
+from adaptive_concurrency import get_concurrency_controller, limit_agent_concurrency
+from routing import TeamPool, choose_route, configured_providers, estimate_tokens, provider_models, unknown_route_providers
+from speculative_extraction import SpeculativeExtraction
+from prompt_compression import PromptTokenMeter, compress_section, dropped_words
+from response_cache import get_response_cache, close_response_caches
+import rate_limiter
+from rate_limiter import SharedRateLimiter, limit_agent_requests
+from http_clients import get_http_client, http_pool_statistics, close_http_clients, install_cassette, cassette_installed, use_shared_client
+from job_queue import SectionJobQueue, default_worker_id
+from watcher import NotesWatcher, fingerprint_sections, find_changed_sections
 
+if TYPE_CHECKING:
+    from agents.agent_base import AgentBase
 
-# Constants
-MAX_PROCESSING_ATTEMPTS = 3
-# For testing purposes, set to True to process only the first section
-TEST_MODE = False
-MAX_SECTIONS_IN_TEST_MODE = 1
 
+# Sections per worker that may be between the reader and the writer of the pipeline
+PIPELINE_WINDOW_PER_WORKER = 2
 
-def create_agent_for_agent(agent_name: str, agent_base: AgentBase, app_settings: AppSettings):
+# The status of a day whose text and outputs match its last generation, nothing is written for it
+UNCHANGED = "unchanged"
+
+
+def create_agent_for_agent(agent_name: str, agent_base: 'AgentBase', app_settings: AppSettings):
     """
     Create an agent with the appropriate configuration.
     
@@ -59,7 +82,9 @@ def create_agent_for_agent(agent_name: str, agent_base: AgentBase, app_settings:
         
         # Use the first provider as default if available
         if len(app_settings.providers) > 0:
-            return create_agent_with_provider(agent_base, app_settings.providers[0], agent_model_settings or AgentModelSettings())
+            agent = create_agent_with_provider(agent_base, app_settings.providers[0], agent_model_settings or AgentModelSettings())
+            wrap_model_calls(agent, app_settings.providers[0])
+            return agent
         
         raise ValueError("No providers configured")
     
@@ -71,10 +96,51 @@ def create_agent_for_agent(agent_name: str, agent_base: AgentBase, app_settings:
     
     logging.info(f"Creating agent {agent_name} using provider: {provider_settings.name}")
     
-    return create_agent_with_provider(agent_base, provider_settings, agent_model_settings)
+    agent = create_agent_with_provider(agent_base, provider_settings, agent_model_settings)
+    wrap_model_calls(agent, provider_settings)
+    
+    hedging = agent_model_settings.hedging
+    if hedging.enabled:
+        alternate_client = None
+        if hedging.alternate_provider_name:
+            alternate_provider = app_settings.get_provider_by_name(hedging.alternate_provider_name)
+            if alternate_provider is None:
+                raise ValueError(f"Provider not found: {hedging.alternate_provider_name}")
+            
+            # A twin of the agent on the alternate provider, only its model client is used
+            twin_base = type(agent_base)(agent_base.temperature, agent_base.max_tokens, agent_base.instruction_version)
+            twin = create_agent_with_provider(twin_base, alternate_provider, agent_model_settings)
+            wrap_model_calls(twin, alternate_provider)
+            alternate_client = twin.client
+        
+        # Hedging wraps the limited calls, so every request of both providers is measured and limited
+        logging.info(f"Hedging requests of agent {agent_name} to provider: {hedging.alternate_provider_name or provider_settings.name}")
+        enable_hedging(agent, hedging, alternate_client, app_settings.processing.max_concurrency)
+    
+    return agent
 
 
-def create_agent_with_provider(agent_base: AgentBase, provider_settings, agent_settings):
+def wrap_model_calls(agent, provider_settings):
+    """
+    Measure the model calls of an agent and hold them to the request rate limit and the provider's concurrency limit.
+    
+    Args:
+        agent: The AG2 agent.
+        provider_settings: The provider of the agent's model client.
+    """
+    # Wrapped first so only the model call is measured, not the waits for the limits
+    measure_agent_calls(agent)
+    
+    if rate_limiter.request_limiter is not None:
+        limit_agent_requests(agent, rate_limiter.request_limiter)
+    
+    # Wrapped last so the concurrency slot is taken first, a request waiting for it doesn't use up a rate limit slot
+    controller = get_concurrency_controller(provider_settings)
+    if controller is not None:
+        limit_agent_concurrency(agent, controller)
+
+
+def create_agent_with_provider(agent_base: 'AgentBase', provider_settings, agent_settings):
     """
     Create an agent with the specified provider.
     
@@ -92,18 +158,21 @@ def create_agent_with_provider(agent_base: AgentBase, provider_settings, agent_s
     
     logging.info(f"Creating agent with provider: {provider_settings.name} of type: {provider_settings.type}")
     
+    # Agents of the same endpoint share one pooled HTTP client
+    http_client = get_http_client(provider_settings) if use_shared_client(provider_settings) else None
+    
     # Use the appropriate agent creation method based on provider type
     if provider_settings.type == "OpenAI":
-        return create_agent_with_openai(agent_base, provider_settings.openai, agent_settings)
+        return create_agent_with_openai(agent_base, provider_settings.openai, agent_settings, http_client)
     elif provider_settings.type == "Azure":
-        return create_agent_with_azure(agent_base, provider_settings.azure, agent_settings)
+        return create_agent_with_azure(agent_base, provider_settings.azure, agent_settings, http_client)
     elif provider_settings.type == "OpenRouter":
-        return create_agent_with_openrouter(agent_base, provider_settings.openrouter, agent_settings)
+        return create_agent_with_openrouter(agent_base, provider_settings.openrouter, agent_settings, http_client)
     else:
         raise ValueError(f"Unknown provider type: {provider_settings.type}")
 
 
-def create_agent_with_openai(agent_base: AgentBase, settings, agent_settings):
+def create_agent_with_openai(agent_base: 'AgentBase', settings, agent_settings, http_client=None):
     """
     Create an agent using OpenAI configuration.
     
@@ -111,6 +180,7 @@ def create_agent_with_openai(agent_base: AgentBase, settings, agent_settings):
         agent_base: The base agent.
         settings: The OpenAI settings.
         agent_settings: The agent settings.
+        http_client: The shared HTTP client, the OpenAI client creates its own when omitted.
         
     Returns:
         The created agent.
@@ -128,18 +198,29 @@ def create_agent_with_openai(agent_base: AgentBase, settings, agent_settings):
     # Create OpenAI configuration
     config = {
         "api_key": settings.api_key,
-        "model": settings.model_name
+        "model": settings.model_name,
+        # AG2 otherwise caches in .cache/<seed>, the only cache of a run is Processing.CachePath
+        "cache_seed": None
     }
     
     # Add temperature only if the model supports it
     if settings.use_temperature:
         config["temperature"] = agent_settings.temperature
     
+    # Reasoning models take max_completion_tokens instead of max_tokens
+    if settings.use_completion_tokens:
+        config["max_completion_tokens"] = agent_settings.max_tokens
+    else:
+        config["max_tokens"] = agent_settings.max_tokens
+    
+    if http_client is not None:
+        config["http_client"] = http_client
+    
     # Use the create_openai_agent method
     return agent_base.create_openai_agent(config)
 
 
-def create_agent_with_azure(agent_base: AgentBase, settings, agent_settings):
+def create_agent_with_azure(agent_base: 'AgentBase', settings, agent_settings, http_client=None):
     """
     Create an agent using Azure configuration.
     
@@ -147,6 +228,7 @@ def create_agent_with_azure(agent_base: AgentBase, settings, agent_settings):
         agent_base: The base agent.
         settings: The Azure settings.
         agent_settings: The agent settings.
+        http_client: The shared HTTP client, the OpenAI client creates its own when omitted.
         
     Returns:
         The created agent.
@@ -170,18 +252,29 @@ def create_agent_with_azure(agent_base: AgentBase, settings, agent_settings):
         "api_key": settings.api_key,
         "base_url": settings.endpoint,
         "api_version": settings.api_version or "2024-08-01-preview",
-        "api_type": "azure"
+        "api_type": "azure",
+        # AG2 otherwise caches in .cache/<seed>, the only cache of a run is Processing.CachePath
+        "cache_seed": None
     }
     
     # Add temperature only if the model supports it
     if settings.use_temperature:
         config["temperature"] = agent_settings.temperature
     
+    # Reasoning models take max_completion_tokens instead of max_tokens
+    if settings.use_completion_tokens:
+        config["max_completion_tokens"] = agent_settings.max_tokens
+    else:
+        config["max_tokens"] = agent_settings.max_tokens
+    
+    if http_client is not None:
+        config["http_client"] = http_client
+    
     # Use the create_azure_agent method
     return agent_base.create_azure_agent(config, settings.model_name)
 
 
-def create_agent_with_openrouter(agent_base: AgentBase, settings, agent_settings):
+def create_agent_with_openrouter(agent_base: 'AgentBase', settings, agent_settings, http_client=None):
     """
     Create an agent using OpenRouter configuration.
     
@@ -189,6 +282,7 @@ def create_agent_with_openrouter(agent_base: AgentBase, settings, agent_settings
         agent_base: The base agent.
         settings: The OpenRouter settings.
         agent_settings: The agent settings.
+        http_client: The shared HTTP client, the OpenAI client creates its own when omitted.
         
     Returns:
         The created agent.
@@ -207,105 +301,370 @@ def create_agent_with_openrouter(agent_base: AgentBase, settings, agent_settings
     config = {
         "api_key": settings.api_key,
         "model": settings.model_name,
-        "base_url": settings.endpoint
+        "base_url": settings.endpoint,
+        # AG2 otherwise caches in .cache/<seed>, the only cache of a run is Processing.CachePath
+        "cache_seed": None
     }
     
     # Add temperature only if the model supports it
     if settings.use_temperature:
         config["temperature"] = agent_settings.temperature
     
+    # Reasoning models take max_completion_tokens instead of max_tokens
+    if settings.use_completion_tokens:
+        config["max_completion_tokens"] = agent_settings.max_tokens
+    else:
+        config["max_tokens"] = agent_settings.max_tokens
+    
+    if http_client is not None:
+        config["http_client"] = http_client
+    
     # Use the create_openai_agent method (OpenRouter uses OpenAI-compatible API)
     return agent_base.create_openai_agent(config)
 
 
-def custom_speaker_selection(last_speaker, groupchat):
+def create_speaker_selection(speculation: Optional[SpeculativeExtraction] = None):
     """
-    Custom speaker selection function for the group chat.
+    Create the speaker selection function of a group chat.
     
     Args:
-        last_speaker: The last speaker in the group chat.
-        groupchat: The group chat.
+        speculation: Starts the extraction of every teacher's draft while the reviewer reviews it, when given.
         
     Returns:
-        The next speaker.
-    """
-    messages = groupchat.messages
-    
-    # Get the agents by name
-    user_proxy = None
-    teacher_agent = None
-    reviewer_agent = None
-    extractor_agent = None
-    
-    for agent in groupchat.agents:
-        if agent.name == "UserProxy":
-            user_proxy = agent
-        elif agent.name == "EnglishTeacherAgent":
-            teacher_agent = agent
-        elif agent.name == "FlashcardReviewerAgent":
-            reviewer_agent = agent
-        elif agent.name == "FlashCardExtractorAgent":
-            extractor_agent = agent
-    
-    # Initial message from user proxy goes to teacher agent
-    if len(messages) <= 1:
-        return teacher_agent
-    
-    # Check for approval in the reviewer's message
-    if last_speaker is reviewer_agent:
-        if "OK!" in messages[-1]["content"]:
-            # If the reviewer approves, move to the extractor
-            return extractor_agent
-        else:
-            # If the reviewer has suggestions, go back to the teacher
+        The speaker selection function.
+    """
+    def custom_speaker_selection(last_speaker, groupchat):
+        """
+        Custom speaker selection function for the group chat.
+        
+        Args:
+            last_speaker: The last speaker in the group chat.
+            groupchat: The group chat.
+            
+        Returns:
+            The next speaker.
+        """
+        messages = groupchat.messages
+        
+        # Get the agents by name
+        user_proxy = None
+        teacher_agent = None
+        reviewer_agent = None
+        extractor_agent = None
+        
+        for agent in groupchat.agents:
+            if agent.name == "UserProxy":
+                user_proxy = agent
+            elif agent.name == "EnglishTeacherAgent":
+                teacher_agent = agent
+            elif agent.name == "FlashcardReviewerAgent":
+                reviewer_agent = agent
+            elif agent.name == "FlashCardExtractorAgent":
+                extractor_agent = agent
+        
+        # Initial message from user proxy goes to teacher agent
+        if len(messages) <= 1:
             return teacher_agent
+        
+        # Check for approval in the reviewer's verdict
+        if last_speaker is reviewer_agent:
+            if parse_review_verdict(messages[-1]["content"]).approved:
+                # If the reviewer approves, move to the extractor
+                if speculation is not None:
+                    speculation.accept()
+                return extractor_agent
+            else:
+                # If the reviewer has suggestions, go back to the teacher
+                if speculation is not None:
+                    speculation.discard()
+                return teacher_agent
+        
+        # Teacher agent's response goes to reviewer
+        if last_speaker is teacher_agent:
+            if speculation is not None:
+                speculation.start(messages)
+            return reviewer_agent
+        
+        # Extractor agent's response goes back to user proxy
+        # After the extractor agent has processed the cards, we want to terminate the conversation
+        if last_speaker is extractor_agent:
+            # Return None to terminate the conversation
+            return None
+        
+        # Default to random selection if we can't determine the next speaker
+        return "random"
     
-    # Teacher agent's response goes to reviewer
-    if last_speaker is teacher_agent:
-        return reviewer_agent
+    return custom_speaker_selection
+
+
+class AgentTeam:
+    """
+    The agents taking part in the flashcard group chat.
     
-    # Extractor agent's response goes back to user proxy
-    # After the extractor agent has processed the cards, we want to terminate the conversation
-    if last_speaker is extractor_agent:
-        # Return None to terminate the conversation
-        return None
+    A team can be created once and reused for many sections, one section at a time.
+    """
+    def __init__(
+        self,
+        user_proxy,
+        teacher_agent,
+        reviewer_agent,
+        extractor_agent,
+        manager_llm_config: Dict[str, Any],
+        speculation: Optional[SpeculativeExtraction] = None,
+        prompt_meter: Optional[PromptTokenMeter] = None
+    ):
+        self.user_proxy = user_proxy
+        self.teacher_agent = teacher_agent
+        self.reviewer_agent = reviewer_agent
+        self.extractor_agent = extractor_agent
+        self.manager_llm_config = manager_llm_config
+        self.speculation = speculation
+        self.prompt_meter = prompt_meter
+    
+    def reset(self):
+        """
+        Clear the conversation state left by the previous section.
+        """
+        for agent in (self.user_proxy, self.teacher_agent, self.reviewer_agent, self.extractor_agent):
+            agent.reset()
+        if self.speculation is not None:
+            self.speculation.reset()
+        if self.prompt_meter is not None:
+            self.prompt_meter.reset()
+
+
+def create_manager_llm_config(app_settings: AppSettings) -> Dict[str, Any]:
+    """
+    Create the LLM config for the group chat manager from the teacher's provider.
+    
+    Args:
+        app_settings: The application settings.
+        
+    Returns:
+        The LLM config.
+    """
+    # Get the provider settings for the LLM config
+    provider_settings = app_settings.get_provider_by_name(app_settings.agents.teacher_agent.provider_name)
+    
+    # Create LLM config for the manager
+    if provider_settings.type == "OpenAI":
+        llm_config = {
+            "api_key": provider_settings.openai.api_key,
+            "model": provider_settings.openai.model_name
+        }
+        
+        # Add temperature only if the model supports it
+        if provider_settings.openai.use_temperature:
+            llm_config["temperature"] = 0.7
+            
+    elif provider_settings.type == "Azure":
+        llm_config = {
+            "api_key": provider_settings.azure.api_key,
+            "endpoint": provider_settings.azure.endpoint,
+            "api_version": provider_settings.azure.api_version or "2024-08-01-preview",
+            "model": provider_settings.azure.model_name
+        }
+        
+        # Add temperature only if the model supports it
+        if provider_settings.azure.use_temperature:
+            llm_config["temperature"] = 0.7
+            
+    else:
+        # Default to OpenAI if provider type is unknown
+        llm_config = {
+            "api_key": provider_settings.openai.api_key,
+            "model": provider_settings.openai.model_name
+        }
+        
+        # Add temperature only if the model supports it
+        if provider_settings.openai.use_temperature:
+            llm_config["temperature"] = 0.7
+    
+    # AG2 otherwise caches in .cache/<seed>, the only cache of a run is Processing.CachePath
+    llm_config["cache_seed"] = None
+    
+    if use_shared_client(provider_settings):
+        llm_config["http_client"] = get_http_client(provider_settings)
+    
+    return llm_config
+
+
+def uses_prompt_compression(app_settings: AppSettings) -> bool:
+    """
+    Check whether the notes or the instructions of a run are compressed.
+    """
+    processing = app_settings.processing
+    return processing.compress_notes or processing.instruction_version != FULL_INSTRUCTIONS
+
+
+def create_agent_team(app_settings: AppSettings) -> AgentTeam:
+    """
+    Create the agents of the group chat.
+    
+    Args:
+        app_settings: The application settings.
+        
+    Returns:
+        The agent team.
+    """
+    import autogen
+    from agents.english_teacher_agent import EnglishTeacherAgent
+    from agents.flashcard_reviewer_agent import FlashcardReviewerAgent
+    from agents.flashcard_extractor_agent import FlashCardExtractorAgent
+    
+    instruction_version = app_settings.processing.instruction_version
+    
+    teacher_settings = app_settings.agents.teacher_agent
+    teacher = EnglishTeacherAgent(teacher_settings.temperature, teacher_settings.max_tokens, instruction_version)
+    teacher_agent = create_agent_for_agent("TeacherAgent", teacher, app_settings)
     
-    # Default to random selection if we can't determine the next speaker
-    return "random"
+    reviewer_settings = app_settings.agents.reviewer_agent
+    reviewer = FlashcardReviewerAgent(reviewer_settings.temperature, reviewer_settings.max_tokens, instruction_version)
+    reviewer_agent = create_agent_for_agent("ReviewerAgent", reviewer, app_settings)
+    
+    extractor_settings = app_settings.agents.extractor_agent
+    extractor = FlashCardExtractorAgent(extractor_settings.temperature, extractor_settings.max_tokens, instruction_version)
+    extractor_agent = create_agent_for_agent("ExtractorAgent", extractor, app_settings)
+    
+    # Create a user proxy agent with TERMINATE mode
+    user_proxy = autogen.UserProxyAgent(
+        name="UserProxy",
+        human_input_mode="TERMINATE",
+        is_termination_msg=lambda x: x.get("name") == "FlashCardExtractorAgent" and "FlashCards" in x.get("content", ""),
+        code_execution_config=False  # Disable code execution
+    )
+    
+    if tracer.enabled:
+        for agent in (teacher_agent, reviewer_agent, extractor_agent):
+            instrument_agent(agent)
+    
+    speculation = None
+    if app_settings.processing.speculative_extraction:
+        speculation = SpeculativeExtraction(extractor_agent)
+        speculation.attach()
+    
+    prompt_meter = None
+    if uses_prompt_compression(app_settings):
+        prompt_meter = PromptTokenMeter()
+        for agent, agent_base in ((teacher_agent, teacher), (reviewer_agent, reviewer), (extractor_agent, extractor)):
+            prompt_meter.attach(agent, agent_base.full_instruction)
+    
+    return AgentTeam(
+        user_proxy,
+        teacher_agent,
+        reviewer_agent,
+        extractor_agent,
+        create_manager_llm_config(app_settings),
+        speculation,
+        prompt_meter
+    )
 
 
-async def process_section_with_groupchat(section: str, app_settings: AppSettings) -> Optional[str]:
+# Agent teams of the routed sections, reused per provider combination
+team_pool = TeamPool(create_agent_team)
+
+
+def record_chat_statistics(chat_history: List[Dict[str, Any]], team: AgentTeam, manager):
+    """
+    Record the review rounds, rejected cards and tokens of a group chat in the run metrics.
+    
+    Args:
+        chat_history: The messages of the chat.
+        team: The agents of the chat.
+        manager: The group chat manager.
+    """
+    import autogen
+    
+    for msg in chat_history:
+        if msg.get("name") == team.reviewer_agent.name:
+            verdict = parse_review_verdict(msg.get("content"))
+            run_metrics.increment("review_rounds")
+            run_metrics.increment("cards_rejected", len(verdict.rejected))
+            if not verdict.structured:
+                run_metrics.increment("unstructured_verdicts")
+    
+    # Tokens used by the conversation, cached responses included
+    agents = [team.teacher_agent, team.reviewer_agent, team.extractor_agent, manager]
+    usage = autogen.gather_usage_summary(agents)["usage_including_cached_inference"]
+    for model_usage in usage.values():
+        if isinstance(model_usage, dict):
+            run_metrics.increment("prompt_tokens", model_usage.get("prompt_tokens", 0))
+            run_metrics.increment("completion_tokens", model_usage.get("completion_tokens", 0))
+
+
+def extraction_message(section: str, compress: bool = False) -> str:
+    """
+    Get the message that asks the agents to extract the cards of a section.
+    
+    Args:
+        section: The section to process.
+        compress: Whether to send the section compressed, see prompt_compression.
+    """
+    if compress:
+        return f"Extract cards from the note:\n{compress_section(section)}"
+    return f"""
+        Extract cards from the note:
+        {section}
+        """
+
+
+def parse_extractor_response(extractor_response: str) -> List[CardRecord]:
+    """
+    Parse the flashcards of the extractor's answer.
+    
+    Args:
+        extractor_response: The extractor's answer, optionally in a markdown code block.
+        
+    Returns:
+        The flashcards.
+    """
+    # Clean up the content to ensure it's valid JSON
+    content = extractor_response.strip()
+    if content.startswith("```json"):
+        content = content[7:]
+    if content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    content = content.strip()
+    
+    # Parse and validate the JSON in a single pass, the extractor's capitalised keys are accepted as is
+    with span("decode_flash_cards", "parse", size=len(content)):
+        return decode_flash_cards(content)
+
+
+async def process_section_with_groupchat(
+    section: str,
+    app_settings: AppSettings,
+    team: Optional[AgentTeam] = None,
+    message: Optional[str] = None,
+    teacher_messages: Optional[List[str]] = None
+) -> Optional[List[CardRecord]]:
     """
     Process a section using a group chat with a finite state machine.
     
     Args:
         section: The section to process.
         app_settings: The application settings.
+        team: Pre-built agents to reuse, new agents are created when omitted.
+        message: The message that starts the chat, a request to extract the cards of the section when omitted.
+        teacher_messages: Collects the contents of the teacher's messages, when given.
         
     Returns:
-        The formatted flashcards, or None if processing failed.
+        The flashcards, or None if processing failed.
     """
+    import autogen
+    
     try:
-        # Create the agents
-        teacher_settings = app_settings.agents.teacher_agent
-        teacher = EnglishTeacherAgent(teacher_settings.temperature, teacher_settings.max_tokens)
-        teacher_agent = create_agent_for_agent("TeacherAgent", teacher, app_settings)
-        
-        reviewer_settings = app_settings.agents.reviewer_agent
-        reviewer = FlashcardReviewerAgent(reviewer_settings.temperature, reviewer_settings.max_tokens)
-        reviewer_agent = create_agent_for_agent("ReviewerAgent", reviewer, app_settings)
-        
-        extractor_settings = app_settings.agents.extractor_agent
-        extractor = FlashCardExtractorAgent(extractor_settings.temperature, extractor_settings.max_tokens)
-        extractor_agent = create_agent_for_agent("ExtractorAgent", extractor, app_settings)
-        
-        # Create a user proxy agent with TERMINATE mode
-        user_proxy = autogen.UserProxyAgent(
-            name="UserProxy",
-            human_input_mode="TERMINATE",
-            is_termination_msg=lambda x: x.get("name") == "FlashCardExtractorAgent" and "FlashCards" in x.get("content", ""),
-            code_execution_config=False  # Disable code execution
-        )
+        if team is None:
+            team = create_agent_team(app_settings)
+        else:
+            team.reset()
+        
+        user_proxy = team.user_proxy
+        teacher_agent = team.teacher_agent
+        reviewer_agent = team.reviewer_agent
+        extractor_agent = team.extractor_agent
         
         # Define the allowed transitions between agents
         allowed_transitions = {
@@ -319,65 +678,39 @@ async def process_section_with_groupchat(section: str, app_settings: AppSettings
         group_chat = autogen.GroupChat(
             agents=[user_proxy, teacher_agent, reviewer_agent, extractor_agent],
             messages=[],
-            max_round=15,
-            speaker_selection_method=custom_speaker_selection,
+            max_round=app_settings.processing.max_round,
+            speaker_selection_method=create_speaker_selection(team.speculation),
             allowed_or_disallowed_speaker_transitions=allowed_transitions,
             speaker_transitions_type="allowed"
         )
         
-        # Get the provider settings for the LLM config
-        provider_settings = app_settings.get_provider_by_name(teacher_settings.provider_name)
-        
-        # Create LLM config for the manager
-        if provider_settings.type == "OpenAI":
-            llm_config = {
-                "api_key": provider_settings.openai.api_key,
-                "model": provider_settings.openai.model_name
-            }
-            
-            # Add temperature only if the model supports it
-            if provider_settings.openai.use_temperature:
-                llm_config["temperature"] = 0.7
-                
-        elif provider_settings.type == "Azure":
-            llm_config = {
-                "api_key": provider_settings.azure.api_key,
-                "endpoint": provider_settings.azure.endpoint,
-                "api_version": provider_settings.azure.api_version or "2024-08-01-preview",
-                "model": provider_settings.azure.model_name
-            }
-            
-            # Add temperature only if the model supports it
-            if provider_settings.azure.use_temperature:
-                llm_config["temperature"] = 0.7
-                
-        else:
-            # Default to OpenAI if provider type is unknown
-            llm_config = {
-                "api_key": provider_settings.openai.api_key,
-                "model": provider_settings.openai.model_name
-            }
-            
-            # Add temperature only if the model supports it
-            if provider_settings.openai.use_temperature:
-                llm_config["temperature"] = 0.7
-        
         # Create the manager
         manager = autogen.GroupChatManager(
             groupchat=group_chat,
-            llm_config=llm_config
+            llm_config=team.manager_llm_config
         )
         
         # Initiate the chat
-        message = f"""
-        Extract cards from the note:
-        {section}
-        """
+        if message is None:
+            message = extraction_message(section)
+            if app_settings.processing.compress_notes:
+                compressed = extraction_message(section, compress=True)
+                if team.prompt_meter is not None:
+                    team.prompt_meter.start_section(message, compressed)
+                message = compressed
         
-        chat_result = user_proxy.initiate_chat(
-            recipient=manager,
-            message=message
-        )
+        # The chat runs on the event loop, AG2 only moves the blocking model calls to worker threads
+        # Recorded and replayed runs send every request, a cached response would be missing from the cassette
+        cache = None if cassette_installed() else get_response_cache(app_settings.processing.cache_path, app_settings.processing.cache_seed)
+        with span("group_chat", "agent"):
+            chat_result = await user_proxy.a_initiate_chat(manager, message=message, cache=cache)
+        
+        record_chat_statistics(chat_result.chat_history, team, manager)
+        
+        if teacher_messages is not None:
+            teacher_messages[:] = [
+                msg.get("content") or "" for msg in chat_result.chat_history if msg.get("name") == teacher_agent.name
+            ]
         
         # Extract the last message from the extractor agent
         extractor_response = None
@@ -390,41 +723,21 @@ async def process_section_with_groupchat(section: str, app_settings: AppSettings
             logging.error("No response from extractor agent")
             return None
         
-        # Clean up the content to ensure it's valid JSON
-        content = extractor_response.strip()
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
-        
-        # Parse the JSON
-        flash_cards_dict = json.loads(content)
-        
-        # Convert capitalized field names to lowercase
-        if "FlashCards" in flash_cards_dict:
-            for i, card in enumerate(flash_cards_dict["FlashCards"]):
-                if "Front" in card:
-                    card["front"] = card.pop("Front")
-                if "Back" in card:
-                    card["back"] = card.pop("Back")
-                if "IsReversed" in card:
-                    card["is_reversed"] = card.pop("IsReversed")
-        
-        # Parse the modified JSON
-        flash_cards_response = FlashCardsResponse(**flash_cards_dict)
-        
-        # Return the formatted flashcards
-        return flash_cards_response.format_flash_cards()
+        return parse_extractor_response(extractor_response)
     
     except Exception as ex:
         logging.error(f"Error processing section with group chat: {ex}")
         return None
 
 
-async def process_section_async(section: str, app_settings: AppSettings, section_index: int) -> Optional[str]:
+async def process_section_async(
+    section: str,
+    app_settings: AppSettings,
+    section_index: int,
+    team: Optional[AgentTeam] = None,
+    message: Optional[str] = None,
+    teacher_messages: Optional[List[str]] = None
+) -> Optional[List[CardRecord]]:
     """
     Process a section of the markdown file.
     
@@ -432,38 +745,152 @@ async def process_section_async(section: str, app_settings: AppSettings, section
         section: The section to process.
         app_settings: The application settings.
         section_index: The index of the section.
+        team: Pre-built agents to reuse, new agents are created when omitted.
+        message: The message that starts the chat, a request to extract the cards of the section when omitted.
+        teacher_messages: Collects the contents of the teacher's messages of the successful attempt, when given.
         
     Returns:
-        The formatted flashcards, or None if processing failed.
+        The flashcards, or None if processing failed.
     """
-    for attempt in range(1, MAX_PROCESSING_ATTEMPTS + 1):
+    max_attempts = app_settings.processing.max_processing_attempts
+    for attempt in range(1, max_attempts + 1):
         try:
-            logging.info(f"Processing section {section_index}, attempt {attempt}/{MAX_PROCESSING_ATTEMPTS}")
+            logging.info(f"Processing section {section_index}, attempt {attempt}/{max_attempts}")
+            run_metrics.increment("attempts")
+            if attempt > 1:
+                run_metrics.increment("retries")
             
             # Process the section using the group chat
-            formatted_cards = await process_section_with_groupchat(section, app_settings)
+            started = time.perf_counter()
+            with span("process_section", "section", section=section_index, attempt=attempt):
+                flash_cards = await process_section_with_groupchat(section, app_settings, team, message, teacher_messages)
+            run_metrics.observe("section_attempt", time.perf_counter() - started)
             
-            if not formatted_cards:
+            if not flash_cards:
                 logging.warning(f"No content received from the group chat on attempt {attempt}")
                 continue
             
             # If we get here, processing was successful
             logging.info(f"Successfully processed section {section_index} on attempt {attempt}")
-            return formatted_cards
+            return flash_cards
         
         except Exception as ex:
-            logging.error(f"Unexpected error processing section {section_index} on attempt {attempt}/{MAX_PROCESSING_ATTEMPTS}: {ex}")
+            logging.error(f"Unexpected error processing section {section_index} on attempt {attempt}/{max_attempts}: {ex}")
             
             # If this is the last attempt, log an error
-            if attempt == MAX_PROCESSING_ATTEMPTS:
-                logging.error(f"Failed to process section {section_index} after {MAX_PROCESSING_ATTEMPTS} attempts")
+            if attempt == max_attempts:
+                logging.error(f"Failed to process section {section_index} after {max_attempts} attempts")
     
     # If we get here, all attempts failed
     return None
 
 
+async def process_routed_section_async(
+    section: str,
+    app_settings: AppSettings,
+    section_index: int,
+    team: Optional[AgentTeam] = None,
+    used_models: Optional[Set[str]] = None,
+    message: Optional[str] = None,
+    teacher_messages: Optional[List[str]] = None
+) -> Optional[List[CardRecord]]:
+    """
+    Process a section on the providers chosen by the routing rules.
+    
+    Without routing rules, or with a given team, the section is processed as is.
+    A given message is routed instead of the section, it is what the agents get.
+    
+    Args:
+        section: The section to process.
+        app_settings: The application settings.
+        section_index: The index of the section.
+        team: Pre-built agents to reuse, the routing rules are not applied when given.
+        used_models: Collects the models the section is processed with, when given.
+        message: The message that starts the chat, a request to extract the cards of the section when omitted.
+        teacher_messages: Collects the contents of the teacher's messages, when given.
+        
+    Returns:
+        The flashcards, or None if processing failed.
+    """
+    if team is not None or not app_settings.routing.rules:
+        if used_models is not None:
+            used_models.update(provider_models(app_settings, configured_providers(app_settings)))
+        return await process_section_async(section, app_settings, section_index, team, message, teacher_messages)
+    
+    route = choose_route(message or section, app_settings)
+    if used_models is not None:
+        used_models.update(provider_models(app_settings, route.providers))
+    features = route.features
+    logging.info(
+        f"Section {section_index}: route {route.name} ({features.tokens} tokens, {features.sub_headers} sub-headers, "
+        f"{features.questions} questions), providers {', '.join(route.providers)}"
+    )
+    run_metrics.increment(f"route_{route.name}")
+    
+    team = team_pool.acquire(app_settings, route)
+    started = time.perf_counter()
+    try:
+        with span("route", "section", route=route.name, tokens=features.tokens):
+            flash_cards = await process_section_async(section, app_settings, section_index, team, message, teacher_messages)
+    finally:
+        team_pool.release(route, team)
+    
+    elapsed = time.perf_counter() - started
+    run_metrics.observe(f"route_{route.name}", elapsed)
+    logging.info(f"Section {section_index}: route {route.name} finished in {elapsed:.1f}s, {len(flash_cards or [])} cards")
+    return flash_cards
+
+
+async def process_chunked_section_async(
+    section: str,
+    app_settings: AppSettings,
+    section_index: int,
+    team: Optional[AgentTeam] = None,
+    used_models: Optional[Set[str]] = None
+) -> Optional[List[CardRecord]]:
+    """
+    Process a section, splitting it into chunks over Processing.ChunkMaxTokens.
+    
+    The chunks are processed in parallel, one at a time when a team is given,
+    and their cards are merged without duplicates. The section fails when one
+    of its chunks fails.
+    
+    Args:
+        section: The section to process.
+        app_settings: The application settings.
+        section_index: The index of the section.
+        team: Pre-built agents to reuse, new agents are created when omitted.
+        used_models: Collects the models the section is processed with, when given.
+        
+    Returns:
+        The flashcards, or None if processing failed.
+    """
+    chunks = split_section(section, app_settings.processing.chunk_max_tokens)
+    if len(chunks) == 1:
+        return await process_routed_section_async(section, app_settings, section_index, team, used_models)
+    
+    logging.info(f"Section {section_index} is over {app_settings.processing.chunk_max_tokens} tokens, processing it in {len(chunks)} chunks")
+    run_metrics.increment("sections_chunked")
+    run_metrics.increment("chunks", len(chunks))
+    
+    if team is None:
+        results = await asyncio.gather(*(
+            process_routed_section_async(chunk, app_settings, section_index, None, used_models) for chunk in chunks
+        ))
+    else:
+        results = [await process_routed_section_async(chunk, app_settings, section_index, team, used_models) for chunk in chunks]
+    
+    if not all(results):
+        logging.error(f"Failed to process {sum(1 for cards in results if not cards)} of {len(chunks)} chunks of section {section_index}")
+        return None
+    
+    flash_cards = merge_flash_cards(results)
+    logging.info(f"Merged {sum(map(len, results))} cards of section {section_index} into {len(flash_cards)}")
+    return flash_cards
+
+
 def save_output_files(
-    formatted_cards: str,
+    flash_cards: List[CardRecord],
     note_date_without_day_of_week: str,
     note_date_str: str,
     section_lines: List[str],
@@ -475,8 +902,11 @@ def save_output_files(
     """
     Save the output files.
     
+    The cards and the note text are streamed into the files, the text of the
+    whole deck is never built in memory.
+    
     Args:
-        formatted_cards: The formatted flashcards.
+        flash_cards: The flashcards.
         note_date_without_day_of_week: The note date without the day of the week.
         note_date_str: The note date with the day of the week.
         section_lines: The lines of the section.
@@ -484,6 +914,9 @@ def save_output_files(
         result_notes_folder_path: The path to the result notes folder.
         cards_template: The cards template.
         note_template: The note template.
+        
+    Returns:
+        The paths of the cards file and the note file.
     """
     current_timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
     
@@ -493,132 +926,891 @@ def save_output_files(
     
     cards_file_path = os.path.join(result_cards_folder_path, cards_file_name)
     
-    formatted_cards_template = cards_template.format(
-        current_timestamp,
-        note_name,
-        note_date_without_day_of_week,
-        formatted_cards
-    )
-    
     # Ensure the directory exists
     os.makedirs(result_cards_folder_path, exist_ok=True)
     
     with open(cards_file_path, 'w') as f:
-        f.write(formatted_cards_template)
+        render_template(cards_template, f, [
+            current_timestamp,
+            note_name,
+            note_date_without_day_of_week,
+            streamed(write_flash_cards, flash_cards)
+        ])
     
     logging.info(f"Saved cards to {cards_file_path}")
     
     note_file_name = f"{note_name}.md"
     note_file_path = os.path.join(result_notes_folder_path, note_file_name)
-    note_text = "\n".join(section_lines[1:])
-    
-    formatted_note_template = note_template.format(
-        current_timestamp,
-        cards_name,
-        note_date_str,
-        note_text
-    )
     
     # Ensure the directory exists
     os.makedirs(result_notes_folder_path, exist_ok=True)
     
     with open(note_file_path, 'w') as f:
-        f.write(formatted_note_template)
+        render_template(note_template, f, [
+            current_timestamp,
+            cards_name,
+            note_date_str,
+            streamed(write_lines, section_lines[1:])
+        ])
     
     logging.info(f"Saved note to {note_file_path}")
+    return cards_file_path, note_file_path
 
 
-def main():
+async def process_entry_async(
+    note_index: NoteIndex,
+    entry,
+    index: int,
+    app_settings: AppSettings,
+    cards_template: str,
+    note_template: str,
+    semaphore: asyncio.Semaphore,
+    team: Optional[AgentTeam] = None
+) -> Optional[List[CardRecord]]:
     """
-    Main function.
+    Process a single indexed section and save its output files.
+    
+    Args:
+        note_index: The index of the notes file.
+        entry: The index entry of the section.
+        index: The index of the section in the run.
+        app_settings: The application settings.
+        cards_template: The cards template.
+        note_template: The note template.
+        semaphore: Limits the number of sections processed at the same time.
+        team: Pre-built agents to reuse, new agents are created when omitted.
+        
+    Returns:
+        The flashcards, or None if the section was skipped or failed.
     """
-    # Initialize configuration
-    app_settings = AppSettings.load_from_configuration("appsettings.json")
+    async with semaphore:
+        with span("read_section", "io", header=entry.header):
+            section = note_index.read_section(entry)
+        return await process_dated_section_async(section, entry.date, index, app_settings, cards_template, note_template, team)
+
+
+class SectionResult:
+    """
+    The outcome of a section on its way from the agents to the output files.
+    """
+    def __init__(
+        self,
+        section: str,
+        note_date: datetime,
+        index: int,
+        source_path: str,
+        flash_cards: Optional[List[CardRecord]] = None,
+        used_models: Optional[Set[str]] = None,
+        status: str = GENERATED,
+        error: Optional[str] = None
+    ):
+        self.section = section
+        self.note_date = note_date
+        self.index = index
+        self.source_path = source_path
+        self.flash_cards = flash_cards
+        self.used_models = used_models or set()
+        self.status = status
+        self.error = error
+
+
+async def regenerate_edited_section_async(
+    section: str,
+    note_date: datetime,
+    index: int,
+    app_settings: AppSettings,
+    team: Optional[AgentTeam],
+    source_path: str
+) -> Optional[SectionResult]:
+    """
+    Regenerate a day from the diff against its last generation in the manifest.
     
-    # Initialize logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    Only the changed and added lines go to the agents, with the existing cards as
+    context, and the new cards are merged into the kept ones. A day with no changed
+    or added lines keeps its cards without calling the agents, and an unchanged day
+    whose files exist is not written again.
+    
+    Args:
+        section: The section text, starting with its header line.
+        note_date: The date of the section.
+        index: The index of the section in the run.
+        app_settings: The application settings.
+        team: Pre-built agents to reuse, new agents are created when omitted.
+        source_path: The notes file of the section.
+        
+    Returns:
+        The result, None when the day needs a full generation: it has no earlier
+        generation, more than DiffMaxChangedRatio of its lines changed or the diff failed.
+    """
+    manifest = get_manifest(app_settings.processing.manifest_path)
+    if manifest is None:
+        return None
+    previous = manifest.last_generated(source_path, note_date.strftime("%Y-%m-%d"))
+    if previous is None:
+        return None
+    previous_models = set(previous.models.split(", ")) if previous.models else set()
+    
+    if (
+        section == previous.section_text
+        and previous.status == GENERATED
+        and all(path and os.path.exists(path) for path in (previous.cards_path, previous.note_path))
+    ):
+        # Nothing to regenerate or rewrite, the files and the manifest row stay untouched
+        logging.info(f"Section {index}: unchanged since its last generation, keeping its {len(previous.cards)} card(s)")
+        run_metrics.increment("sections_unchanged")
+        return SectionResult(section, note_date, index, source_path, previous.cards, previous_models, status=UNCHANGED)
+    
+    lines = changed_lines(previous.section_text, section)
+    if not lines:
+        # Unchanged, or only lines were deleted: the cards stay as they are
+        logging.info(f"Section {index}: no changed lines, keeping its {len(previous.cards)} card(s)")
+        run_metrics.increment("sections_unchanged")
+        return SectionResult(section, note_date, index, source_path, previous.cards, previous_models)
+    
+    content_lines = content_line_count(section)
+    if len(lines) > app_settings.processing.diff_max_changed_ratio * content_lines:
+        logging.info(f"Section {index}: {len(lines)} of {content_lines} lines changed, regenerating the whole day")
+        return None
+    
+    logging.info(f"Section {index}: regenerating {len(lines)} changed line(s) of {content_lines} with {len(previous.cards)} existing card(s)")
+    message = build_diff_message(section, lines, previous.cards)
+    teacher_messages = []
+    used_models = set()
+    with span("regenerate_diff", "section", section=index, lines=len(lines)):
+        new_cards = await process_routed_section_async(section, app_settings, index, team, used_models, message, teacher_messages)
+    if not new_cards:
+        logging.warning(f"Section {index}: the changed lines could not be processed, regenerating the whole day")
+        return None
+    
+    removed = removed_existing_cards(teacher_messages, len(previous.cards))
+    flash_cards = merge_regenerated(previous.cards, removed, new_cards)
+    logging.info(f"Section {index}: {len(new_cards)} new card(s), {len(removed)} existing card(s) removed, {len(flash_cards)} in total")
+    run_metrics.increment("sections_diffed")
+    run_metrics.increment("diff_lines", len(lines))
+    run_metrics.increment("diff_cards_removed", len(removed))
+    return SectionResult(section, note_date, index, source_path, flash_cards, used_models)
+
+
+async def generate_section_async(
+    section: str,
+    note_date: datetime,
+    index: int,
+    app_settings: AppSettings,
+    team: Optional[AgentTeam] = None,
+    source_path: Optional[str] = None
+) -> Optional[SectionResult]:
+    """
+    Generate the cards of a section.
+    
+    Args:
+        section: The section text, starting with its header line.
+        note_date: The date of the section.
+        index: The index of the section in the run.
+        app_settings: The application settings.
+        team: Pre-built agents to reuse, new agents are created when omitted.
+        source_path: The notes file of the section, FilePaths.SourceNotePath when omitted.
+        
+    Returns:
+        The result to write, None in dry-run mode.
+    """
+    source_path = source_path or app_settings.file_paths.source_note_path
+    section_lines = section.split("\n")
+    if len(section_lines) < 2:
+        logging.error(f"Section {index} has less than 2 lines, skipping")
+        run_metrics.increment("sections_skipped")
+        if app_settings.processing.dry_run:
+            return None
+        return SectionResult(section, note_date, index, source_path, status=SKIPPED, error="The section has no text")
+    
+    if app_settings.processing.dry_run:
+        logging.info(f"[DRY RUN] Would process section {index} ({note_date.strftime('%Y-%m-%d')}, {len(section_lines)} lines)")
+        return None
+    
+    if app_settings.processing.diff_regeneration:
+        result = await regenerate_edited_section_async(section, note_date, index, app_settings, team, source_path)
+        if result is not None:
+            return result
+    
+    # Process the section and get the cards, oversized sections in chunks
+    used_models = set()
+    flash_cards = await process_chunked_section_async(section, app_settings, index, team, used_models)
+    if not flash_cards:
+        logging.error(f"Failed to process section {index}, skipping")
+        run_metrics.increment("sections_failed")
+        return SectionResult(section, note_date, index, source_path, status=FAILED, error="No flashcards were generated")
+    
+    return SectionResult(section, note_date, index, source_path, flash_cards, used_models)
+
+
+def write_section_result(result: SectionResult, app_settings: AppSettings, cards_template: str, note_template: str):
+    """
+    Save the output files of a section and record the result in the manifest.
+    
+    Args:
+        result: The result of the section.
+        app_settings: The application settings.
+        cards_template: The cards template.
+        note_template: The note template.
+    """
+    note_date_without_day_of_week = result.note_date.strftime("%Y-%m-%d")
+    note_date_str = result.note_date.strftime("%Y-%m-%d-%A")
+    manifest = get_manifest(app_settings.processing.manifest_path)
+    
+    if not result.flash_cards:
+        if manifest is not None:
+            manifest.record_failed(result.source_path, note_date_without_day_of_week, result.section, result.error, result.status)
+        return
+    
+    if result.status == UNCHANGED:
+        return
+    
+    with span("save_output_files", "io", date=note_date_without_day_of_week):
+        cards_file_path, note_file_path = save_output_files(
+            result.flash_cards,
+            note_date_without_day_of_week,
+            note_date_str,
+            result.section.split("\n"),
+            app_settings.file_paths.result_cards_folder_path,
+            app_settings.file_paths.result_notes_folder_path,
+            cards_template,
+            note_template
+        )
+    
+    if manifest is not None:
+        with span("record_manifest", "io", date=note_date_without_day_of_week):
+            manifest.record_generated(
+                result.source_path,
+                note_date_without_day_of_week,
+                cards_file_path,
+                note_file_path,
+                result.flash_cards,
+                result.section,
+                ", ".join(sorted(result.used_models))
+            )
+    run_metrics.increment("sections_processed")
+
+
+async def process_dated_section_async(
+    section: str,
+    note_date: datetime,
+    index: int,
+    app_settings: AppSettings,
+    cards_template: str,
+    note_template: str,
+    team: Optional[AgentTeam] = None,
+    source_path: Optional[str] = None
+) -> Optional[List[CardRecord]]:
+    """
+    Process the text of a section, save its output files and record them in the manifest.
+    
+    Args:
+        section: The section text, starting with its header line.
+        note_date: The date of the section.
+        index: The index of the section in the run.
+        app_settings: The application settings.
+        cards_template: The cards template.
+        note_template: The note template.
+        team: Pre-built agents to reuse, new agents are created when omitted.
+        source_path: The notes file of the section, FilePaths.SourceNotePath when omitted.
+        
+    Returns:
+        The flashcards, or None if the section was skipped or failed.
+    """
+    result = await generate_section_async(section, note_date, index, app_settings, team, source_path)
+    if result is None:
+        return None
+    
+    write_section_result(result, app_settings, cards_template, note_template)
+    return result.flash_cards
+
+
+async def process_entries_async(
+    note_index: NoteIndex,
+    entries: list,
+    app_settings: AppSettings,
+    cards_template: str,
+    note_template: str
+) -> None:
+    """
+    Process the selected sections in a bounded pipeline.
+    
+    A reader reads the sections one at a time into a bounded queue,
+    Processing.MaxConcurrency workers generate their cards and a writer saves the
+    outputs in section order. At most PIPELINE_WINDOW_PER_WORKER sections per
+    worker are between the reader and the writer, so the reader waits while the
+    writer is behind, and a section's text and cards are released as soon as its
+    files are written. Memory doesn't grow with the number of days in the file.
+    
+    Args:
+        note_index: The index of the notes file.
+        entries: The selected index entries.
+        app_settings: The application settings.
+        cards_template: The cards template.
+        note_template: The note template.
+    """
+    workers = max(app_settings.processing.max_concurrency, 1)
+    window = asyncio.Semaphore(workers * PIPELINE_WINDOW_PER_WORKER)
+    sections: asyncio.Queue = asyncio.Queue(maxsize=workers)
+    results: asyncio.Queue = asyncio.Queue()
+    
+    async def read():
+        for index, entry in enumerate(entries):
+            await window.acquire()
+            with span("read_section", "io", header=entry.header):
+                section = note_index.read_section(entry)
+            await sections.put((index, entry.date, section))
+        for _ in range(workers):
+            await sections.put(None)
+    
+    async def generate():
+        while True:
+            item = await sections.get()
+            if item is None:
+                return
+            index, note_date, section = item
+            item = None
+            try:
+                result = await generate_section_async(section, note_date, index, app_settings)
+            except Exception:
+                logging.exception(f"Failed to process section {index}")
+                run_metrics.increment("sections_failed")
+                result = None
+            await results.put((index, result))
+    
+    async def write():
+        # Results that finished ahead of an earlier section wait here, the window bounds them
+        finished: Dict[int, Optional[SectionResult]] = {}
+        next_index = 0
+        while next_index < len(entries):
+            index, result = await results.get()
+            finished[index] = result
+            while next_index in finished:
+                result = finished.pop(next_index)
+                if result is not None:
+                    # Manifest writes wait on SQLite locks shared with other workers
+                    await loop.run_in_executor(None, write_section_result, result, app_settings, cards_template, note_template)
+                result = None
+                next_index += 1
+                window.release()
+    
+    await asyncio.gather(read(), write(), *(generate() for _ in range(workers)))
+
+
+async def watch_async(app_settings: AppSettings, cards_template: str, note_template: str, poll_interval: float):
+    """
+    Process days that are added to or edited in the source file until interrupted.
+    
+    The agents are created once and reused for every change. Sections that fail
+    are retried on the next change of the file.
+    
+    Args:
+        app_settings: The application settings.
+        cards_template: The cards template.
+        note_template: The note template.
+        poll_interval: Seconds between checks when inotify is not available.
+    """
+    file_path = app_settings.file_paths.source_note_path
+    team = None if app_settings.processing.dry_run else create_agent_team(app_settings)
+    semaphore = asyncio.Semaphore(1)
+    loop = asyncio.get_running_loop()
+    
+    known = fingerprint_sections(NoteIndex.build(file_path))
+    watcher = NotesWatcher(file_path, poll_interval)
+    logging.info(f"Watching {len(known)} known section(s) for changes")
+    
+    try:
+        while True:
+            if not await loop.run_in_executor(None, watcher.wait_for_change):
+                break
+            
+            try:
+                note_index = NoteIndex.build(file_path)
+                current = fingerprint_sections(note_index)
+            except FileNotFoundError:
+                logging.warning(f"Source file {file_path} is missing, waiting for it to reappear")
+                continue
+            
+            changed = find_changed_sections(note_index, known, current)
+            logging.info(f"Detected {len(changed)} new or edited section(s)")
+            for index, entry in enumerate(changed):
+                flash_cards = await process_entry_async(
+                    note_index, entry, index, app_settings, cards_template, note_template, semaphore, team
+                )
+                if flash_cards or app_settings.processing.dry_run:
+                    known[entry.header] = current[entry.header]
+    finally:
+        # Stop the waiting executor thread, so the default executor can shut down
+        watcher.stop()
+        await loop.run_in_executor(None, watcher.close)
+
+
+def load_templates(app_settings: AppSettings) -> Tuple[str, str]:
+    """
+    Load the card and note templates from the file system.
+    
+    Args:
+        app_settings: The application settings.
+        
+    Returns:
+        The cards template and the note template.
+    """
+    card_template_path = os.path.join(os.getcwd(), app_settings.file_paths.card_template_path)
+    note_template_path = os.path.join(os.getcwd(), app_settings.file_paths.note_template_path)
+    
+    logging.info(f"Card template path: {card_template_path}")
+    logging.info(f"Note template path: {note_template_path}")
+    
+    with open(card_template_path, 'r') as f:
+        cards_template = f.read()
+    
+    with open(note_template_path, 'r') as f:
+        note_template = f.read()
+    
+    return cards_template, note_template
+
+
+def process_notes_file(app_settings: AppSettings, args, cards_template: str, note_template: str) -> None:
+    """
+    Process the selected sections of FilePaths.SourceNotePath.
+    
+    Args:
+        app_settings: The application settings.
+        args: The parsed command line arguments.
+        cards_template: The cards template.
+        note_template: The note template.
+    """
+    file_path = app_settings.file_paths.source_note_path
+    
+    logging.info(f"Source note path: {file_path}")
+    logging.info(f"Result cards folder path: {app_settings.file_paths.result_cards_folder_path}")
+    logging.info(f"Result notes folder path: {app_settings.file_paths.result_notes_folder_path}")
+    
+    # Index the dated sections of the source file by their headers
+    note_index = NoteIndex.build(file_path)
+    entries = note_index.select(since=args.since, until=args.until, date=args.date, last=args.last)
+    logging.info(f"Selected {len(entries)} of {len(note_index.entries)} dated section(s)")
+    
+    # In test mode, limit the number of sections to process
+    processing = app_settings.processing
+    if processing.test_mode:
+        logging.info(f"Running in TEST MODE - processing only {processing.max_sections_in_test_mode} section(s)")
+        entries = entries[:processing.max_sections_in_test_mode]
+    
+    run_metrics.increment("sections_selected", len(entries))
+    started = time.perf_counter()
+    asyncio.run(process_entries_async(note_index, entries, app_settings, cards_template, note_template))
+    run_metrics.observe("notes_file", time.perf_counter() - started)
+
+
+# The share of questions the compressed prompts may change before a day is reported as not equivalent
+MIN_EQUIVALENT_FRONT_OVERLAP = 0.8
+
+
+def compression_variant(app_settings: AppSettings, compressed: bool) -> AppSettings:
+    """
+    Get a copy of the settings with or without prompt compression.
+    
+    The compressed variant uses the configured instruction version, compact-v1 when that is the full one.
+    """
+    settings = copy.copy(app_settings)
+    settings.processing = copy.copy(app_settings.processing)
+    if compressed:
+        settings.processing.compress_notes = True
+        if settings.processing.instruction_version == FULL_INSTRUCTIONS:
+            settings.processing.instruction_version = COMPACT_V1_INSTRUCTIONS
+    else:
+        settings.processing.compress_notes = False
+        settings.processing.instruction_version = FULL_INSTRUCTIONS
+    return settings
+
+
+def instruction_tokens(instruction_version: str) -> Dict[str, int]:
+    """
+    Estimate the tokens of the agents' instructions of a version.
+    """
+    from agents.english_teacher_agent import EnglishTeacherAgent
+    from agents.flashcard_reviewer_agent import FlashcardReviewerAgent
+    from agents.flashcard_extractor_agent import FlashCardExtractorAgent
+    
+    return {
+        agent_class.__name__: estimate_tokens(agent_class(instruction_version=instruction_version).instruction)
+        for agent_class in (EnglishTeacherAgent, FlashcardReviewerAgent, FlashCardExtractorAgent)
+    }
+
+
+async def evaluate_compression_async(note_index: NoteIndex, entries: list, app_settings: AppSettings) -> Dict[str, Any]:
+    """
+    Compare the prompts and cards of days with and without prompt compression.
+    
+    Every day is compressed offline to report its tokens and the words the compression
+    dropped. Unless in dry-run mode, the day is then processed by agents with the full
+    instructions and notes and by agents with the compressed ones, and their cards are
+    compared. Nothing is written.
+    
+    Args:
+        note_index: The index of the notes file.
+        entries: The selected index entries.
+        app_settings: The application settings.
+        
+    Returns:
+        The JSON serializable report.
+    """
+    baseline_settings = compression_variant(app_settings, False)
+    compressed_settings = compression_variant(app_settings, True)
+    dry_run = app_settings.processing.dry_run
+    baseline_team = compressed_team = None
+    if not dry_run:
+        baseline_team = create_agent_team(baseline_settings)
+        compressed_team = create_agent_team(compressed_settings)
+    
+    days = []
+    for index, entry in enumerate(entries):
+        section = note_index.read_section(entry)
+        compressed = compress_section(section)
+        day = {
+            "date": entry.date.strftime("%Y-%m-%d"),
+            "tokens": estimate_tokens(section),
+            "compressed_tokens": estimate_tokens(compressed),
+            "dropped_words": dropped_words(section, compressed)
+        }
+        if not dry_run:
+            baseline_cards = await process_chunked_section_async(section, baseline_settings, index, baseline_team) or []
+            cards = await process_chunked_section_async(section, compressed_settings, index, compressed_team) or []
+            front_overlap = card_overlap(baseline_cards, cards, fronts_only=True)
+            day.update({
+                "cards": len(baseline_cards),
+                "compressed_cards": len(cards),
+                "card_overlap": round(card_overlap(baseline_cards, cards), 3),
+                "front_overlap": round(front_overlap, 3),
+                "equivalent": bool(baseline_cards) and bool(cards) and front_overlap >= MIN_EQUIVALENT_FRONT_OVERLAP
+            })
+        days.append(day)
+    
+    report = {
+        "instruction_version": compressed_settings.processing.instruction_version,
+        "instruction_tokens": {
+            "full": instruction_tokens(FULL_INSTRUCTIONS),
+            "compressed": instruction_tokens(compressed_settings.processing.instruction_version)
+        },
+        "notes_tokens": sum(day["tokens"] for day in days),
+        "compressed_notes_tokens": sum(day["compressed_tokens"] for day in days),
+        "days": days
+    }
+    if not dry_run:
+        report["equivalent_days"] = sum(1 for day in days if day["equivalent"])
+        report["prompt_tokens"] = {
+            name: run_metrics.counters.get(name, 0)
+            for name in ("prompt_tokens_uncompressed", "prompt_tokens_compressed", "prompt_tokens", "completion_tokens")
+        }
+    return report
+
+
+def evaluate_compression(app_settings: AppSettings, args):
+    """
+    Print the prompt compression report of the selected days of FilePaths.SourceNotePath.
+    
+    Args:
+        app_settings: The application settings.
+        args: The parsed command line arguments.
+    """
+    note_index = NoteIndex.build(app_settings.file_paths.source_note_path)
+    entries = note_index.select(since=args.since, until=args.until, date=args.date, last=args.last)
+    if app_settings.processing.test_mode:
+        entries = entries[:app_settings.processing.max_sections_in_test_mode]
+    
+    report = asyncio.run(evaluate_compression_async(note_index, entries, app_settings))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if "equivalent_days" in report and report["equivalent_days"] < len(entries):
+        logging.warning(f"The cards of {len(entries) - report['equivalent_days']} of {len(entries)} day(s) changed with compression")
+
+
+def install_request_limits(app_settings: AppSettings):
+    """
+    Limit the agent requests of this process to Processing.RequestsPerMinute.
+    
+    Args:
+        app_settings: The application settings.
+    """
+    requests_per_minute = app_settings.processing.requests_per_minute
+    if requests_per_minute and rate_limiter.request_limiter is None:
+        rate_limiter.install_request_limiter(SharedRateLimiter.local(requests_per_minute))
+
+
+def write_metrics_report(report: Dict[str, Any], path: str):
+    """
+    Write a metrics report as JSON.
+    
+    Args:
+        report: The report.
+        path: The output file path.
+    """
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Saved metrics report to {path}")
+
+
+def enqueue_sections(app_settings: AppSettings, args, queue: SectionJobQueue) -> int:
+    """
+    Add the selected sections of FilePaths.SourceNotePath to the job queue.
+    
+    Args:
+        app_settings: The application settings.
+        args: The parsed command line arguments.
+        queue: The job queue.
+        
+    Returns:
+        The number of new jobs.
+    """
+    file_path = app_settings.file_paths.source_note_path
+    note_index = NoteIndex.build(file_path)
+    entries = note_index.select(since=args.since, until=args.until, date=args.date, last=args.last)
+    
+    added = queue.enqueue(
+        os.path.abspath(file_path),
+        ((entry.header, entry.date.strftime("%Y-%m-%d"), note_index.read_section(entry)) for entry in entries)
     )
+    logging.info(f"Queued {added} new job(s) of {len(entries)} selected section(s)")
+    return added
+
+
+async def queue_worker_async(queue: SectionJobQueue, app_settings: AppSettings, cards_template: str, note_template: str):
+    """
+    Claim and process queued section jobs until none is left to claim.
+    
+    Processing.MaxConcurrency jobs are processed at the same time. Leases are
+    renewed while a job is in progress so other workers don't take it over.
     
+    Args:
+        queue: The job queue.
+        app_settings: The application settings.
+        cards_template: The cards template.
+        note_template: The note template.
+    """
+    worker_id = default_worker_id()
+    renew_interval = max(queue.lease_seconds / 3, 1)
+    loop = asyncio.get_running_loop()
+    
+    async def renew_lease(job, slot_worker_id: str):
+        while True:
+            await asyncio.sleep(renew_interval)
+            if not await loop.run_in_executor(None, queue.renew, job, slot_worker_id):
+                logging.warning(f"Lost the lease of job {job.id} ({job.note_date})")
+                return
+    
+    async def work(slot: int):
+        slot_worker_id = f"{worker_id}:{slot}"
+        while True:
+            # The queue calls wait on SQLite locks, they run off the event loop
+            job = await loop.run_in_executor(None, queue.claim, slot_worker_id)
+            if job is None:
+                return
+            
+            logging.info(f"Worker {slot_worker_id} claimed job {job.id} ({job.note_date}, attempt {job.attempts})")
+            renewal = asyncio.ensure_future(renew_lease(job, slot_worker_id))
+            try:
+                note_date = datetime.strptime(job.note_date, "%Y-%m-%d")
+                result = await generate_section_async(
+                    job.section_text, note_date, job.id, app_settings, source_path=job.source_path
+                )
+                if result is not None:
+                    # Manifest writes wait on SQLite locks shared with other workers
+                    await loop.run_in_executor(None, write_section_result, result, app_settings, cards_template, note_template)
+                if result is not None and result.status == SKIPPED:
+                    await loop.run_in_executor(None, queue.skip, job, slot_worker_id, result.error)
+                elif result is not None and result.flash_cards:
+                    await loop.run_in_executor(None, queue.complete, job, slot_worker_id)
+                else:
+                    await loop.run_in_executor(None, queue.fail, job, slot_worker_id, "No flashcards were generated")
+            except Exception as ex:
+                logging.exception(f"Job {job.id} failed")
+                await loop.run_in_executor(None, queue.fail, job, slot_worker_id, str(ex))
+            finally:
+                renewal.cancel()
+    
+    await asyncio.gather(*(work(slot) for slot in range(max(app_settings.processing.max_concurrency, 1))))
+    logging.info(f"Queue {queue.path}: {queue.counts()}")
+
+
+def run_queue(app_settings: AppSettings, args):
+    """
+    Enqueue the selected sections and/or work the job queue.
+    
+    Without --enqueue or --worker both are done.
+    
+    Args:
+        app_settings: The application settings.
+        args: The parsed command line arguments.
+    """
+    processing = app_settings.processing
+    queue = SectionJobQueue(
+        args.queue, processing.queue_lease_seconds, processing.queue_max_attempts, processing.queue_journal_mode
+    )
     try:
+        if args.queue_status:
+            print(json.dumps(queue.counts()))
+            return
+        
+        if processing.dry_run:
+            logging.info(f"[DRY RUN] Queue {queue.path}: {queue.counts()}, nothing is queued or claimed")
+            return
+        
+        enqueue = args.enqueue or not args.worker
+        work = args.worker or not args.enqueue
+        if enqueue:
+            enqueue_sections(app_settings, args, queue)
+        if work:
+            cards_template, note_template = load_templates(app_settings)
+            asyncio.run(queue_worker_async(queue, app_settings, cards_template, note_template))
+    finally:
+        queue.close()
+
+
+def print_manifest_report(app_settings: AppSettings, name: str):
+    """
+    Print a report of the manifest as JSON.
+    
+    Args:
+        app_settings: The application settings.
+        name: The report name.
+    """
+    manifest_path = app_settings.processing.manifest_path
+    if not manifest_path or not os.path.exists(manifest_path):
+        logging.error(f"No manifest found at {manifest_path}")
+        return
+    
+    manifest = get_manifest(manifest_path)
+    print(json.dumps(manifest.report(name), indent=2, ensure_ascii=False))
+
+
+def run(app_settings: AppSettings, args) -> None:
+    """
+    Run the generator with the loaded settings.
+    
+    Args:
+        app_settings: The application settings with command line overrides applied.
+        args: The parsed command line arguments.
+    """
+    try:
+        if args.manifest_report:
+            print_manifest_report(app_settings, args.manifest_report)
+            return
+        
         logging.info("Starting English Flashcard Generator")
         
         # Validate that we have at least one provider configured
         if len(app_settings.providers) == 0:
-            logging.fatal("No providers configured in appsettings.json")
+            logging.fatal(f"No providers configured in {args.config}")
             return
         
-        # Get file paths from configuration
-        file_path = app_settings.file_paths.source_note_path
-        result_cards_folder_path = app_settings.file_paths.result_cards_folder_path
-        result_notes_folder_path = app_settings.file_paths.result_notes_folder_path
+        if app_settings.processing.diff_regeneration and not app_settings.processing.manifest_path:
+            logging.warning("Diff regeneration needs Processing.ManifestPath, every day is generated in full")
         
-        logging.info(f"Source note path: {file_path}")
-        logging.info(f"Result cards folder path: {result_cards_folder_path}")
-        logging.info(f"Result notes folder path: {result_notes_folder_path}")
+        if app_settings.processing.instruction_version not in INSTRUCTION_VERSIONS:
+            logging.fatal(f"Unknown instruction version: {app_settings.processing.instruction_version}, expected one of {', '.join(INSTRUCTION_VERSIONS)}")
+            return
         
-        # Load templates from file system
-        card_template_path = os.path.join(os.getcwd(), app_settings.file_paths.card_template_path)
-        note_template_path = os.path.join(os.getcwd(), app_settings.file_paths.note_template_path)
+        unknown_providers = unknown_route_providers(app_settings)
+        if unknown_providers:
+            logging.fatal(f"Routing rules use providers that are not configured: {', '.join(unknown_providers)}")
+            return
         
-        logging.info(f"Card template path: {card_template_path}")
-        logging.info(f"Note template path: {note_template_path}")
+        processing = app_settings.processing
+        start_metrics_export(processing.metrics_file_path, processing.metrics_port, processing.metrics_interval_seconds)
         
-        with open(card_template_path, 'r') as f:
-            cards_template = f.read()
+        if args.batch:
+            from batch import run_batch
+            
+            report = run_batch(app_settings, args)
+            if args.metrics_out:
+                write_metrics_report(report, args.metrics_out)
+            return
         
-        with open(note_template_path, 'r') as f:
-            note_template = f.read()
+        if args.backfill:
+            from batch_api import run_backfill
+            
+            run_backfill(app_settings, args)
+            if args.metrics_out:
+                write_metrics_report(run_metrics.to_dict(), args.metrics_out)
+            return
         
-        # Read the source file
-        with open(file_path, 'r') as f:
-            file_content = f.read()
+        if args.queue:
+            install_request_limits(app_settings)
+            run_queue(app_settings, args)
+            return
         
-        # Split markdown document into sections by second level headers
-        sections = file_content.split("\n## ")[2:]
-        sections.reverse()
+        if args.compression_eval:
+            install_request_limits(app_settings)
+            evaluate_compression(app_settings, args)
+            return
         
-        # In test mode, limit the number of sections to process
-        if TEST_MODE:
-            logging.info(f"Running in TEST MODE - processing only {MAX_SECTIONS_IN_TEST_MODE} section(s)")
-            sections = sections[:MAX_SECTIONS_IN_TEST_MODE]
+        cards_template, note_template = load_templates(app_settings)
+        install_request_limits(app_settings)
         
-        cards = []
-        for index, section in enumerate(sections):
-            section_lines = section.split("\n")
-            if len(section_lines) < 2:
-                logging.error(f"Section {index} has less than 2 lines, skipping")
-                continue
-            
-            first_line = section_lines[0]
-            note_date = parse_date(first_line)
-            note_date_without_day_of_week = note_date.strftime("%Y-%m-%d")
-            note_date_str = note_date.strftime("%Y-%m-%d-%A")
-            
-            # Process the section and get formatted cards
-            formatted_cards = asyncio.run(process_section_async(section, app_settings, index))
-            if not formatted_cards:
-                logging.error(f"Failed to process section {index}, skipping")
-                continue
-            
-            # Add to list and save into files
-            cards.append(formatted_cards)
-            save_output_files(
-                formatted_cards,
-                note_date_without_day_of_week,
-                note_date_str,
-                section_lines,
-                result_cards_folder_path,
-                result_notes_folder_path,
-                cards_template,
-                note_template
-            )
+        if args.watch:
+            asyncio.run(watch_async(app_settings, cards_template, note_template, args.poll_interval))
+            return
+        
+        process_notes_file(app_settings, args, cards_template, note_template)
+        
+        logging.info(f"HTTP pools: {http_pool_statistics()}")
+        if args.metrics_out:
+            report = run_metrics.to_dict()
+            report["http_pools"] = http_pool_statistics()
+            write_metrics_report(report, args.metrics_out)
         
         logging.info("English Flashcard Generator completed successfully")
     
+    except KeyboardInterrupt:
+        logging.info("English Flashcard Generator stopped")
+    
     except Exception as ex:
         logging.exception("An unhandled exception occurred")
+    
+    finally:
+        stop_metrics_export()
+        close_response_caches()
+        close_http_clients()
+        close_manifests()
+        if tracer.enabled:
+            tracer.export(args.trace)
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Main function.
+    """
+    args = parse_arguments(argv)
+    
+    # Initialize configuration
+    app_settings = apply_overrides(AppSettings.load_from_configuration(args.config), args)
+    
+    # Initialize logging
+    logging.basicConfig(
+        level=getattr(logging, args.log_level),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    if args.trace:
+        tracer.enable()
+    
+    if args.record:
+        install_cassette("record", args.record)
+    elif args.replay:
+        install_cassette("replay", args.replay, args.replay_speed)
+    elif args.mock:
+        install_cassette("mock", "", args.replay_speed)
+    
+    if args.profile:
+        import cProfile
+        import pstats
+        
+        profiler = cProfile.Profile()
+        profiler.runcall(run, app_settings, args)
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+        logging.info(f"Saved profile to {args.profile}")
+    else:
+        run(app_settings, args)
 
 
 if __name__ == "__main__":
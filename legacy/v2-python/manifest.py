@@ -0,0 +1,266 @@
+"""
+SQLite manifest of the generated cards and notes.
+
+The output step records every finished section: its date, output files, card
+count, content hashes, generation time, models and status, and the section text
+and cards for diff-based regeneration. Each section is written in its own
+transaction, so the manifest always matches the files on disk
+and "which days have cards" or "how many cards this month" is a single query
+instead of a scan of the vault.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from card_codec import CardRecord, decode_flash_cards, encode_flash_cards
+
+
+GENERATED = "generated"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    source_path TEXT NOT NULL,
+    note_date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    cards_path TEXT,
+    note_path TEXT,
+    card_count INTEGER NOT NULL DEFAULT 0,
+    section_hash TEXT,
+    cards_hash TEXT,
+    models TEXT,
+    error TEXT,
+    generated_at TEXT,
+    updated_at TEXT NOT NULL,
+    section_text TEXT,
+    cards_json TEXT,
+    PRIMARY KEY (source_path, note_date)
+);
+CREATE INDEX IF NOT EXISTS outputs_status ON outputs (status, note_date);
+CREATE INDEX IF NOT EXISTS outputs_date ON outputs (note_date);
+"""
+
+# Columns added after the first version of the table, created on manifests that lack them
+_ADDED_COLUMNS = (("section_text", "TEXT"), ("cards_json", "TEXT"))
+
+REPORTS = ("summary", "days", "failed", "months")
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def hash_cards(cards: Iterable[CardRecord]) -> str:
+    """
+    Hash the content of the cards, independent of the templates.
+    """
+    digest = hashlib.sha1()
+    for card in cards:
+        digest.update(f"{card.front}\0{card.back}\0{int(card.is_reversed)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class GeneratedSection(NamedTuple):
+    """
+    The text and cards of the last successful generation of a day, with the current status and files of the day.
+    """
+    section_text: str
+    cards: List[CardRecord]
+    models: str
+    status: str = GENERATED
+    cards_path: Optional[str] = None
+    note_path: Optional[str] = None
+
+
+class OutputManifest:
+    """
+    The generated outputs per notes file and day.
+    """
+    def __init__(self, path: str, journal_mode: str = "WAL"):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        self._connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._connection.execute(f"PRAGMA journal_mode={journal_mode}")
+        self._connection.execute("PRAGMA busy_timeout=60000")
+        self._connection.executescript(_SCHEMA)
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(outputs)")}
+        for name, column_type in _ADDED_COLUMNS:
+            if name not in columns:
+                self._connection.execute(f"ALTER TABLE outputs ADD COLUMN {name} {column_type}")
+
+    def close(self):
+        self._connection.close()
+
+    def _write(self, sql: str, parameters: tuple):
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(sql, parameters)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def record_generated(
+        self,
+        source_path: str,
+        note_date: str,
+        cards_path: str,
+        note_path: str,
+        cards: List[CardRecord],
+        section_text: str,
+        models: str
+    ):
+        """
+        Record the output files of a day after they are written.
+
+        The section text and the cards are kept for diff-based regeneration.
+        """
+        now = _now()
+        self._write(
+            "INSERT INTO outputs "
+            "(source_path, note_date, status, cards_path, note_path, card_count, section_hash, cards_hash, models, error, "
+            "generated_at, updated_at, section_text, cards_json) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?, ?, ?) "
+            "ON CONFLICT (source_path, note_date) DO UPDATE SET "
+            "status = excluded.status, cards_path = excluded.cards_path, note_path = excluded.note_path, "
+            "card_count = excluded.card_count, section_hash = excluded.section_hash, cards_hash = excluded.cards_hash, "
+            "models = excluded.models, error = NULL, generated_at = excluded.generated_at, updated_at = excluded.updated_at, "
+            "section_text = excluded.section_text, cards_json = excluded.cards_json",
+            (
+                os.path.abspath(source_path), note_date, GENERATED, cards_path, note_path, len(cards),
+                hash_text(section_text), hash_cards(cards), models, now, now, section_text, encode_flash_cards(cards)
+            )
+        )
+
+    def record_failed(self, source_path: str, note_date: str, section_text: str, error: str, status: str = FAILED):
+        """
+        Record a day that produced no output.
+
+        The files and counts of an earlier successful generation are kept.
+        """
+        self._write(
+            "INSERT INTO outputs (source_path, note_date, status, section_hash, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (source_path, note_date) DO UPDATE SET "
+            "status = excluded.status, section_hash = excluded.section_hash, error = excluded.error, updated_at = excluded.updated_at",
+            (os.path.abspath(source_path), note_date, status, hash_text(section_text), error, _now())
+        )
+
+    def last_generated(self, source_path: str, note_date: str) -> Optional[GeneratedSection]:
+        """
+        Get the section text and cards of the last successful generation of a day.
+
+        Returns:
+            The generated section, None when the day has none or was recorded before the text was kept.
+        """
+        rows = self._query(
+            "SELECT section_text, cards_json, models, status, cards_path, note_path FROM outputs "
+            "WHERE source_path = ? AND note_date = ? AND section_text IS NOT NULL AND cards_json IS NOT NULL",
+            (os.path.abspath(source_path), note_date)
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        return GeneratedSection(
+            row["section_text"], decode_flash_cards(row["cards_json"]), row["models"] or "",
+            row["status"], row["cards_path"], row["note_path"]
+        )
+
+    def _query(self, sql: str, parameters: tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._connection.execute(sql, parameters)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def report(self, name: str, source_path: Optional[str] = None) -> Any:
+        """
+        Run a status or reporting query.
+
+        Args:
+            name: summary (days and cards per status), days (the generated days),
+                failed (the failed days with their errors) or months (generated days and cards per month).
+            source_path: Limit the report to one notes file.
+
+        Returns:
+            The JSON serializable report.
+        """
+        where, parameters = "", ()
+        if source_path:
+            where, parameters = "WHERE source_path = ?", (os.path.abspath(source_path),)
+
+        if name == "summary":
+            rows = self._query(
+                f"SELECT status, COUNT(*) AS days, SUM(card_count) AS cards FROM outputs {where} GROUP BY status",
+                parameters
+            )
+            return {row["status"]: {"days": row["days"], "cards": row["cards"] or 0} for row in rows}
+        if name == "days":
+            condition = f"{where} AND" if where else "WHERE"
+            return self._query(
+                f"SELECT note_date, card_count, cards_path, generated_at, models FROM outputs "
+                f"{condition} status = ? ORDER BY note_date",
+                parameters + (GENERATED,)
+            )
+        if name == "failed":
+            condition = f"{where} AND" if where else "WHERE"
+            return self._query(
+                f"SELECT note_date, status, error, updated_at FROM outputs {condition} status != ? ORDER BY note_date",
+                parameters + (GENERATED,)
+            )
+        if name == "months":
+            condition = f"{where} AND" if where else "WHERE"
+            return self._query(
+                f"SELECT substr(note_date, 1, 7) AS month, COUNT(*) AS days, SUM(card_count) AS cards "
+                f"FROM outputs {condition} status = ? GROUP BY month ORDER BY month",
+                parameters + (GENERATED,)
+            )
+        raise ValueError(f"Unknown report: {name}, expected one of {', '.join(REPORTS)}")
+
+
+_manifests: Dict[str, OutputManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(path: Optional[str], journal_mode: str = "WAL") -> Optional[OutputManifest]:
+    """
+    Get the manifest of this process, opening it on first use.
+
+    Args:
+        path: The manifest path, None when no manifest is kept.
+        journal_mode: The SQLite journal mode.
+
+    Returns:
+        The manifest, or None.
+    """
+    if not path:
+        return None
+    with _manifests_lock:
+        manifest = _manifests.get(path)
+        if manifest is None:
+            manifest = OutputManifest(path, journal_mode)
+            _manifests[path] = manifest
+        return manifest
+
+
+def close_manifests():
+    """
+    Close every manifest of this process.
+    """
+    with _manifests_lock:
+        for manifest in _manifests.values():
+            manifest.close()
+        _manifests.clear()
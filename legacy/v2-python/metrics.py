@@ -0,0 +1,191 @@
+"""
+Run metrics: counters, gauges and timings collected while sections are processed.
+
+A metric can carry labels, e.g. the agent of a model call; it is kept under a
+Prometheus-style key such as agent_call{agent="EnglishTeacherAgent"}. Timings are
+histograms over HISTOGRAM_BUCKETS, so they can be exported while the run is going
+on (see metrics_export.py).
+"""
+
+import threading
+import time
+from typing import Any, Dict, Iterable
+
+
+# Upper bounds of the timing histogram buckets in seconds, longer durations only count in +Inf
+HISTOGRAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def metric_key(name: str, labels: Dict[str, Any]) -> str:
+    """
+    Get the key of a metric with labels, the name alone without them.
+    """
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{_escape_label(value)}"' for label, value in sorted(labels.items())) + "}"
+
+
+def _new_timing() -> Dict[str, Any]:
+    return {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "buckets": [0] * len(HISTOGRAM_BUCKETS)}
+
+
+def _bucket_index(seconds: float) -> int:
+    """
+    Get the index of the bucket of a duration, len(HISTOGRAM_BUCKETS) when it is over the last bound.
+    """
+    for index, bound in enumerate(HISTOGRAM_BUCKETS):
+        if seconds <= bound:
+            return index
+    return len(HISTOGRAM_BUCKETS)
+
+
+class RunMetrics:
+    """
+    Thread-safe counters, gauges and timing summaries of a run.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.timings: Dict[str, Dict[str, Any]] = {}
+
+    def increment(self, name: str, value: int = 1, **labels):
+        """
+        Increase a counter.
+        """
+        key = metric_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """
+        Set a gauge to its current value.
+        """
+        with self._lock:
+            self.gauges[metric_key(name, labels)] = value
+
+    def add_gauge(self, name: str, value: float, **labels):
+        """
+        Move a gauge up or down, e.g. the calls in flight.
+        """
+        key = metric_key(name, labels)
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        Record a duration.
+        """
+        key = metric_key(name, labels)
+        with self._lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                timing = _new_timing()
+                self.timings[key] = timing
+            timing["count"] += 1
+            timing["total_seconds"] += seconds
+            timing["max_seconds"] = max(timing["max_seconds"], seconds)
+            index = _bucket_index(seconds)
+            if index < len(HISTOGRAM_BUCKETS):
+                timing["buckets"][index] += 1
+
+    def reset(self):
+        """
+        Drop everything recorded so far.
+        """
+        with self._lock:
+            self.counters = {}
+            self.gauges = {}
+            self.timings = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Snapshot the metrics as a JSON serializable dictionary.
+        """
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "timings": {name: dict(timing, buckets=list(timing["buckets"])) for name, timing in self.timings.items()}
+            }
+
+    def add_snapshot(self, snapshot: Dict[str, Any], gauges: bool = True):
+        """
+        Add the counters, timings and optionally the gauges of a snapshot taken with to_dict.
+
+        Args:
+            snapshot: The snapshot, e.g. of a finished worker process.
+            gauges: Whether to add the gauges, they may not describe the current state.
+        """
+        with self._lock:
+            for name, value in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            if gauges:
+                for name, value in snapshot.get("gauges", {}).items():
+                    self.gauges[name] = self.gauges.get(name, 0) + value
+            for name, timing in snapshot.get("timings", {}).items():
+                target = self.timings.setdefault(name, _new_timing())
+                target["count"] += timing["count"]
+                target["total_seconds"] += timing["total_seconds"]
+                target["max_seconds"] = max(target["max_seconds"], timing["max_seconds"])
+                for index, count in enumerate(timing.get("buckets", [])[:len(HISTOGRAM_BUCKETS)]):
+                    target["buckets"][index] += count
+
+    @staticmethod
+    def merge(snapshots: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merge snapshots taken with to_dict, e.g. from several worker processes.
+
+        Counters, gauges and timings are added up.
+
+        Args:
+            snapshots: The snapshots to merge.
+
+        Returns:
+            The merged snapshot.
+        """
+        merged = RunMetrics()
+        for snapshot in snapshots:
+            merged.add_snapshot(snapshot)
+        return merged.to_dict()
+
+
+# The process-wide metrics of the current run
+run_metrics = RunMetrics()
+
+
+def measure_agent_calls(agent):
+    """
+    Record the model calls of an agent: the calls in flight, their durations, errors and tokens, labelled with the agent.
+
+    Calls answered from the response cache are included.
+
+    Args:
+        agent: The AG2 agent.
+    """
+    client = agent.client
+    create = client.create
+
+    def measured_create(**params):
+        run_metrics.add_gauge("agent_calls_in_flight", 1, agent=agent.name)
+        started = time.perf_counter()
+        try:
+            response = create(**params)
+        except BaseException:
+            run_metrics.increment("agent_call_errors", agent=agent.name)
+            raise
+        finally:
+            run_metrics.observe("agent_call", time.perf_counter() - started, agent=agent.name)
+            run_metrics.add_gauge("agent_calls_in_flight", -1, agent=agent.name)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            run_metrics.increment("agent_prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0, agent=agent.name)
+            run_metrics.increment("agent_completion_tokens", getattr(usage, "completion_tokens", 0) or 0, agent=agent.name)
+        return response
+
+    client.create = measured_create
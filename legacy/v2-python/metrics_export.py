@@ -0,0 +1,226 @@
+"""
+Live export of the run metrics in the Prometheus text format.
+
+Scheduled and long-running runs (watch mode, job queue workers, backfills) can be
+watched while they work: the run metrics are written to a file every few seconds,
+for node_exporter's textfile collector, and/or served on a local HTTP endpoint
+for Prometheus to scrape. Counters get a _total suffix, timings are histograms
+in seconds and every name has the flashcards_ prefix.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import HISTOGRAM_BUCKETS, RunMetrics, run_metrics
+
+
+NAMESPACE = "flashcards"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Counters exported from the start of a run, so alerts on them see a series before the first increment
+CORE_COUNTERS = ("sections_processed", "sections_failed", "retries", "prompt_tokens", "completion_tokens", "cache_hits", "cache_misses")
+
+_INVALID_NAME_CHARACTERS = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _split_key(key: str) -> Tuple[str, str]:
+    """
+    Split a metric key into its name and its labels without the braces.
+    """
+    name, brace, labels = key.partition("{")
+    return name, labels[:-1] if brace else ""
+
+
+def _metric_name(name: str, suffix: str = "") -> str:
+    name = _INVALID_NAME_CHARACTERS.sub("_", name)
+    if suffix and name.endswith(suffix):
+        suffix = ""
+    return f"{NAMESPACE}_{name}{suffix}"
+
+
+def _sample(name: str, labels: str, value: float) -> str:
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def render_prometheus(snapshot: Dict[str, Any], extra_gauges: Optional[Dict[str, float]] = None) -> str:
+    """
+    Render a metrics snapshot in the Prometheus text exposition format.
+
+    The CORE_COUNTERS are always included, the cache hit ratio is derived from
+    the cache_hits and cache_misses counters.
+
+    Args:
+        snapshot: A snapshot taken with RunMetrics.to_dict.
+        extra_gauges: More gauges of the exporter itself.
+
+    Returns:
+        The text of the metrics.
+    """
+    families: Dict[str, Tuple[str, List[str]]] = {}
+
+    def add(name: str, metric_type: str, lines: List[str]):
+        families.setdefault(name, (metric_type, []))[1].extend(lines)
+
+    counters = dict.fromkeys(CORE_COUNTERS, 0)
+    counters.update(snapshot.get("counters", {}))
+    for key, value in sorted(counters.items()):
+        name, labels = _split_key(key)
+        metric = _metric_name(name, "_total")
+        add(metric, "counter", [_sample(metric, labels, value)])
+
+    gauges = dict(snapshot.get("gauges", {}))
+    lookups = counters.get("cache_hits", 0) + counters.get("cache_misses", 0)
+    if lookups:
+        gauges["cache_hit_ratio"] = counters.get("cache_hits", 0) / lookups
+    gauges.update(extra_gauges or {})
+    for key, value in sorted(gauges.items()):
+        name, labels = _split_key(key)
+        metric = _metric_name(name)
+        add(metric, "gauge", [_sample(metric, labels, value)])
+
+    for key, timing in sorted(snapshot.get("timings", {}).items()):
+        name, labels = _split_key(key)
+        metric = _metric_name(name, "_seconds")
+        separator = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS, timing.get("buckets", [])):
+            cumulative += count
+            lines.append(_sample(f"{metric}_bucket", f'{labels}{separator}le="{_format_bound(bound)}"', cumulative))
+        lines.append(_sample(f"{metric}_bucket", f'{labels}{separator}le="+Inf"', timing["count"]))
+        lines.append(_sample(f"{metric}_sum", labels, timing["total_seconds"]))
+        lines.append(_sample(f"{metric}_count", labels, timing["count"]))
+        add(metric, "histogram", lines)
+
+    text = []
+    for name, (metric_type, lines) in families.items():
+        text.append(f"# TYPE {name} {metric_type}")
+        text.extend(lines)
+    return "\n".join(text) + "\n"
+
+
+def _create_server(exporter: 'MetricsExporter'):
+    """
+    Create the HTTP server of the /metrics endpoint, http.server is only imported when the endpoint is used.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = exporter.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(f"Metrics endpoint: {format % args}")
+
+    server = ThreadingHTTPServer((exporter.host, exporter.port), MetricsHandler)
+    server.daemon_threads = True
+    return server
+
+
+class MetricsExporter:
+    """
+    Writes the run metrics to a file every interval and/or serves them on /metrics.
+    """
+    def __init__(
+        self,
+        metrics: RunMetrics,
+        file_path: Optional[str] = None,
+        port: Optional[int] = None,
+        interval: float = 15.0,
+        host: str = "127.0.0.1"
+    ):
+        self.metrics = metrics
+        self.file_path = file_path
+        self.port = port
+        self.interval = interval
+        self.host = host
+        self.started = time.time()
+        self._stopped = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._server = None
+
+    def render(self) -> str:
+        return render_prometheus(self.metrics.to_dict(), {"run_start_timestamp_seconds": self.started})
+
+    def write_file(self):
+        """
+        Replace the metrics file atomically, so the collector never reads a partial file.
+        """
+        temporary_path = f"{self.file_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(temporary_path, self.file_path)
+
+    def _write_periodically(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.write_file()
+            except OSError as ex:
+                logging.warning(f"Could not write the metrics to {self.file_path}: {ex}")
+
+    def start(self):
+        if self.file_path:
+            directory = os.path.dirname(self.file_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.write_file()
+            self._writer = threading.Thread(target=self._write_periodically, name="metrics-file", daemon=True)
+            self._writer.start()
+            logging.info(f"Writing the metrics to {self.file_path} every {self.interval}s")
+        if self.port:
+            self._server = _create_server(self)
+            threading.Thread(target=self._server.serve_forever, name="metrics-endpoint", daemon=True).start()
+            logging.info(f"Serving the metrics on http://{self.host}:{self._server.server_port}/metrics")
+
+    def stop(self):
+        """
+        Write the final metrics and stop the endpoint.
+        """
+        self._stopped.set()
+        if self._writer is not None:
+            self._writer.join()
+            self.write_file()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+# The metrics exporter of this process, None when the metrics are not exported
+metrics_exporter: Optional[MetricsExporter] = None
+
+
+def start_metrics_export(file_path: Optional[str], port: Optional[int], interval: float):
+    """
+    Export the run metrics of this process while it runs, when a file or a port is given.
+    """
+    global metrics_exporter
+    if metrics_exporter is not None or not (file_path or port):
+        return
+    metrics_exporter = MetricsExporter(run_metrics, file_path, port, interval)
+    metrics_exporter.start()
+
+
+def stop_metrics_export():
+    """
+    Write the final metrics and stop exporting them.
+    """
+    global metrics_exporter
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+        metrics_exporter = None
@@ -0,0 +1,140 @@
+"""
+A local stand-in for the providers' chat completions API.
+
+The mock answers the agents deterministically from the conversation, without a
+model: the teacher turns the "**term** - meaning" lines and "???" questions of the
+note into numbered cards, the reviewer accepts every card and the extractor
+returns the teacher's cards as JSON. Responses carry estimated token usage and
+take a simulated time that grows with their length, scaled by a speed factor.
+It keeps the whole pipeline runnable offline, for smoke runs and benchmarks; the
+chat completions are served by cassette.MockProviderTransport and the batch
+stand-in server.
+"""
+
+import json
+import re
+import time
+from typing import Any, Dict, List
+
+from routing import estimate_tokens
+
+
+# Simulated latency of a response: a fixed part and a part per completion token
+BASE_LATENCY_SECONDS = 0.5
+SECONDS_PER_TOKEN = 0.01
+
+_TERM_LINE = re.compile(r"^\s*[-*]?\s*\*\*(.+?)\*\*\s*[-–—:]\s*(.+?)\s*$")
+_QUESTION_LINE = re.compile(r"^\s*\?\?\?\s*(.+?)\s*$")
+_CARD = re.compile(
+    r"Card (\d+):\s*\n\s*The first side:\s*(.*?)\s*\n\s*The second side:\s*(.*?)\s*\n\s*Double sided card:\s*(yes|no)",
+    re.IGNORECASE | re.DOTALL
+)
+_REMOVED = re.compile(r"Card (\d+):\s*removed", re.IGNORECASE)
+
+
+def _contents(messages: List[Dict[str, Any]]) -> List[str]:
+    """
+    Get the text contents of the conversation, without the system message.
+    """
+    return [
+        message.get("content") for message in messages
+        if message.get("role") != "system" and isinstance(message.get("content"), str)
+    ]
+
+
+def teacher_reply(messages: List[Dict[str, Any]]) -> str:
+    """
+    Number a card for every term line and question of the note in the first message.
+    """
+    contents = _contents(messages)
+    note = contents[0] if contents else ""
+    cards = []
+    for line in note.split("\n"):
+        term = _TERM_LINE.match(line)
+        question = _QUESTION_LINE.match(line)
+        if term:
+            cards.append((term.group(1), term.group(2), "yes"))
+        elif question:
+            cards.append((question.group(1), "Ask the teacher.", "no"))
+    return "\n\n".join(
+        f"Card {number}:\nThe first side: {front}\nThe second side: {back}\nDouble sided card: {double_sided}"
+        for number, (front, back, double_sided) in enumerate(cards, 1)
+    )
+
+
+def reviewer_reply(messages: List[Dict[str, Any]]) -> str:
+    """
+    Accept every card of the latest teacher's message.
+    """
+    contents = _contents(messages)
+    numbers = [int(match.group(1)) for match in _CARD.finditer(contents[-1] if contents else "")]
+    verdict = {"Approved": True, "Cards": [{"Card": number, "Verdict": "accept"} for number in numbers]}
+    return "The cards are fine. OK!\n" + json.dumps(verdict)
+
+
+def extractor_reply(messages: List[Dict[str, Any]]) -> str:
+    """
+    Collect the latest version of every card of the conversation as the extractor's JSON.
+    """
+    cards: Dict[int, Dict[str, Any]] = {}
+    for content in _contents(messages):
+        for match in _CARD.finditer(content):
+            number, front, back, double_sided = match.groups()
+            cards[int(number)] = {"Front": front, "Back": back, "IsReversed": double_sided.lower() == "yes"}
+        for match in _REMOVED.finditer(content):
+            cards.pop(int(match.group(1)), None)
+    return json.dumps({"FlashCards": [cards[number] for number in sorted(cards)]}, ensure_ascii=False)
+
+
+def mock_reply(messages: List[Dict[str, Any]]) -> str:
+    """
+    Answer a conversation as the agent its system message belongs to.
+    """
+    system = messages[0].get("content", "") if messages and messages[0].get("role") == "system" else ""
+    if "FlashCards" in system:
+        return extractor_reply(messages)
+    if '"Approved"' in system:
+        return reviewer_reply(messages)
+    return teacher_reply(messages)
+
+
+def mock_completion(body: Dict[str, Any], completion_id: str) -> Dict[str, Any]:
+    """
+    Answer a chat completion request body with mock_reply.
+
+    Args:
+        body: The request body.
+        completion_id: The id of the completion.
+
+    Returns:
+        The chat.completion object, with estimated token usage.
+    """
+    messages = body.get("messages", [])
+    content = mock_reply(messages)
+    prompt_tokens = sum(
+        estimate_tokens(message["content"]) for message in messages if isinstance(message.get("content"), str)
+    )
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+def simulated_latency(completion: Dict[str, Any]) -> float:
+    """
+    Get the simulated response time of a completion in seconds, before the speed factor.
+    """
+    return BASE_LATENCY_SECONDS + completion["usage"]["completion_tokens"] * SECONDS_PER_TOKEN
@@ -1,5 +1,13 @@
+import logging
+import mmap
+import os
 import re
 from datetime import datetime
+from typing import List, Optional
+
+
+# Marker of a second level header at the beginning of a line
+SECTION_MARKER = b"\n## "
 
 
 def parse_date(input_str: str) -> datetime:
@@ -61,4 +69,118 @@ def parse_date(input_str: str) -> datetime:
         try:
             return datetime.strptime(input_str, "%d.%m.%Y")
         except ValueError:
-            raise ValueError("Invalid date format in simple input")
\ No newline at end of file
+            raise ValueError("Invalid date format in simple input")
+
+
+class SectionIndexEntry:
+    """
+    A day section of the notes file located by its header.
+    """
+    def __init__(self, date: datetime, header: str, start: int, end: int):
+        self.date = date
+        self.header = header
+        self.start = start
+        self.end = end
+
+
+class NoteIndex:
+    """
+    Date index over the second level headers of a notes file.
+
+    Only the header lines are decoded and parsed; section bodies stay on disk
+    until a selected section is read with read_section.
+    """
+    def __init__(self, file_path: str, entries: List[SectionIndexEntry]):
+        self.file_path = file_path
+        # Entries are kept in processing order (oldest section first)
+        self.entries = entries
+
+    @staticmethod
+    def build(file_path: str) -> 'NoteIndex':
+        """
+        Build the index by scanning the file for "\\n## " header markers.
+
+        Headers that don't contain a date (e.g. the legend) are skipped.
+
+        Args:
+            file_path: The path to the markdown notes file.
+
+        Returns:
+            The index of dated sections.
+        """
+        entries = []
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return NoteIndex(file_path, entries)
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                size = len(mm)
+                position = mm.find(SECTION_MARKER)
+                while position != -1:
+                    start = position + len(SECTION_MARKER)
+                    next_position = mm.find(SECTION_MARKER, start)
+                    end = size if next_position == -1 else next_position
+
+                    line_end = mm.find(b"\n", start, end)
+                    if line_end == -1:
+                        line_end = end
+                    header = mm[start:line_end].decode("utf-8").strip()
+
+                    try:
+                        note_date = parse_date(header)
+                        entries.append(SectionIndexEntry(note_date, header, start, end))
+                    except ValueError:
+                        logging.debug(f"Skipping section without a date header: {header}")
+
+                    position = next_position
+
+        # The notes file keeps the newest day on top, process the oldest first
+        entries.reverse()
+        return NoteIndex(file_path, entries)
+
+    def select(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        date: Optional[datetime] = None,
+        last: Optional[int] = None
+    ) -> List[SectionIndexEntry]:
+        """
+        Select sections by date.
+
+        Args:
+            since: Include sections dated on or after this day.
+            until: Include sections dated on or before this day.
+            date: Include only sections dated on this day.
+            last: Include only the N most recent of the remaining sections.
+
+        Returns:
+            The selected entries in processing order.
+        """
+        selected = self.entries
+        if date is not None:
+            selected = [e for e in selected if e.date.date() == date.date()]
+        if since is not None:
+            selected = [e for e in selected if e.date.date() >= since.date()]
+        if until is not None:
+            selected = [e for e in selected if e.date.date() <= until.date()]
+        if last is not None:
+            latest = sorted(selected, key=lambda e: e.date, reverse=True)[:max(last, 0)]
+            latest_ids = {id(e) for e in latest}
+            selected = [e for e in selected if id(e) in latest_ids]
+        return selected
+
+    def read_section(self, entry: SectionIndexEntry) -> str:
+        """
+        Read the text of a single section, starting with its header line.
+
+        Args:
+            entry: The index entry of the section.
+
+        Returns:
+            The section text without the leading "## " marker.
+        """
+        with open(self.file_path, 'rb') as f:
+            f.seek(entry.start)
+            data = f.read(entry.end - entry.start)
+        return data.decode("utf-8").replace("\r\n", "\n")
@@ -0,0 +1,122 @@
+"""
+Prompt compression of the notes and the agent instructions.
+
+The section sent to the teacher is stripped of non-content markup (link targets,
+embeds, images, comments, rules) and its whitespace is normalised. The compact
+versions of the agents' instructions are kept with the agents. A meter estimates
+the prompt tokens of every model call with and without compression.
+"""
+
+import logging
+import re
+from collections import Counter
+from typing import List
+
+from metrics import run_metrics
+from routing import estimate_tokens
+
+
+_COMMENT = re.compile(r"<!--.*?-->|%%.*?%%", re.DOTALL)
+_EMBED = re.compile(r"!\[\[[^\]]*\]\]|!\[[^\]]*\]\([^)]*\)")
+_WIKI_LINK = re.compile(r"\[\[([^\]|]*)(?:\|([^\]]*))?\]\]")
+_LINK = re.compile(r"\[([^\]]*)\]\((?:[^)]*)\)")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_SPACES = re.compile(r"(?<=\S)[ \t]{2,}")
+_WORD = re.compile(r"\w+")
+
+
+def strip_boilerplate(section: str) -> str:
+    """
+    Remove the markup of a section that carries no learning content.
+
+    Comments, embedded files and images are dropped, wiki links and markdown links
+    are replaced by their text (the alias of a wiki link) and horizontal rules are removed.
+    """
+    text = _COMMENT.sub("", section)
+    text = _EMBED.sub("", text)
+    text = _WIKI_LINK.sub(lambda match: match.group(2) if match.group(2) is not None else match.group(1), text)
+    text = _LINK.sub(r"\1", text)
+    return "\n".join(line for line in text.split("\n") if not _RULE.match(line))
+
+
+def normalize_whitespace(text: str) -> str:
+    """
+    Strip trailing and repeated inner whitespace and collapse blank lines.
+
+    Leading indentation is kept, it nests markdown lists.
+    """
+    lines = []
+    for line in text.split("\n"):
+        line = _SPACES.sub(" ", line.rstrip())
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip("\n")
+
+
+def compress_section(section: str) -> str:
+    """
+    Compress a section for the teacher.
+    """
+    return normalize_whitespace(strip_boilerplate(section))
+
+
+def dropped_words(original: str, compressed: str) -> List[str]:
+    """
+    Get the words of the original text that the compressed text lost, to check that no content was removed.
+    """
+    missing = Counter(_WORD.findall(original)) - Counter(_WORD.findall(compressed))
+    return sorted(missing.elements())
+
+
+def _message_tokens(messages) -> int:
+    tokens = 0
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else message
+        if isinstance(content, str):
+            tokens += estimate_tokens(content)
+    return tokens
+
+
+class PromptTokenMeter:
+    """
+    Estimates the prompt tokens of every model call of a team with and without compression.
+
+    The uncompressed estimate adds the tokens the compression saved on the agent's
+    instruction and on the section message, which is part of every call's history.
+    """
+    def __init__(self):
+        self.saved_section_tokens = 0
+
+    def start_section(self, original_message: str, sent_message: str):
+        """
+        Set the section message of the next conversation.
+        """
+        original, sent = estimate_tokens(original_message), estimate_tokens(sent_message)
+        self.saved_section_tokens = original - sent
+        logging.info(f"Section message: ~{original} -> ~{sent} tokens")
+
+    def reset(self):
+        """
+        Forget the savings of the previous section's message, the team serves a new section.
+        """
+        self.saved_section_tokens = 0
+
+    def attach(self, agent, full_instruction: str):
+        """
+        Count the prompt tokens before every reply of the agent.
+
+        Args:
+            agent: The AG2 agent.
+            full_instruction: The full version of the agent's instruction.
+        """
+        saved_instruction_tokens = estimate_tokens(full_instruction) - estimate_tokens(agent.system_message)
+
+        def count_prompt_tokens(messages):
+            sent = estimate_tokens(agent.system_message) + _message_tokens(messages)
+            original = sent + saved_instruction_tokens + self.saved_section_tokens
+            run_metrics.increment("prompt_tokens_uncompressed", original)
+            run_metrics.increment("prompt_tokens_compressed", sent)
+            logging.debug(f"{agent.name}: prompt ~{original} -> ~{sent} tokens")
+            return messages
+
+        agent.register_hook("process_all_messages_before_reply", count_prompt_tokens)
@@ -0,0 +1,87 @@
+"""
+Request rate limiting shared between threads or between the processes of a batch run.
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class _Slot:
+    """
+    Local stand-in for a multiprocessing.Manager Value.
+    """
+    def __init__(self, value: float):
+        self.value = value
+
+
+class SharedRateLimiter:
+    """
+    Spaces requests evenly so that at most requests_per_minute are started.
+
+    The lock and the next free slot are either local objects or
+    multiprocessing.Manager proxies, the latter can be passed to pool workers.
+    """
+    def __init__(self, requests_per_minute: int, lock, next_slot):
+        self.requests_per_minute = requests_per_minute
+        self._interval = 60.0 / requests_per_minute
+        self._lock = lock
+        self._next_slot = next_slot
+
+    @staticmethod
+    def local(requests_per_minute: int) -> 'SharedRateLimiter':
+        """
+        Create a limiter shared by the threads of this process.
+        """
+        return SharedRateLimiter(requests_per_minute, threading.Lock(), _Slot(0.0))
+
+    @staticmethod
+    def shared(manager, requests_per_minute: int) -> 'SharedRateLimiter':
+        """
+        Create a limiter shared by processes through a multiprocessing.Manager.
+        """
+        return SharedRateLimiter(requests_per_minute, manager.Lock(), manager.Value('d', 0.0))
+
+    def acquire(self):
+        """
+        Block until the next request may start.
+        """
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# The limiter applied before every agent reply, None when requests are not limited
+request_limiter: Optional[SharedRateLimiter] = None
+
+
+def install_request_limiter(limiter: Optional[SharedRateLimiter]):
+    """
+    Set the limiter applied before every agent reply.
+    """
+    global request_limiter
+    request_limiter = limiter
+
+
+def limit_agent_requests(agent, limiter: SharedRateLimiter):
+    """
+    Wait for the limiter before every model request of the agent.
+
+    The wait happens in the model call, which AG2 runs in a worker thread in
+    asynchronous chats, so the event loop is never blocked.
+
+    Args:
+        agent: The AG2 agent.
+        limiter: The rate limiter.
+    """
+    client = agent.client
+    create = client.create
+
+    def limited_create(**params):
+        limiter.acquire()
+        return create(**params)
+
+    client.create = limited_create
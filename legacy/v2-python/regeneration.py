@@ -0,0 +1,107 @@
+"""
+Diff-based regeneration of edited days.
+
+The edited section is diffed line by line against the text of its last
+successful generation kept in the manifest. Only the changed and added lines go
+to the teacher, with the day's existing cards as context. The teacher creates
+cards for the new material and marks the existing cards a change made obsolete
+("Existing card E<number>: removed"); the new cards are merged into the kept ones.
+"""
+
+import difflib
+import re
+from typing import Iterable, List, Set
+
+from card_codec import CardRecord
+from chunking import merge_flash_cards
+
+
+_REMOVED_CARD = re.compile(r"Existing card E(\d+)\s*:\s*removed", re.IGNORECASE)
+
+
+def changed_lines(previous: str, current: str) -> List[str]:
+    """
+    Get the lines of the current section that were changed or added since the previous version.
+
+    The header line and blank lines are left out, deleted lines have no counterpart.
+    """
+    previous_lines = previous.split("\n")[1:]
+    current_lines = current.split("\n")[1:]
+    matcher = difflib.SequenceMatcher(None, previous_lines, current_lines, autojunk=False)
+    lines = []
+    for tag, _, _, start, end in matcher.get_opcodes():
+        if tag in ("replace", "insert"):
+            lines.extend(line for line in current_lines[start:end] if line.strip())
+    return lines
+
+
+def content_line_count(section: str) -> int:
+    """
+    Count the non-blank lines of a section below its header.
+    """
+    return sum(1 for line in section.split("\n")[1:] if line.strip())
+
+
+def _format_existing_card(number: int, card: CardRecord) -> str:
+    double_sided = "yes" if card.is_reversed else "no"
+    return (
+        f"Existing card E{number}:\n"
+        f"The first side: {card.front}\n"
+        f"The second side: {card.back}\n"
+        f"Double sided card: {double_sided}"
+    )
+
+
+def build_diff_message(section: str, lines: List[str], existing_cards: List[CardRecord]) -> str:
+    """
+    Build the teacher's request for the changed lines of an already processed day.
+
+    Args:
+        section: The current section text.
+        lines: The changed and added lines.
+        existing_cards: The cards of the last generation.
+
+    Returns:
+        The message that starts the group chat.
+    """
+    header = section.split("\n", 1)[0]
+    existing = "\n\n".join(_format_existing_card(number, card) for number, card in enumerate(existing_cards, 1))
+    changed = "\n".join(lines)
+    return (
+        "The student edited a note that already has cards.\n"
+        f"{header}\n"
+        f"Changed or added lines:\n{changed}\n\n"
+        f"Existing cards of the note:\n{existing}\n\n"
+        "Create cards only for the material of the changed lines that the existing cards don't cover, numbered from 1, "
+        "and don't repeat the existing cards.\n"
+        "If a change makes an existing card wrong or obsolete, write \"Existing card E<number>: removed\" "
+        "and create its corrected version as a new card if it is still worth learning."
+    )
+
+
+def removed_existing_cards(teacher_messages: Iterable[str], count: int) -> Set[int]:
+    """
+    Get the numbers of the existing cards the teacher marked as removed.
+
+    Args:
+        teacher_messages: The contents of the teacher's messages.
+        count: The number of existing cards, other numbers are ignored.
+    """
+    removed = set()
+    for content in teacher_messages:
+        for match in _REMOVED_CARD.finditer(content or ""):
+            number = int(match.group(1))
+            if 1 <= number <= count:
+                removed.add(number)
+    return removed
+
+
+def merge_regenerated(existing_cards: List[CardRecord], removed: Set[int], new_cards: List[CardRecord]) -> List[CardRecord]:
+    """
+    Merge the new cards of an edited day into its existing cards.
+
+    The removed existing cards are dropped, the new cards follow the kept ones and
+    duplicates of kept cards are skipped.
+    """
+    kept = [card for number, card in enumerate(existing_cards, 1) if number not in removed]
+    return merge_flash_cards([kept, new_cards])
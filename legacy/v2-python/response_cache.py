@@ -0,0 +1,80 @@
+"""
+Response cache for LLM completions backed by AG2's disk cache.
+
+The disk cache is safe to share between processes, so the notebooks of a batch
+run reuse each other's responses.
+"""
+
+import logging
+import threading
+from typing import Dict, Optional
+
+from metrics import run_metrics
+
+
+class CountingCache:
+    """
+    Wraps an AG2 cache and counts hits and misses.
+    """
+    def __init__(self, cache):
+        self._cache = cache
+
+    def get(self, key, default=None):
+        value = self._cache.get(key, None)
+        if value is None:
+            run_metrics.increment("cache_misses")
+            return default
+        run_metrics.increment("cache_hits")
+        return value
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def close(self):
+        self._cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_caches: Dict[str, CountingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(cache_path: Optional[str], cache_seed: int) -> Optional[CountingCache]:
+    """
+    Open the response cache once per process.
+
+    Args:
+        cache_path: The cache folder, None disables caching.
+        cache_seed: The cache seed, responses are only reused within the same seed.
+
+    Returns:
+        The cache, or None when caching is disabled.
+    """
+    if not cache_path:
+        return None
+
+    key = f"{cache_path}:{cache_seed}"
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            from autogen import Cache
+
+            logging.info(f"Using response cache {cache_path} with seed {cache_seed}")
+            cache = CountingCache(Cache.disk(cache_seed=cache_seed, cache_path_root=cache_path))
+            _caches[key] = cache
+        return cache
+
+
+def close_response_caches():
+    """
+    Close every cache opened in this process.
+    """
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.close()
+        _caches.clear()
@@ -0,0 +1,114 @@
+"""
+Machine-readable verdicts of the flashcard reviewer.
+
+The reviewer ends its answer with a JSON verdict: whether the cards are approved
+and, per numbered card, whether it is accepted or has to be fixed and why. The
+teacher then revises only the rejected cards. Answers without a verdict fall back
+to the "OK!" convention.
+"""
+
+import json
+from typing import Any, List, NamedTuple, Optional
+
+
+APPROVAL_MARKER = "OK!"
+
+ACCEPT = "accept"
+FIX = "fix"
+
+
+class CardVerdict(NamedTuple):
+    """
+    The reviewer's verdict on a single numbered card.
+    """
+    number: int
+    verdict: str
+    reason: str = ""
+
+
+class ReviewVerdict(NamedTuple):
+    """
+    The reviewer's verdict on a round of cards.
+
+    structured is False when the answer had no JSON verdict and the "OK!"
+    convention was used instead.
+    """
+    approved: bool
+    cards: List[CardVerdict]
+    structured: bool
+
+    @property
+    def rejected(self) -> List[CardVerdict]:
+        """
+        The cards the teacher has to fix.
+        """
+        return [card for card in self.cards if card.verdict != ACCEPT]
+
+
+def _find_verdict_object(content: str) -> Optional[dict]:
+    """
+    Find the last JSON object with an Approved field in the text.
+    """
+    decoder = json.JSONDecoder()
+    position = content.rfind("{")
+    while position != -1:
+        try:
+            document, _ = decoder.raw_decode(content, position)
+        except json.JSONDecodeError:
+            document = None
+        if isinstance(document, dict) and ("Approved" in document or "approved" in document):
+            return document
+        position = content.rfind("{", 0, position)
+    return None
+
+
+def _get(document: dict, name: str, default: Any = None) -> Any:
+    value = document.get(name)
+    if value is None:
+        value = document.get(name.lower(), default)
+    return value
+
+
+def _parse_card(card: Any) -> Optional[CardVerdict]:
+    if not isinstance(card, dict):
+        return None
+    number = _get(card, "Card")
+    if number is None:
+        number = _get(card, "Number")
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        return None
+
+    verdict = str(_get(card, "Verdict", ACCEPT)).strip().lower()
+    if verdict not in (ACCEPT, FIX):
+        verdict = FIX
+    return CardVerdict(number, verdict, str(_get(card, "Reason", "") or ""))
+
+
+def parse_review_verdict(content: Optional[str]) -> ReviewVerdict:
+    """
+    Parse the reviewer's answer.
+
+    The cards are approved only when the reviewer says so and rejects none of
+    them. Without a JSON verdict the answer is approved when it contains "OK!".
+
+    Args:
+        content: The reviewer's answer.
+
+    Returns:
+        The verdict.
+    """
+    content = content or ""
+    document = _find_verdict_object(content)
+    if document is None:
+        return ReviewVerdict(APPROVAL_MARKER in content, [], False)
+
+    cards = _get(document, "Cards", [])
+    card_verdicts = [verdict for verdict in map(_parse_card, cards if isinstance(cards, list) else []) if verdict]
+
+    approved = _get(document, "Approved", False)
+    if isinstance(approved, str):
+        approved = approved.strip().lower() in ("true", "yes")
+    approved = bool(approved) and all(card.verdict == ACCEPT for card in card_verdicts)
+    return ReviewVerdict(approved, card_verdicts, True)
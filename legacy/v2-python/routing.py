@@ -0,0 +1,200 @@
+"""
+Size-aware routing of sections to providers.
+
+A section's estimated token count and content features are matched against the
+configured routing rules, the first matching rule picks the providers of the
+agents and, optionally, their MaxTokens. Agent teams are pooled per provider and
+MaxTokens combination and reused.
+"""
+
+import copy
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+from config.config_loader import AppSettings, RoutingRuleSettings
+
+
+# The agents a rule can route, as named in the Agents settings
+AGENT_KEYS = ("TeacherAgent", "ReviewerAgent", "ExtractorAgent")
+
+DEFAULT_ROUTE_NAME = "default"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text, about four characters per token.
+    """
+    return math.ceil(len(text) / 4)
+
+
+class SectionFeatures(NamedTuple):
+    """
+    The features of a section that routing rules match on.
+    """
+    tokens: int
+    lines: int
+    sub_headers: int
+    questions: int
+
+
+class Route(NamedTuple):
+    """
+    The providers and completion token limits chosen for a section.
+    """
+    name: str
+    providers: Tuple[str, str, str]
+    max_tokens: Tuple[int, int, int]
+    features: SectionFeatures
+
+    @property
+    def team_key(self) -> Tuple[Tuple[str, str, str], Tuple[int, int, int]]:
+        return self.providers, self.max_tokens
+
+
+def analyze_section(section: str) -> SectionFeatures:
+    """
+    Get the routing features of a section.
+
+    Args:
+        section: The section text.
+
+    Returns:
+        The features.
+    """
+    lines = section.split("\n")
+    sub_headers = sum(1 for line in lines if line.startswith("### "))
+    questions = sum(1 for line in lines if "???" in line)
+    return SectionFeatures(estimate_tokens(section), len(lines), sub_headers, questions)
+
+
+def rule_matches(rule: RoutingRuleSettings, features: SectionFeatures) -> bool:
+    """
+    Check whether all the set conditions of a rule hold for a section.
+    """
+    if rule.min_tokens is not None and features.tokens < rule.min_tokens:
+        return False
+    if rule.max_tokens is not None and features.tokens > rule.max_tokens:
+        return False
+    if rule.has_sub_headers is not None and (features.sub_headers > 0) != rule.has_sub_headers:
+        return False
+    if rule.has_questions is not None and (features.questions > 0) != rule.has_questions:
+        return False
+    return True
+
+
+def configured_providers(app_settings: AppSettings) -> Tuple[str, str, str]:
+    """
+    Get the providers of the agents from the Agents settings.
+    """
+    agents = app_settings.agents
+    return (
+        agents.teacher_agent.provider_name,
+        agents.reviewer_agent.provider_name,
+        agents.extractor_agent.provider_name
+    )
+
+
+def configured_max_tokens(app_settings: AppSettings) -> Tuple[int, int, int]:
+    """
+    Get the MaxTokens of the agents from the Agents settings.
+    """
+    agents = app_settings.agents
+    return (
+        agents.teacher_agent.max_tokens,
+        agents.reviewer_agent.max_tokens,
+        agents.extractor_agent.max_tokens
+    )
+
+
+def choose_route(section: str, app_settings: AppSettings) -> Route:
+    """
+    Choose the providers of a section with the first matching routing rule.
+
+    Args:
+        section: The section text.
+        app_settings: The application settings.
+
+    Returns:
+        The route, the configured providers when no rule matches.
+    """
+    features = analyze_section(section)
+    providers = configured_providers(app_settings)
+    max_tokens = configured_max_tokens(app_settings)
+    for rule in app_settings.routing.rules:
+        if rule_matches(rule, features):
+            routed = tuple(rule.agent_providers.get(key, provider) for key, provider in zip(AGENT_KEYS, providers))
+            limits = tuple(rule.agent_max_tokens.get(key, limit) for key, limit in zip(AGENT_KEYS, max_tokens))
+            return Route(rule.name, routed, limits, features)
+    return Route(DEFAULT_ROUTE_NAME, providers, max_tokens, features)
+
+
+def routed_settings(app_settings: AppSettings, route: Route) -> AppSettings:
+    """
+    Get a copy of the settings with the agents on the providers and MaxTokens of a route.
+    """
+    settings = copy.copy(app_settings)
+    settings.agents = copy.deepcopy(app_settings.agents)
+    agents = (settings.agents.teacher_agent, settings.agents.reviewer_agent, settings.agents.extractor_agent)
+    for agent, provider, max_tokens in zip(agents, route.providers, route.max_tokens):
+        agent.provider_name = provider
+        agent.max_tokens = max_tokens
+    return settings
+
+
+def provider_models(app_settings: AppSettings, providers: Iterable[str]) -> List[str]:
+    """
+    Get the model names of providers, the provider name stands in when it has no model.
+    """
+    models = []
+    for name in providers:
+        provider = app_settings.get_provider_by_name(name)
+        settings = provider.get_settings() if provider is not None else None
+        models.append(getattr(settings, "model_name", "") or name)
+    return models
+
+
+def unknown_route_providers(app_settings: AppSettings) -> List[str]:
+    """
+    Get the providers named by routing rules that are not configured.
+    """
+    return sorted({
+        provider
+        for rule in app_settings.routing.rules
+        for provider in rule.agent_providers.values()
+        if app_settings.get_provider_by_name(provider) is None
+    })
+
+
+class TeamPool:
+    """
+    Idle agent teams per provider and MaxTokens combination.
+
+    A team serves one section at a time: it is taken from the pool for a section
+    and given back afterwards, so concurrent sections get their own teams.
+    """
+    def __init__(self, create_team: Callable[[AppSettings], object]):
+        self._create_team = create_team
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[Tuple[str, str, str], Tuple[int, int, int]], List[object]] = {}
+
+    def acquire(self, app_settings: AppSettings, route: Route):
+        """
+        Take an idle team of the route's providers and MaxTokens, creating one when there is none.
+        """
+        with self._lock:
+            idle = self._idle.get(route.team_key)
+            if idle:
+                return idle.pop()
+        return self._create_team(routed_settings(app_settings, route))
+
+    def release(self, route: Route, team):
+        """
+        Give a team back to the pool.
+        """
+        with self._lock:
+            self._idle.setdefault(route.team_key, []).append(team)
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
@@ -0,0 +1,124 @@
+"""
+Speculative extraction of the cards while the reviewer reviews them.
+
+When the teacher finishes a draft, the extractor starts on it in a background
+thread at the same time as the reviewer call. If the reviewer approves the draft
+unchanged, the extractor's turn returns the speculative result instead of calling
+the model again, taking one model round trip out of the common case. Rejected
+drafts discard their speculative result. The extractor's turn awaits a running
+speculative extraction without blocking the event loop of the asynchronous chat.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from metrics import run_metrics
+from tracing import span
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(thread_name_prefix="speculative-extraction")
+        return _executor
+
+
+class SpeculativeExtraction:
+    """
+    The speculative extraction state of an agent team, one section at a time.
+    """
+    def __init__(self, extractor_agent):
+        self.extractor_agent = extractor_agent
+        self._lock = threading.Lock()
+        self._pending: Optional[Future] = None
+        self._accepted: Optional[Future] = None
+
+    def attach(self):
+        """
+        Register the reply function that answers the extractor's turn with an accepted result.
+
+        The reply function is asynchronous, the group chats run with a_initiate_chat;
+        the speculative extraction itself calls the synchronous generate_reply, which skips it.
+        """
+        import autogen
+
+        self.extractor_agent.register_reply(
+            trigger=[autogen.Agent, None],
+            reply_func=self._reply_with_accepted,
+            position=0,
+            ignore_async_in_sync_chat=True
+        )
+
+    def start(self, messages: List[Dict[str, Any]]):
+        """
+        Start extracting the cards of the chat so far, discarding a previous draft's extraction.
+
+        Args:
+            messages: The group chat messages, ending with the teacher's draft.
+        """
+        messages = [dict(message) for message in messages]
+        with self._lock:
+            self._discard_pending()
+            self._pending = _get_executor().submit(self._extract, messages)
+        run_metrics.increment("speculative_extractions")
+
+    def accept(self):
+        """
+        The reviewer approved the draft, keep its extraction for the extractor's turn.
+        """
+        with self._lock:
+            self._accepted, self._pending = self._pending, None
+
+    def discard(self):
+        """
+        The reviewer rejected the draft, throw its extraction away.
+        """
+        with self._lock:
+            self._discard_pending()
+
+    def reset(self):
+        """
+        Drop the state left by the previous section.
+        """
+        with self._lock:
+            self._discard_pending()
+            self._accepted = None
+
+    def _discard_pending(self):
+        if self._pending is not None:
+            # A running extraction can't be interrupted, its result is ignored
+            self._pending.cancel()
+            self._pending = None
+            run_metrics.increment("speculative_discarded")
+
+    def _extract(self, messages: List[Dict[str, Any]]):
+        with span("speculative_extraction", "agent", messages=len(messages)):
+            return self.extractor_agent.generate_reply(messages=messages)
+
+    async def _reply_with_accepted(self, recipient, messages=None, sender=None, config=None):
+        with self._lock:
+            accepted, self._accepted = self._accepted, None
+        if accepted is None:
+            return False, None
+
+        try:
+            reply = await asyncio.wrap_future(accepted)
+        except Exception as ex:
+            logging.warning(f"Speculative extraction failed, extracting again: {ex}")
+            run_metrics.increment("speculative_failed")
+            return False, None
+
+        if not reply:
+            run_metrics.increment("speculative_failed")
+            return False, None
+
+        run_metrics.increment("speculative_hits")
+        return True, reply
@@ -0,0 +1,8 @@
+"""
+Shared setup of the tests: the modules of the tool are imported from the parent directory.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
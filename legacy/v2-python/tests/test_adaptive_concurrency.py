@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+
+from adaptive_concurrency import BASELINE_SAMPLES, AimdController, is_overload_error
+from config.config_loader import AdaptiveConcurrencySettings
+from metrics import run_metrics
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class APITimeoutError(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    run_metrics.reset()
+    yield
+    run_metrics.reset()
+
+
+def create_controller(**values) -> AimdController:
+    settings = AdaptiveConcurrencySettings.from_dict({"Enabled": True, **values})
+    return AimdController("provider", settings)
+
+
+def test_clamps_the_initial_limit_and_publishes_it():
+    assert create_controller(InitialLimit=100, MaxLimit=8).limit == 8
+    assert create_controller(InitialLimit=0, MinLimit=2).limit == 2
+    assert run_metrics.gauges["concurrency_limit_provider"] == 2
+
+
+def test_blocks_at_the_limit_until_a_release():
+    controller = create_controller(InitialLimit=1)
+    first = controller.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        controller.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+
+    controller.release(first, 0.1)
+    assert acquired.wait(5)
+    thread.join()
+    assert controller.in_flight == 1
+    assert run_metrics.timings["concurrency_wait_provider"]["count"] == 1
+
+
+def test_grows_by_the_step_per_limit_of_healthy_responses():
+    controller = create_controller(InitialLimit=2, IncreaseStep=1.0)
+    for _ in range(2):
+        controller.release(controller.acquire(), 0.1)
+    # 2 + 1/2 + 1/2.5
+    assert controller.limit == pytest.approx(2.9)
+    assert run_metrics.gauges["concurrency_limit_provider"] == 2
+
+    controller.release(controller.acquire(), 0.1)
+    assert int(controller.limit) == 3
+    assert run_metrics.gauges["concurrency_limit_provider"] == 3
+
+
+def test_stops_growing_at_the_max_limit():
+    controller = create_controller(InitialLimit=2, MaxLimit=3)
+    for _ in range(20):
+        controller.release(controller.acquire(), 0.1)
+    assert controller.limit == 3
+
+
+def test_cuts_once_per_round_on_overload():
+    controller = create_controller(InitialLimit=8, DecreaseFactor=0.5)
+    rounds = [controller.acquire() for _ in range(4)]
+    for request_round in rounds:
+        controller.release(request_round, 0.1, RateLimitError())
+
+    assert controller.limit == 4
+    assert run_metrics.counters["concurrency_decreases_provider"] == 1
+
+    # A request started after the cut cuts again
+    controller.release(controller.acquire(), 0.1, APITimeoutError())
+    assert controller.limit == 2
+
+
+def test_never_cuts_below_the_min_limit():
+    controller = create_controller(InitialLimit=2, MinLimit=2)
+    controller.release(controller.acquire(), 0.1, TimeoutError())
+    assert controller.limit == 2
+
+
+def test_other_errors_keep_the_limit():
+    controller = create_controller(InitialLimit=4)
+    controller.release(controller.acquire(), 0.1, ValueError("bad request"))
+    assert controller.limit == 4
+    assert controller.in_flight == 0
+
+
+def test_cuts_on_a_latency_spike_after_the_baseline():
+    controller = create_controller(InitialLimit=8, MaxLimit=8, LatencySpikeRatio=3.0)
+    for _ in range(BASELINE_SAMPLES):
+        controller.release(controller.acquire(), 1.0)
+    assert controller.limit == 8
+
+    controller.release(controller.acquire(), 2.5)
+    assert controller.limit == 8
+    controller.release(controller.acquire(), 10.0)
+    assert controller.limit == 4
+
+
+@pytest.mark.parametrize("error, expected", [
+    (RateLimitError(), True),
+    (TimeoutError(), True),
+    (APITimeoutError(), True),
+    (ValueError(), False),
+    (ConnectionError(), False),
+])
+def test_detects_overload_errors(error, expected):
+    assert is_overload_error(error) is expected
@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from batch_api import BatchBackfill, create_conversations, load_state
+from batch_server import create_server
+from config.config_loader import AppSettings
+from manifest import GENERATED, OutputManifest
+from metrics import run_metrics
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NOTES = """# English Learning Notes
+
+## 28.03.2025
+
+- **look up** - to search for information
+- **give up** - to stop trying
+
+## 27.03.2025
+
+- **at** - used for specific times
+"""
+
+
+@pytest.fixture
+def server():
+    server = create_server("127.0.0.1", 0, complete_after=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def app_settings(tmp_path, server):
+    with open(os.path.join(ROOT, "appsettings.template.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    source_path = tmp_path / "notes.md"
+    source_path.write_text(NOTES, encoding="utf-8")
+    config["FilePaths"].update({
+        "SourceNotePath": str(source_path),
+        "ResultCardsFolderPath": str(tmp_path / "cards"),
+        "ResultNotesFolderPath": str(tmp_path / "notes"),
+        "CardTemplatePath": os.path.join(ROOT, "cardTemplate.md"),
+        "NoteTemplatePath": os.path.join(ROOT, "noteTemplate.md")
+    })
+    config["Processing"].update({
+        "BatchEndpoint": f"http://127.0.0.1:{server.server_port}/v1",
+        "BatchPollSeconds": 0.01,
+        "ManifestPath": str(tmp_path / "manifest.sqlite")
+    })
+    run_metrics.reset()
+    yield AppSettings.from_dict(config)
+    run_metrics.reset()
+
+
+def test_backfill_writes_every_day_through_the_batch_api(tmp_path, app_settings):
+    import main
+    from manifest import close_manifests
+
+    args = argparse.Namespace(since=None, until=None, date=None, last=None)
+    conversations = create_conversations(app_settings, args)
+    assert sorted(conversation.note_date for conversation in conversations) == ["2025-03-27", "2025-03-28"]
+
+    state_path = str(tmp_path / "backfill.json")
+    backfill = BatchBackfill(app_settings, conversations, [], state_path)
+    try:
+        backfill.run(*main.load_templates(app_settings))
+    finally:
+        backfill.close()
+        close_manifests()
+
+    assert backfill.conversations == {}
+    source_path, remaining, batches = load_state(state_path)
+    assert (source_path, remaining, batches) == (app_settings.file_paths.source_note_path, [], [])
+
+    counters = run_metrics.to_dict()["counters"]
+    # A teacher, a reviewer and an extractor batch of both days
+    assert counters["batches_submitted"] == 3
+    assert counters["batch_requests"] == 6
+    assert counters.get("batch_requests_failed", 0) == 0
+
+    cards_files = sorted(os.listdir(tmp_path / "cards"))
+    assert len(cards_files) == 2
+    cards = (tmp_path / "cards" / cards_files[-1]).read_text(encoding="utf-8")
+    assert "look up" in cards and "give up" in cards
+
+    manifest = OutputManifest(str(tmp_path / "manifest.sqlite"))
+    try:
+        summary = manifest.report("summary")
+    finally:
+        manifest.close()
+    assert summary == {GENERATED: {"days": 2, "cards": 3}}
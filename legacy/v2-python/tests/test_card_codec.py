@@ -0,0 +1,38 @@
+import pytest
+
+from card_codec import CardDecodeError, CardRecord, decode_flash_cards, encode_flash_cards, format_flash_cards
+
+
+def test_decodes_capitalised_and_snake_case_keys():
+    content = '{"FlashCards": [{"Front": "a", "Back": "b", "IsReversed": true}, {"front": "c", "back": "d"}]}'
+    assert decode_flash_cards(content) == [CardRecord("a", "b", True), CardRecord("c", "d", False)]
+    assert decode_flash_cards('{"flash_cards": []}') == []
+
+
+@pytest.mark.parametrize("value, expected", [("yes", True), ("0", False), (1, True), (" False ", False)])
+def test_accepts_lax_booleans(value, expected):
+    content = encode_flash_cards([CardRecord("a", "b")]).replace("false", f'"{value}"' if isinstance(value, str) else str(value))
+    assert decode_flash_cards(content)[0].is_reversed is expected
+
+
+@pytest.mark.parametrize("content", [
+    "not json",
+    "[]",
+    '{"Cards": []}',
+    '{"FlashCards": ["a"]}',
+    '{"FlashCards": [{"Front": "a"}]}',
+    '{"FlashCards": [{"Front": "a", "Back": 2}]}',
+    '{"FlashCards": [{"Front": "a", "Back": "b", "IsReversed": "maybe"}]}',
+])
+def test_rejects_invalid_collections(content):
+    with pytest.raises(CardDecodeError):
+        decode_flash_cards(content)
+
+
+def test_encode_round_trips():
+    cards = [CardRecord("über", "b", True), CardRecord("c", "d")]
+    assert decode_flash_cards(encode_flash_cards(cards)) == cards
+
+
+def test_format_marks_reversed_cards():
+    assert format_flash_cards([CardRecord("a", "b"), CardRecord("c", "d", True)]) == "a\n?\nb\n\nc\n??\nd\n"
@@ -0,0 +1,69 @@
+from card_codec import CardRecord
+from chunking import merge_flash_cards, split_section
+from routing import estimate_tokens
+
+
+HEADER = "## 2024-01-02"
+
+
+def build_section(*blocks):
+    return HEADER + "\n" + "\n".join(blocks)
+
+
+def test_small_section_is_a_single_chunk():
+    section = build_section("### Words", "a line")
+    assert split_section(section, 1000) == [section]
+    assert split_section(section, 0) == [section]
+
+
+def test_splits_at_sub_headers_and_keeps_the_header():
+    blocks = [f"### Topic {i}\n" + "word " * 40 for i in range(4)]
+    section = build_section(*blocks)
+
+    chunks = split_section(section, 60)
+
+    assert len(chunks) == 4
+    for chunk, block in zip(chunks, blocks):
+        assert chunk == HEADER + "\n" + block
+        assert estimate_tokens(chunk) <= 60
+
+
+def test_packs_small_blocks_into_one_chunk():
+    blocks = [f"### Topic {i}\nshort" for i in range(3)] + ["### Long\n" + "word " * 80]
+    chunks = split_section(build_section(*blocks), 60)
+
+    assert chunks[0] == HEADER + "\n" + "\n".join(blocks[:3])
+    assert all(chunk.startswith(HEADER + "\n") for chunk in chunks)
+
+
+def test_splits_large_blocks_at_paragraphs():
+    paragraphs = ["first " * 30, "second " * 30, "third " * 30]
+    section = build_section("### Topic\n" + "\n\n".join(paragraphs))
+
+    chunks = split_section(section, 80)
+
+    assert len(chunks) == 3
+    assert [chunk.count(word) for chunk, word in zip(chunks, ("first", "second", "third"))] == [30, 30, 30]
+    # No line of the section is lost
+    body = "\n".join(chunk.partition("\n")[2] for chunk in chunks)
+    assert body == section.partition("\n")[2]
+
+
+def test_keeps_an_oversized_paragraph_whole():
+    paragraph = "word " * 200
+    chunks = split_section(build_section(paragraph), 20)
+    assert chunks == [build_section(paragraph)]
+
+
+def test_merge_drops_duplicates_ignoring_case_and_whitespace():
+    first = [CardRecord("Apple", "a fruit"), CardRecord("run", "to move fast")]
+    second = [CardRecord(" apple ", "A  fruit", True), CardRecord("walk", "to move slowly")]
+
+    merged = merge_flash_cards([first, second, []])
+
+    assert merged == [first[0], first[1], second[1]]
+
+
+def test_merge_keeps_cards_with_the_same_front_and_another_back():
+    cards = [CardRecord("bank", "a river side"), CardRecord("bank", "a money institution")]
+    assert merge_flash_cards([cards[:1], cards[1:]]) == cards
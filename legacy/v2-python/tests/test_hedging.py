@@ -0,0 +1,46 @@
+import time
+import types
+
+from config.config_loader import HedgingSettings
+from hedging import LatencyTracker, enable_hedging
+
+
+def hedged_agent(primary, alternate):
+    settings = HedgingSettings()
+    settings.min_samples = 1
+    settings.min_delay = 0.05
+    settings.percentile = 50
+    settings.max_extra_request_ratio = 1.0
+    agent = types.SimpleNamespace(name="Agent", client=types.SimpleNamespace(create=primary))
+    policy = enable_hedging(agent, settings, types.SimpleNamespace(create=alternate), max_concurrency=2)
+    return agent, policy
+
+
+def test_percentile_needs_min_samples():
+    tracker = LatencyTracker(10)
+    tracker.record(1.0)
+    assert tracker.percentile(95, 2) is None
+    tracker.record(3.0)
+    assert tracker.percentile(50, 2) == 1.0
+    assert tracker.percentile(95, 2) == 3.0
+
+
+def test_a_winning_hedge_records_the_primary_latency():
+    def slow(**params):
+        time.sleep(0.3)
+        return "primary"
+
+    agent, policy = hedged_agent(slow, lambda **params: "hedge")
+    policy.latencies.record(0.05)
+    assert agent.client.create() == "hedge"
+    # The slow primary is sampled, at least as long as the delay before the hedge
+    assert policy.latencies.percentile(100, 1) >= 0.05
+    assert len(policy.latencies._window) == 2
+
+
+def test_fast_primaries_are_not_hedged():
+    hedges = []
+    agent, policy = hedged_agent(lambda **params: "primary", lambda **params: hedges.append(1))
+    policy.latencies.record(0.05)
+    assert [agent.client.create() for _ in range(3)] == ["primary"] * 3
+    assert hedges == [] and policy.hedges == 0
@@ -0,0 +1,31 @@
+import time
+
+from http_clients import PoolStatistics
+
+
+def test_released_connections_are_reused_up_to_the_keepalive_limit():
+    statistics = PoolStatistics(max_connections=4, max_keepalive_connections=1, keepalive_expiry=30)
+    statistics.acquire()
+    statistics.acquire()
+    statistics.release()
+    statistics.release()
+    statistics.acquire()
+    statistics.acquire()
+    counts = statistics.to_dict()
+    assert (counts["requests"], counts["pool_hits"], counts["pool_misses"]) == (4, 1, 3)
+
+
+def test_idle_connections_expire():
+    statistics = PoolStatistics(max_connections=4, max_keepalive_connections=4, keepalive_expiry=0.05)
+    statistics.acquire()
+    statistics.release()
+    time.sleep(0.1)
+    statistics.acquire()
+    assert statistics.to_dict()["pool_hits"] == 0
+
+
+def test_requests_beyond_max_connections_wait():
+    statistics = PoolStatistics(max_connections=2, max_keepalive_connections=2, keepalive_expiry=30)
+    for _ in range(3):
+        statistics.acquire()
+    assert statistics.to_dict()["pool_waits"] == 1
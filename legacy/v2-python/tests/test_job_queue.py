@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from job_queue import DONE, FAILED, IN_PROGRESS, PENDING, SKIPPED, SectionJobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SectionJobQueue(str(tmp_path / "jobs.db"), lease_seconds=60, max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def state_of(queue, job):
+    return queue._connection.execute("SELECT state, lease_owner FROM section_jobs WHERE id = ?", (job.id,)).fetchone()
+
+
+def test_enqueue_ignores_sections_already_queued(queue):
+    sections = [("h1", "2024-01-01", "one"), ("h2", "2024-01-02", "two")]
+    assert queue.enqueue("notes.md", sections) == 2
+    assert queue.enqueue("notes.md", sections) == 0
+    assert queue.enqueue("notes.md", [("h1", "2024-01-01", "one edited")]) == 1
+
+
+def test_claim_takes_the_oldest_day_first(queue):
+    queue.enqueue("notes.md", [("h2", "2024-01-02", "two"), ("h1", "2024-01-01", "one")])
+    job = queue.claim("worker:0")
+    assert (job.note_date, job.section_text, job.attempts) == ("2024-01-01", "one", 1)
+    assert queue.claim("worker:1").note_date == "2024-01-02"
+    assert queue.claim("worker:2") is None
+
+
+def test_renew_keeps_the_owner_and_complete_succeeds(queue):
+    queue.lease_seconds = 0.2
+    queue.enqueue("notes.md", [("h1", "2024-01-01", "one")])
+    job = queue.claim("host:1:0")
+
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.renew(job, "host:1:0")
+    # Renewed leases don't expire, so nobody else can claim the job
+    assert queue.claim("host:2:0") is None
+    assert state_of(queue, job) == (IN_PROGRESS, "host:1:0")
+
+    queue.complete(job, "host:1:0")
+    assert state_of(queue, job) == (DONE, None)
+    assert queue.counts()[DONE] == 1
+
+
+def test_renew_of_another_owner_fails(queue):
+    queue.enqueue("notes.md", [("h1", "2024-01-01", "one")])
+    job = queue.claim("host:1:0")
+    assert not queue.renew(job, "host:1")
+    assert state_of(queue, job) == (IN_PROGRESS, "host:1:0")
+
+
+def test_expired_lease_is_claimed_again_until_attempts_run_out(queue):
+    queue.lease_seconds = 0.05
+    queue.enqueue("notes.md", [("h1", "2024-01-01", "one")])
+    first = queue.claim("host:1:0")
+    time.sleep(0.1)
+
+    second = queue.claim("host:2:0")
+    assert second.id == first.id and second.attempts == 2
+    # The first worker lost its lease, its completion is ignored
+    queue.complete(first, "host:1:0")
+    assert state_of(queue, second) == (IN_PROGRESS, "host:2:0")
+
+    time.sleep(0.1)
+    assert queue.claim("host:3:0") is None
+    assert state_of(queue, second)[0] == FAILED
+
+
+def test_fail_returns_the_job_until_its_last_attempt(queue):
+    queue.enqueue("notes.md", [("h1", "2024-01-01", "one")])
+    job = queue.claim("w")
+    queue.fail(job, "w", "error")
+    assert state_of(queue, job)[0] == PENDING
+    job = queue.claim("w")
+    queue.fail(job, "w", "error")
+    assert state_of(queue, job)[0] == FAILED
+
+
+def test_skipped_jobs_are_not_retried(queue):
+    queue.enqueue("notes.md", [("h1", "2024-01-01", "")])
+    job = queue.claim("w")
+    queue.skip(job, "w", "The section has no text")
+    assert queue.claim("w") is None
+    assert queue.counts() == {PENDING: 0, IN_PROGRESS: 0, DONE: 0, SKIPPED: 1, FAILED: 0}
@@ -0,0 +1,84 @@
+import pytest
+
+from card_codec import CardRecord
+from manifest import FAILED, GENERATED, SKIPPED, OutputManifest
+
+
+CARDS = [CardRecord("apple", "a fruit"), CardRecord("run", "to move fast", True)]
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = OutputManifest(str(tmp_path / "manifest.sqlite"))
+    yield manifest
+    manifest.close()
+
+
+def record(manifest, note_date, cards=CARDS, source_path="notes.md"):
+    manifest.record_generated(
+        source_path, note_date, f"cards/{note_date}.md", f"notes/{note_date}.md", cards, f"## {note_date}\ntext", "gpt-4o"
+    )
+
+
+def test_last_generated_returns_the_text_cards_and_files(manifest):
+    record(manifest, "2024-01-02")
+
+    generated = manifest.last_generated("notes.md", "2024-01-02")
+
+    assert generated.section_text == "## 2024-01-02\ntext"
+    assert generated.cards == CARDS
+    assert generated.models == "gpt-4o"
+    assert generated.status == GENERATED
+    assert generated.cards_path == "cards/2024-01-02.md"
+    assert generated.note_path == "notes/2024-01-02.md"
+    assert manifest.last_generated("notes.md", "2024-01-03") is None
+    assert manifest.last_generated("other.md", "2024-01-02") is None
+
+
+def test_failure_keeps_the_last_generation(manifest):
+    record(manifest, "2024-01-02")
+    manifest.record_failed("notes.md", "2024-01-02", "## 2024-01-02\nedited", "timeout")
+
+    generated = manifest.last_generated("notes.md", "2024-01-02")
+
+    assert generated.status == FAILED
+    assert generated.cards == CARDS
+    assert generated.cards_path == "cards/2024-01-02.md"
+    [failed] = manifest.report("failed")
+    assert (failed["note_date"], failed["status"], failed["error"]) == ("2024-01-02", FAILED, "timeout")
+
+
+def test_failed_day_without_generation_has_no_last_generated(manifest):
+    manifest.record_failed("notes.md", "2024-01-02", "## 2024-01-02", "no cards", SKIPPED)
+    assert manifest.last_generated("notes.md", "2024-01-02") is None
+    assert manifest.report("summary") == {SKIPPED: {"days": 1, "cards": 0}}
+
+
+def test_regeneration_replaces_the_row(manifest):
+    record(manifest, "2024-01-02")
+    record(manifest, "2024-01-02", CARDS[:1])
+
+    assert manifest.last_generated("notes.md", "2024-01-02").cards == CARDS[:1]
+    assert manifest.report("summary") == {GENERATED: {"days": 1, "cards": 1}}
+
+
+def test_reports(manifest):
+    record(manifest, "2024-01-30")
+    record(manifest, "2024-01-31", CARDS[:1])
+    record(manifest, "2024-02-01")
+    record(manifest, "2024-02-02", source_path="other.md")
+    manifest.record_failed("notes.md", "2024-02-03", "## 2024-02-03", "error")
+
+    assert manifest.report("summary", "notes.md") == {GENERATED: {"days": 3, "cards": 5}, FAILED: {"days": 1, "cards": 0}}
+    assert [day["note_date"] for day in manifest.report("days")] == ["2024-01-30", "2024-01-31", "2024-02-01", "2024-02-02"]
+    assert [day["card_count"] for day in manifest.report("days", "notes.md")] == [2, 1, 2]
+    assert [day["note_date"] for day in manifest.report("failed")] == ["2024-02-03"]
+    assert manifest.report("months") == [
+        {"month": "2024-01", "days": 2, "cards": 3},
+        {"month": "2024-02", "days": 2, "cards": 4}
+    ]
+
+
+def test_unknown_report(manifest):
+    with pytest.raises(ValueError):
+        manifest.report("weeks")
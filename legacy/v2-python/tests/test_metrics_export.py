@@ -0,0 +1,75 @@
+from metrics import HISTOGRAM_BUCKETS, RunMetrics
+from metrics_export import CORE_COUNTERS, render_prometheus
+
+
+def lines_of(text):
+    return text.rstrip("\n").split("\n")
+
+
+def test_empty_snapshot_exports_the_core_counters_at_zero():
+    lines = lines_of(render_prometheus(RunMetrics().to_dict()))
+
+    for name in CORE_COUNTERS:
+        assert f"# TYPE flashcards_{name}_total counter" in lines
+        assert f"flashcards_{name}_total 0" in lines
+    assert not any("cache_hit_ratio" in line for line in lines)
+
+
+def test_counters_get_the_total_suffix_once_and_keep_their_labels():
+    metrics = RunMetrics()
+    metrics.increment("sections_processed", 3)
+    metrics.increment("agent_call", agent="Teacher")
+    metrics.increment("agent_call", 2, agent='Say "hi"')
+    metrics.increment("requests_total")
+
+    text = render_prometheus(metrics.to_dict())
+
+    assert "flashcards_sections_processed_total 3\n" in text
+    assert 'flashcards_agent_call_total{agent="Teacher"} 1\n' in text
+    assert 'flashcards_agent_call_total{agent="Say \\"hi\\""} 2\n' in text
+    assert "flashcards_requests_total 1\n" in text
+    assert text.count("# TYPE flashcards_agent_call_total counter") == 1
+
+
+def test_gauges_and_the_cache_hit_ratio():
+    metrics = RunMetrics()
+    metrics.increment("cache_hits", 3)
+    metrics.increment("cache_misses")
+    metrics.set_gauge("concurrency_limit_provider-1", 4)
+
+    lines = lines_of(render_prometheus(metrics.to_dict(), {"exporter_up": 1}))
+
+    assert "# TYPE flashcards_cache_hit_ratio gauge" in lines
+    assert "flashcards_cache_hit_ratio 0.75" in lines
+    # Invalid name characters are replaced
+    assert "flashcards_concurrency_limit_provider_1 4" in lines
+    assert "flashcards_exporter_up 1" in lines
+
+
+def test_timings_are_cumulative_histograms_in_seconds():
+    metrics = RunMetrics()
+    for seconds in (0.01, 0.2, 0.2, 1000.0):
+        metrics.observe("section", seconds, agent="Teacher")
+
+    lines = lines_of(render_prometheus(metrics.to_dict()))
+
+    assert "# TYPE flashcards_section_seconds histogram" in lines
+    buckets = [line for line in lines if line.startswith("flashcards_section_seconds_bucket")]
+    assert len(buckets) == len(HISTOGRAM_BUCKETS) + 1
+    assert 'flashcards_section_seconds_bucket{agent="Teacher",le="0.05"} 1' in buckets
+    assert 'flashcards_section_seconds_bucket{agent="Teacher",le="0.25"} 3' in buckets
+    assert 'flashcards_section_seconds_bucket{agent="Teacher",le="300.0"} 3' in buckets
+    assert buckets[-1] == 'flashcards_section_seconds_bucket{agent="Teacher",le="+Inf"} 4'
+    assert 'flashcards_section_seconds_sum{agent="Teacher"} 1000.41' in lines
+    assert 'flashcards_section_seconds_count{agent="Teacher"} 4' in lines
+
+
+def test_histogram_without_labels():
+    metrics = RunMetrics()
+    metrics.observe("batch_wait", 2.0)
+
+    lines = lines_of(render_prometheus(metrics.to_dict()))
+
+    assert 'flashcards_batch_wait_seconds_bucket{le="1.0"} 0' in lines
+    assert 'flashcards_batch_wait_seconds_bucket{le="2.5"} 1' in lines
+    assert "flashcards_batch_wait_seconds_count 1" in lines
@@ -0,0 +1,73 @@
+import argparse
+from datetime import datetime
+
+import pytest
+
+from cli import build_parser, positive_int
+from note_tools import NoteIndex
+
+
+NOTES = """# English Learning Notes
+
+## Legend
+
+- ??? - questions
+
+## [[2025-03-28-Friday|28.03.2025]]
+
+look up - to search
+
+## [[2025-03-27-Thursday|27.03.2025]]
+
+at - specific times
+
+## 26.03.2025
+
+give up - to stop trying
+"""
+
+
+@pytest.fixture
+def note_index(tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text(NOTES, encoding="utf-8")
+    return NoteIndex.build(str(path))
+
+
+def dates(entries):
+    return [entry.date.strftime("%Y-%m-%d") for entry in entries]
+
+
+def test_build_skips_undated_headers_and_orders_oldest_first(note_index):
+    assert dates(note_index.entries) == ["2025-03-26", "2025-03-27", "2025-03-28"]
+
+
+def test_read_section_starts_with_the_header(note_index):
+    section = note_index.read_section(note_index.entries[-1])
+    assert section.startswith("[[2025-03-28-Friday|28.03.2025]]")
+    assert "look up" in section
+    assert "at - specific times" not in section
+
+
+def test_select_by_date_range(note_index):
+    assert dates(note_index.select(since=datetime(2025, 3, 27))) == ["2025-03-27", "2025-03-28"]
+    assert dates(note_index.select(until=datetime(2025, 3, 27))) == ["2025-03-26", "2025-03-27"]
+    assert dates(note_index.select(date=datetime(2025, 3, 27))) == ["2025-03-27"]
+
+
+def test_select_last_keeps_processing_order(note_index):
+    assert dates(note_index.select(last=2)) == ["2025-03-27", "2025-03-28"]
+    assert dates(note_index.select(until=datetime(2025, 3, 27), last=1)) == ["2025-03-27"]
+    assert dates(note_index.select(last=10)) == ["2025-03-26", "2025-03-27", "2025-03-28"]
+
+
+@pytest.mark.parametrize("value", ["0", "-3", "x"])
+def test_last_rejects_values_below_one(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        positive_int(value)
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(["--last", value])
+
+
+def test_last_accepts_positive_values():
+    assert build_parser().parse_args(["--last", "3"]).last == 3
@@ -0,0 +1,55 @@
+import pytest
+
+from prompt_compression import compress_section, dropped_words, normalize_whitespace, strip_boilerplate
+
+
+def test_compresses_a_section():
+    section = (
+        "## 2024-01-02   \n"
+        "\n"
+        "\n"
+        "- **apple**  -  a fruit <!-- check -->\n"
+        "    - see [[Fruits|fruit list]] and [[Vocabulary]]\n"
+        "![[diagram.png]]\n"
+        "![photo](images/apple.jpg)\n"
+        "---\n"
+        "- read [the article](https://example.com/apple) %%todo%%\n"
+    )
+
+    assert compress_section(section) == (
+        "## 2024-01-02\n"
+        "\n"
+        "- **apple** - a fruit\n"
+        "    - see fruit list and Vocabulary\n"
+        "\n"
+        "- read the article"
+    )
+
+
+def test_keeps_indentation_and_single_blank_lines():
+    text = "\n\n- a\n  - b  \n\n\n\n- c\t\t d\n\n"
+    assert normalize_whitespace(text) == "- a\n  - b\n\n- c d"
+
+
+@pytest.mark.parametrize("rule", ["---", "***", "_ _ _", "  - - - -  "])
+def test_removes_horizontal_rules(rule):
+    assert strip_boilerplate(f"a\n{rule}\nb") == "a\nb"
+
+
+def test_keeps_list_items_that_look_like_rules():
+    assert strip_boilerplate("- - item") == "- - item"
+
+
+def test_compressed_text_keeps_the_content_words():
+    section = "## 2024-01-02\n- **run**   - to move fast, see [[verbs]]\n\n\n---\n- ??? what is a [noun](https://example.com)\n"
+    assert dropped_words(section, compress_section(section)) == ["com", "example", "https"]
+
+
+def test_reports_the_dropped_words():
+    original = "keep this <!-- hidden note --> and ![[image.png]] [[Target|alias]]"
+    assert dropped_words(original, compress_section(original)) == ["Target", "hidden", "image", "note", "png"]
+
+
+def test_counts_repeated_words():
+    assert dropped_words("go go go", "go") == ["go", "go"]
+    assert dropped_words("a b", "b a c") == []
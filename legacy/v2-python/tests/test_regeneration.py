@@ -0,0 +1,52 @@
+from card_codec import CardRecord
+from regeneration import build_diff_message, changed_lines, content_line_count, merge_regenerated, removed_existing_cards
+
+
+PREVIOUS = "## 2024-01-02\n- apple - a fruit\n\n- run - to move fast\n- walk - to move slowly"
+
+
+def test_unchanged_section_has_no_changed_lines():
+    assert changed_lines(PREVIOUS, PREVIOUS) == []
+
+
+def test_changed_and_added_lines():
+    current = "## 2024-01-02\n- apple - a red fruit\n\n- run - to move fast\n- walk - to move slowly\n- swim - to move in water\n"
+    assert changed_lines(PREVIOUS, current) == ["- apple - a red fruit", "- swim - to move in water"]
+
+
+def test_leaves_out_the_header_deleted_and_blank_lines():
+    current = "## 2024-01-03\n- apple - a fruit\n\n\n\n- walk - to move slowly"
+    assert changed_lines(PREVIOUS, current) == []
+
+
+def test_counts_content_lines():
+    assert content_line_count(PREVIOUS) == 3
+    assert content_line_count("## 2024-01-02\n\n  \n") == 0
+
+
+def test_diff_message_numbers_the_existing_cards():
+    cards = [CardRecord("apple", "a fruit"), CardRecord("run", "to move fast", True)]
+    message = build_diff_message(PREVIOUS, ["- swim - to move in water"], cards)
+
+    assert "## 2024-01-02\nChanged or added lines:\n- swim - to move in water\n" in message
+    assert "Existing card E1:\nThe first side: apple\nThe second side: a fruit\nDouble sided card: no" in message
+    assert "Existing card E2:\nThe first side: run\nThe second side: to move fast\nDouble sided card: yes" in message
+
+
+def test_finds_the_removed_existing_cards():
+    messages = ["Existing card E2: removed\nexisting card e3 :Removed", None, "Existing card E9: removed", "E1 is fine"]
+    assert removed_existing_cards(messages, 3) == {2, 3}
+
+
+def test_merge_drops_removed_cards_and_duplicates():
+    existing = [CardRecord("apple", "a fruit"), CardRecord("run", "to move"), CardRecord("walk", "to move slowly")]
+    new_cards = [CardRecord("Apple", "A fruit"), CardRecord("run", "to move fast"), CardRecord("swim", "to move in water")]
+
+    merged = merge_regenerated(existing, {2}, new_cards)
+
+    assert merged == [existing[0], existing[2], new_cards[1], new_cards[2]]
+
+
+def test_merge_without_changes_keeps_the_existing_cards():
+    existing = [CardRecord("apple", "a fruit")]
+    assert merge_regenerated(existing, set(), []) == existing
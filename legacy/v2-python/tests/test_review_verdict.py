@@ -0,0 +1,39 @@
+from review_verdict import ACCEPT, FIX, CardVerdict, parse_review_verdict
+
+
+def test_falls_back_to_the_ok_marker():
+    assert parse_review_verdict("Looks good. OK!") == (True, [], False)
+    assert parse_review_verdict("Card 2 is wrong.") == (False, [], False)
+    assert parse_review_verdict(None) == (False, [], False)
+
+
+def test_parses_the_last_verdict_object():
+    content = (
+        'Example: {"Approved": true}\n'
+        'My verdict:\n'
+        '{"Approved": false, "Cards": [{"Card": 1, "Verdict": "accept"}, {"Card": "2", "Verdict": "fix", "Reason": "typo"}]}'
+    )
+    verdict = parse_review_verdict(content)
+    assert verdict.structured and not verdict.approved
+    assert verdict.cards == [CardVerdict(1, ACCEPT), CardVerdict(2, FIX, "typo")]
+    assert verdict.rejected == [CardVerdict(2, FIX, "typo")]
+
+
+def test_a_rejected_card_overrides_the_approval():
+    verdict = parse_review_verdict('{"Approved": true, "Cards": [{"Card": 1, "Verdict": "fix"}]}')
+    assert not verdict.approved
+
+
+def test_accepts_lowercase_keys_and_string_approval():
+    verdict = parse_review_verdict('{"approved": "yes", "cards": [{"number": 3, "verdict": "ACCEPT"}]}')
+    assert verdict.approved and verdict.cards == [CardVerdict(3, ACCEPT)]
+
+
+def test_unknown_verdicts_are_fixes_and_invalid_cards_are_ignored():
+    verdict = parse_review_verdict('{"Approved": true, "Cards": [{"Card": 1, "Verdict": "maybe"}, {"Card": "x"}, "2"]}')
+    assert verdict.cards == [CardVerdict(1, FIX)]
+    assert not verdict.approved
+
+
+def test_ok_marker_is_ignored_with_a_verdict():
+    assert not parse_review_verdict('OK! {"Approved": false}').approved
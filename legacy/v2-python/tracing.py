@@ -0,0 +1,223 @@
+"""
+Opt-in span tracing exported as Chrome trace-event JSON.
+
+The exported file can be opened in chrome://tracing or https://ui.perfetto.dev.
+Spans are recorded only after the tracer is enabled, a disabled tracer hands out
+a shared no-op span so instrumented code pays a single attribute check.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class _NullSpan:
+    """
+    Span returned while tracing is disabled.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """
+    A recorded span, written to the tracer as a complete ("X") event when it ends.
+    """
+    def __init__(self, tracer: 'Tracer', name: str, category: str, args: Dict[str, Any]):
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+        self._lane = tracer.current_lane()
+        self._started = 0
+
+    def __enter__(self):
+        self._started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._args["error"] = f"{exc_type.__name__}: {exc}"
+        self._tracer.record(self._name, self._category, self._started, time.perf_counter_ns(), self._lane, self._args)
+        return False
+
+    def set(self, **args):
+        """Attach more arguments to the span."""
+        self._args.update(args)
+
+
+class Tracer:
+    """
+    Collects spans of the current process.
+
+    Spans started inside an asyncio task are put on a lane per task, spans started
+    outside of a task on a lane per thread, so overlapping sections show up side by side.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._events: List[Dict[str, Any]] = []
+        self._lanes: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def enable(self, origin_ns: Optional[int] = None, process_name: Optional[str] = None):
+        """
+        Start recording spans.
+
+        Args:
+            origin_ns: The perf_counter_ns time of the trace start, the tracer of a
+                worker process gets its parent's so both share one timeline.
+            process_name: The name of the process in the trace viewer.
+        """
+        self._origin = time.perf_counter_ns() if origin_ns is None else origin_ns
+        self._pid = os.getpid()
+        if process_name:
+            self._events.append({"name": "process_name", "ph": "M", "pid": self._pid, "args": {"name": process_name}})
+        self.enabled = True
+
+    @property
+    def origin_ns(self) -> int:
+        return self._origin
+
+    def take_events(self) -> List[Dict[str, Any]]:
+        """
+        Remove and return the recorded events, to send them from a worker process to its parent.
+        """
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def add_events(self, events: List[Dict[str, Any]]):
+        """
+        Add the events recorded by a worker process.
+        """
+        with self._lock:
+            self._events.extend(events)
+
+    def span(self, name: str, category: str = "app", **args):
+        """
+        Create a span to be used as a context manager.
+
+        Args:
+            name: The span name.
+            category: The span category.
+            **args: Arguments shown with the span in the trace viewer.
+
+        Returns:
+            The span, a no-op span when tracing is disabled.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def current_lane(self) -> int:
+        """
+        Get the trace lane (tid) of the caller.
+        """
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+
+        if task is not None:
+            key, label = ("task", id(task)), task.get_name()
+        else:
+            thread = threading.current_thread()
+            key, label = ("thread", thread.ident), thread.name
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            with self._lock:
+                lane = self._lanes.get(key)
+                if lane is None:
+                    lane = len(self._lanes) + 1
+                    self._lanes[key] = lane
+                    self._events.append({
+                        "name": "thread_name", "ph": "M", "pid": self._pid, "tid": lane,
+                        "args": {"name": label}
+                    })
+        return lane
+
+    def record(self, name: str, category: str, started_ns: int, ended_ns: int, lane: int, args: Dict[str, Any]):
+        """
+        Record a finished span.
+        """
+        self._events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (started_ns - self._origin) / 1000,
+            "dur": (ended_ns - started_ns) / 1000,
+            "pid": self._pid,
+            "tid": lane,
+            "args": args
+        })
+
+    def export(self, path: str):
+        """
+        Write the recorded spans as Chrome trace-event JSON.
+
+        Args:
+            path: The output file path.
+        """
+        with self._lock:
+            events = list(self._events)
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        logging.info(f"Saved {len(events)} trace event(s) to {path}")
+
+
+# The process-wide tracer
+tracer = Tracer()
+
+
+def span(name: str, category: str = "app", **args):
+    """
+    Create a span on the process-wide tracer.
+    """
+    if not tracer.enabled:
+        return _NULL_SPAN
+    return _Span(tracer, name, category, args)
+
+
+def instrument_agent(agent):
+    """
+    Record every reply of an AG2 agent as a "turn" span.
+
+    Args:
+        agent: The agent to instrument.
+
+    Returns:
+        The same agent.
+    """
+    generate_reply = agent.generate_reply
+    a_generate_reply = agent.a_generate_reply
+
+    @functools.wraps(generate_reply)
+    def traced_generate_reply(*args, **kwargs):
+        with span(f"turn:{agent.name}", "agent", agent=agent.name):
+            return generate_reply(*args, **kwargs)
+
+    @functools.wraps(a_generate_reply)
+    async def traced_a_generate_reply(*args, **kwargs):
+        with span(f"turn:{agent.name}", "agent", agent=agent.name):
+            return await a_generate_reply(*args, **kwargs)
+
+    agent.generate_reply = traced_generate_reply
+    agent.a_generate_reply = traced_a_generate_reply
+    return agent
@@ -0,0 +1,139 @@
+"""
+Watch mode: process days added to or edited in the notes file while the tool keeps running.
+
+Changes are detected with inotify when the optional inotify_simple package is
+installed, otherwise the file is polled.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from note_tools import NoteIndex, SectionIndexEntry
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+
+def fingerprint_sections(note_index: NoteIndex) -> Dict[str, str]:
+    """
+    Hash the content of every indexed section.
+
+    Args:
+        note_index: The index of the notes file.
+
+    Returns:
+        The content hash of each section keyed by its header.
+    """
+    with open(note_index.file_path, 'rb') as f:
+        data = memoryview(f.read())
+    return {
+        entry.header: hashlib.sha1(data[entry.start:entry.end]).hexdigest()
+        for entry in note_index.entries
+    }
+
+
+def find_changed_sections(note_index: NoteIndex, known: Dict[str, str], current: Dict[str, str]) -> List[SectionIndexEntry]:
+    """
+    Find the sections that were added or edited since the known fingerprints were taken.
+
+    Args:
+        note_index: The index of the current notes file.
+        known: The fingerprints of the already processed sections.
+        current: The fingerprints of the current sections.
+
+    Returns:
+        The added or edited entries in processing order.
+    """
+    return [entry for entry in note_index.entries if known.get(entry.header) != current[entry.header]]
+
+
+class NotesWatcher:
+    """
+    Blocks until the notes file changes or the watcher is stopped.
+    """
+    def __init__(self, file_path: str, poll_interval: float = 1.0, debounce: float = 0.5):
+        self.file_path = os.path.abspath(file_path)
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self._inotify = None
+        self._stopped = threading.Event()
+        # Held while waiting, so the inotify descriptor is not closed under a read
+        self._waiting = threading.Lock()
+
+        if INotify is not None:
+            self._inotify = INotify()
+            watch_flags = inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE
+            # Watch the directory, editors often replace the file by renaming a temporary one
+            self._inotify.add_watch(os.path.dirname(self.file_path), watch_flags)
+            logging.info(f"Watching {self.file_path} with inotify")
+        else:
+            logging.info(f"Watching {self.file_path} by polling every {poll_interval}s")
+        self._signature = self._stat_signature()
+
+    def _stat_signature(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _is_own_event(self, events) -> bool:
+        name = os.path.basename(self.file_path)
+        return any(event.name == name for event in events)
+
+    def wait_for_change(self) -> bool:
+        """
+        Block until the file has changed and no further writes arrived for the debounce period.
+
+        The wait checks every poll interval whether the watcher was stopped.
+
+        Returns:
+            True when the file changed, False when the watcher was stopped.
+        """
+        with self._waiting:
+            if self._stopped.is_set():
+                return False
+            if self._inotify is not None:
+                timeout = int(self.poll_interval * 1000)
+                while not self._is_own_event(self._inotify.read(timeout=timeout)):
+                    if self._stopped.is_set():
+                        return False
+                # Let the editor finish writing
+                while self._inotify.read(timeout=int(self.debounce * 1000)):
+                    pass
+            else:
+                while self._stat_signature() == self._signature:
+                    if self._stopped.wait(self.poll_interval):
+                        return False
+                time.sleep(self.debounce)
+                while True:
+                    signature = self._stat_signature()
+                    if signature == self._signature:
+                        break
+                    self._signature = signature
+                    time.sleep(self.debounce)
+
+            self._signature = self._stat_signature()
+            return True
+
+    def stop(self):
+        """
+        Make a running wait_for_change return within the poll interval.
+        """
+        self._stopped.set()
+
+    def close(self):
+        """
+        Stop the watcher and release the inotify descriptor once no wait is running.
+        """
+        self.stop()
+        with self._waiting:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None